@@ -0,0 +1,5 @@
+""" Benchmarks for inxs with synthetic documents of configurable sizes.
+
+    Run them with ``python -m benchmarks --help`` from the repository's root for the
+    available options.
+"""
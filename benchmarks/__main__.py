@@ -0,0 +1,210 @@
+""" Runs the benchmarks and compares the results against a baseline. """
+
+import json
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Dict, List, Sequence
+
+from benchmarks.transformations import Benchmark, benchmarks
+
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+STARTUP_BENCHMARK = "startup"
+STARTUP_COMMAND = (sys.executable, "-c", "import inxs.cli")
+
+
+def parse_args(args: Sequence[str]) -> Namespace:
+    parser = ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument(
+        "--size", type=int, default=10_000, help="The number of generated elements."
+    )
+    parser.add_argument(
+        "--depth", type=int, default=8, help="The depth of the generated TEI trees."
+    )
+    parser.add_argument(
+        "--fan-out",
+        type=int,
+        default=6,
+        help="The maximal number of children of generated elements.",
+    )
+    parser.add_argument(
+        "--records", type=int, default=200, help="The number of generated MODS records."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The generators' seed.")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="The number of timed runs per benchmark, the fastest is reported.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="The file that the results are compared against.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        default=False,
+        help="Store the results as baseline.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="The relative slowdown that is reported as regression.",
+    )
+    parser.add_argument(
+        "names",
+        metavar="NAME",
+        nargs="*",
+        choices=[[]] + sorted(benchmarks) + [STARTUP_BENCHMARK],
+        help="The benchmarks to run, all per default.",
+    )
+    return parser.parse_args(args)
+
+
+def count_nodes(document) -> int:
+    return sum(1 for _ in document.root._etree_obj.iter())
+
+
+def run_benchmark(benchmark: Benchmark, parameters: SimpleNamespace, repeat: int):
+    """ Returns the number of processed nodes, the fastest run's wall time in seconds
+        and the peak of memory allocations during a run in bytes. The memory that is
+        allocated by libxml2 isn't considered. """
+    documents = [benchmark.make_input(parameters) for _ in range(repeat + 1)]
+    nodes = count_nodes(documents[0])
+
+    timings = []
+    for document in documents[:-1]:
+        started = perf_counter()
+        benchmark.transformation(document)
+        timings.append(perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        benchmark.transformation(documents[-1])
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"nodes": nodes, "seconds": min(timings), "peak_memory": peak_memory}
+
+
+def run_startup_benchmark(repeat: int):
+    """ Returns the fastest wall time in seconds of an interpreter that imports the
+        command line interface, that is the cold start of the ``inxs`` command. """
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        subprocess.run(STARTUP_COMMAND, check=True)
+        timings.append(perf_counter() - started)
+    return {"nodes": None, "seconds": min(timings), "peak_memory": None}
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float
+) -> List[str]:
+    """ Returns the names of the benchmarks that took longer than the baseline's by
+        more than ``tolerance``. """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["seconds"] > reference["seconds"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def format_results(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], regressions: Sequence[str]
+) -> str:
+    rows = [("benchmark", "nodes", "seconds", "nodes/s", "peak MiB", "baseline", "")]
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            change = "-"
+        else:
+            change = f"{result['seconds'] / reference['seconds'] - 1:+.1%}"
+        if result["nodes"] is None:
+            nodes = nodes_per_second = "-"
+        else:
+            nodes = str(result["nodes"])
+            nodes_per_second = f"{result['nodes_per_second']:.0f}"
+        if result["peak_memory"] is None:
+            peak_memory = "-"
+        else:
+            peak_memory = f"{result['peak_memory'] / 2 ** 20:.2f}"
+        rows.append(
+            (
+                name,
+                nodes,
+                f"{result['seconds']:.4f}",
+                nodes_per_second,
+                peak_memory,
+                change,
+                "REGRESSION" if name in regressions else "",
+            )
+        )
+
+    widths = [max(len(x[i]) for x in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in rows
+    )
+
+
+def main(args: Sequence[str] = None) -> int:
+    args = parse_args(sys.argv[1:] if args is None else args)
+    parameters = SimpleNamespace(
+        size=args.size,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        records=args.records,
+        seed=args.seed,
+    )
+
+    results = {}
+    for name in args.names or (*benchmarks, STARTUP_BENCHMARK):
+        if name == STARTUP_BENCHMARK:
+            results[name] = run_startup_benchmark(args.repeat)
+            continue
+        result = run_benchmark(benchmarks[name], parameters, args.repeat)
+        result["nodes_per_second"] = result["nodes"] / result["seconds"]
+        results[name] = result
+
+    baseline = {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text())
+        if stored["parameters"] == vars(parameters):
+            baseline = stored["results"]
+        else:
+            print(
+                f"The baseline in {args.baseline} was recorded with different "
+                "parameters and is ignored.",
+                file=sys.stderr,
+            )
+
+    regressions = compare(results, baseline, args.tolerance)
+    print(format_results(results, baseline, regressions))
+
+    if args.save_baseline:
+        args.baseline.write_text(
+            json.dumps({"parameters": vars(parameters), "results": results}, indent=2)
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+""" Deterministic generators of synthetic TEI and MODS documents. """
+
+from collections import deque
+from random import Random
+
+from delb import Document
+from lxml import etree
+
+
+METS_NAMESPACE = "http://www.loc.gov/METS/"
+MODS_NAMESPACE = "http://www.loc.gov/mods/v3"
+TEI_NAMESPACE = "http://www.tei-c.org/ns/1.0"
+
+WORDS = (
+    "aber alle also auch auf aus bei das dass dem den der des die doch durch ein "
+    "eine einer für hat ich ist mit nach nicht noch nur oder sich sie sind über "
+    "und von war was wie wir zu zum zur"
+).split()
+
+TEI_INLINE_ELEMENTS = ("hi", "note", "persName", "placeName", "lb", "pb")
+RENDITIONS = ("italic", "bold", "underline", "smallcaps")
+
+
+def _words(rng: Random, minimum: int, maximum: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(minimum, maximum)))
+
+
+def _whitespace(rng: Random) -> str:
+    return rng.choice(("", " ", "\n  ", "\n\t \n"))
+
+
+def generate_tei(
+    size: int, depth: int = 8, fan_out: int = 6, seed: int = 0
+) -> Document:
+    """ Generates a TEI document with ``size`` elements below its ``<body>``. These
+        are nested into ``<div>`` elements up to ``depth`` levels, each element has up
+        to ``fan_out`` children. A document may be smaller if the given depth and
+        fan-out don't allow the requested size. The result is the same for the same
+        arguments. """
+    rng = Random(seed)
+    tei = etree.Element(f"{{{TEI_NAMESPACE}}}TEI", nsmap={None: TEI_NAMESPACE})
+    text = etree.SubElement(tei, f"{{{TEI_NAMESPACE}}}text")
+    body = etree.SubElement(text, f"{{{TEI_NAMESPACE}}}body")
+
+    count = 0
+    queue = deque(((body, 1),))
+    while queue and count < size:
+        parent, level = queue.popleft()
+        for _ in range(rng.randint(1, fan_out)):
+            if count >= size:
+                break
+            count += 1
+
+            if level < depth and rng.random() < 0.6:
+                element = etree.SubElement(parent, f"{{{TEI_NAMESPACE}}}div")
+                element.set("n", str(count))
+                if rng.random() < 0.3:
+                    element.set("type", rng.choice(("chapter", "section", "letter")))
+                element.text = _whitespace(rng)
+                queue.append((element, level + 1))
+            elif level < depth and rng.random() < 0.5:
+                element = etree.SubElement(parent, f"{{{TEI_NAMESPACE}}}p")
+                element.text = _words(rng, 0, 12)
+                queue.append((element, level + 1))
+            else:
+                name = rng.choice(TEI_INLINE_ELEMENTS)
+                element = etree.SubElement(parent, f"{{{TEI_NAMESPACE}}}{name}")
+                if name == "hi":
+                    element.set("rend", rng.choice(RENDITIONS))
+                    element.text = _words(rng, 0, 3)
+                elif name in ("persName", "placeName"):
+                    element.set("ref", f"#{name[:-4]}{rng.randint(1, 50)}")
+                    element.text = _words(rng, 1, 2)
+                elif name == "note":
+                    element.set("place", rng.choice(("foot", "margin")))
+                    element.text = _words(rng, 0, 8)
+
+            element.tail = _whitespace(rng) + _words(rng, 0, 4)
+
+    return Document(etree.ElementTree(tei))
+
+
+def generate_mods(records: int, seed: int = 0) -> Document:
+    """ Generates a METS document with ``records`` MODS records that are shaped like
+        the one that the MODS to TEI transformation of the test suite processes. The
+        result is the same for the same arguments. """
+    rng = Random(seed)
+
+    def mets(parent, name, **attributes):
+        return etree.SubElement(parent, f"{{{METS_NAMESPACE}}}{name}", attributes)
+
+    def mods(parent, name, text=None, **attributes):
+        element = etree.SubElement(parent, f"{{{MODS_NAMESPACE}}}{name}", attributes)
+        element.text = text
+        return element
+
+    root = etree.Element(
+        f"{{{METS_NAMESPACE}}}mets",
+        nsmap={"mets": METS_NAMESPACE, "mods": MODS_NAMESPACE},
+    )
+    for i in range(records):
+        section = mets(root, "dmdSec", ID=f"dmd{i:06}")
+        wrap = mets(section, "mdWrap", MIMETYPE="text/xml", MDTYPE="MODS")
+        record = mods(mets(wrap, "xmlData"), "mods")
+
+        title_info = mods(record, "titleInfo", lang="ger")
+        if rng.random() < 0.5:
+            mods(title_info, "nonSort", rng.choice(("Der", "Die", "Das")))
+        mods(title_info, "title", _words(rng, 2, 8).capitalize() + ".")
+        mods(title_info, "subTitle", _words(rng, 3, 10))
+
+        for _ in range(rng.randint(1, 4)):
+            family, given = _words(rng, 1, 1), _words(rng, 1, 1)
+            name = mods(record, "name", type="personal")
+            mods(name, "namePart", family.capitalize(), type="family")
+            mods(name, "namePart", given.capitalize(), type="given")
+            mods(name, "displayForm", f"{given.capitalize()} {family.capitalize()}")
+            role = mods(name, "role")
+            mods(role, "roleTerm", "author", type="text")
+
+        mods(record, "typeOfResource", "text")
+        mods(record, "genre", "book", authority="marcgt")
+
+        origin_info = mods(record, "originInfo")
+        place = mods(origin_info, "place")
+        mods(place, "placeTerm", "deu", type="code", authority="iso3166")
+        mods(place, "placeTerm", _words(rng, 1, 1).capitalize(), type="text")
+        mods(origin_info, "publisher", _words(rng, 2, 4).capitalize())
+        mods(origin_info, "dateIssued", str(rng.randint(1450, 2000)))
+
+        language = mods(record, "language")
+        mods(language, "languageTerm", "deu", type="code", authority="iso639-3")
+
+        location = mods(record, "location")
+        mods(location, "physicalLocation", _words(rng, 2, 5).capitalize())
+        mods(location, "shelfLocator", f"{rng.choice('ABCDEF')}{rng.randint(1, 999)}")
+
+    return Document(etree.ElementTree(root))
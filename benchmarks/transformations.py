@@ -0,0 +1,213 @@
+""" The benchmarked transformations and the inputs they are applied to. """
+
+import importlib.util
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+from delb import Document
+
+from inxs import (
+    TRAVERSE_BOTTOM_TO_TOP,
+    TRAVERSE_DEPTH_FIRST,
+    TRAVERSE_LEFT_TO_RIGHT,
+    TRAVERSE_TOP_TO_BOTTOM,
+    TRAVERSE_WIDTH_FIRST,
+    Any,
+    Key,
+    lib,
+    Not,
+    OneOf,
+    Ref,
+    Rule,
+    Transformation,
+)
+from inxs.contrib import reduce_whitespaces, remove_empty_nodes
+
+from benchmarks.corpus import MODS_NAMESPACE, generate_mods, generate_tei
+
+
+MODS_TO_TEI_PATH = (
+    Path(__file__).parent.parent / "tests" / "test_cli" / "mods_to_tei.py"
+)
+
+
+class Benchmark:
+    """ A transformation that is applied to the document that ``make_input`` returns
+        for the benchmark's parameters. """
+
+    __slots__ = ("name", "make_input", "transformation")
+
+    def __init__(
+        self,
+        name: str,
+        make_input: Callable[[SimpleNamespace], Document],
+        transformation: Transformation,
+    ):
+        self.name = name
+        self.make_input = make_input
+        self.transformation = transformation
+
+
+def _load_mods_to_tei():
+    spec = importlib.util.spec_from_file_location("mods_to_tei", MODS_TO_TEI_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _tei(parameters: SimpleNamespace) -> Document:
+    return generate_tei(
+        parameters.size, parameters.depth, parameters.fan_out, parameters.seed
+    )
+
+
+def _mods(parameters: SimpleNamespace) -> Document:
+    return generate_mods(parameters.records, parameters.seed)
+
+
+def _any_node(node, transformation):
+    return True
+
+
+def _nothing():
+    pass
+
+
+def _make_benchmarks() -> Dict[str, Benchmark]:
+    mods_to_tei = _load_mods_to_tei()
+
+    attributes = Transformation(
+        Rule({"rend": "italic"}, lib.set_attribute("style", "font-style: italic")),
+        Rule({"rend": "bold"}, lib.set_attribute("style", "font-weight: bold")),
+        Rule({"n": None}, lib.rename_attributes({"n": "number"})),
+        Rule(("div", {"type": "letter"}), lib.remove_attributes("type")),
+        Rule({"ref": None}, (lib.get_attribute("ref"), lib.append("refs"))),
+        context={"refs": []},
+        result_object="context.refs",
+    )
+
+    benchmarks = [
+        Benchmark(
+            "mods_to_tei",
+            _mods,
+            Transformation(
+                Rule(
+                    (MODS_NAMESPACE, "mods"),
+                    (
+                        lib.f(mods_to_tei.from_mods, Ref("node"), copy=True),
+                        lib.append("headers"),
+                    ),
+                ),
+                context={"headers": []},
+                result_object="context.headers",
+            ),
+        ),
+        Benchmark("remove_empty_nodes", _tei, remove_empty_nodes),
+        Benchmark("reduce_whitespaces", _tei, reduce_whitespaces),
+        Benchmark("attributes", _tei, attributes),
+        Benchmark(
+            "css_selectors",
+            _tei,
+            Transformation(
+                Rule("div > hi", lib.set_attribute("seen", "")),
+                Rule("div[type=letter] persName", lib.set_attribute("seen", "")),
+                Rule("p:first-child + p", lib.set_attribute("seen", "")),
+                copy=False,
+            ),
+        ),
+        Benchmark(
+            "xpath",
+            _tei,
+            Transformation(
+                Rule("./text/body//div/hi", lib.set_attribute("seen", "")),
+                Rule(".//div[@type='letter']//persName", lib.set_attribute("seen", "")),
+                Rule("//p/note[@place='foot']", lib.set_attribute("seen", "")),
+                copy=False,
+            ),
+        ),
+        Benchmark(
+            "combined_conditions",
+            _tei,
+            Transformation(
+                Rule(
+                    (
+                        Any("hi", "note", "persName"),
+                        Not({"rend": "bold"}, {"place": "margin"}),
+                        OneOf({"ref": None}, "hi", "note"),
+                    ),
+                    lib.set_attribute("seen", ""),
+                ),
+                copy=False,
+                select_candidates=False,
+            ),
+        ),
+        Benchmark(
+            "pruning",
+            _tei,
+            Transformation(
+                Rule("p", lib.set_attribute("seen", ""), prune="div"), copy=False
+            ),
+        ),
+        Benchmark(
+            "scopes",
+            _tei,
+            Transformation(
+                Rule(
+                    "hi",
+                    lib.set_attribute("seen", ""),
+                    scope=("div", {"type": "letter"}),
+                    max_depth=2,
+                ),
+                copy=False,
+            ),
+        ),
+        Benchmark(
+            "keys",
+            _tei,
+            Transformation(
+                lib.build_key("references", "persName", "ref"),
+                Rule(
+                    "persName",
+                    (
+                        lib.f(len, Key("references", lib.get_attribute("ref"))),
+                        lib.append("counts"),
+                    ),
+                    read_only=True,
+                ),
+                context={"counts": []},
+                result_object="context.counts",
+            ),
+        ),
+    ]
+
+    for name, traversal_order in (
+        (
+            "traverse_df_ltr_ttb",
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+        ),
+        (
+            "traverse_df_ltr_btt",
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+        ),
+        (
+            "traverse_wf_ltr_ttb",
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+        ),
+    ):
+        benchmarks.append(
+            Benchmark(
+                name,
+                _tei,
+                Transformation(
+                    Rule(_any_node, _nothing),
+                    traversal_order=traversal_order,
+                    copy=False,
+                ),
+            )
+        )
+
+    return {x.name: x for x in benchmarks}
+
+
+benchmarks = _make_benchmarks()
@@ -3,31 +3,51 @@
 # TODO delete unneeded symbols in setup functions' locals
 # TODO globbing is much less stressing than regular expressions
 
+import inspect
 import logging
-import pkg_resources
-from collections import ChainMap
+from collections import ChainMap, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, as_completed, wait
 from copy import deepcopy
-from functools import lru_cache
-from os import getenv
+from functools import lru_cache, partial
+from os import cpu_count, getenv, PathLike
+from pathlib import Path
+from threading import Lock, local
+from time import perf_counter
 from types import SimpleNamespace
 from typing import (
     AnyStr,
     Callable,
     Dict,
+    Iterable,
     Iterator,
     List,
     Mapping,
+    Optional,
     Pattern,
     Sequence,
+    Set,
+    Tuple,
+    Type,
     Union,
 )
 from typing import Any as AnyType
 
-import cssselect
 import dependency_injection
-from delb import is_tag_node, TagNode, Document
+from delb import TagNode, Document
+from delb.nodes import _get_or_create_element_wrapper
+from lxml import etree
 
 from inxs.constants import (
+    ATTRIBUTES_TEST_COST,
+    CANDIDATES_SELECTOR_ATTRIBUTE,
+    COMBINATOR_ATTRIBUTE,
+    COMPILED_SELECTOR_COST,
+    CONDITION_COST_ATTRIBUTE,
+    CONSTANT_CONDITION_ATTRIBUTE,
+    LOCAL_CONDITION_ATTRIBUTE,
+    MAINTAINS_INDEX_ATTRIBUTE,
+    NAME_TEST_COST,
+    READ_ONLY_ATTRIBUTE,
     REF_IDENTIFYING_ATTRIBUTE,
     TRAVERSE_BOTTOM_TO_TOP,
     TRAVERSE_DEPTH_FIRST,
@@ -36,13 +56,26 @@ from inxs.constants import (
     TRAVERSE_ROOT_ONLY,
     TRAVERSE_TOP_TO_BOTTOM,
     TRAVERSE_WIDTH_FIRST,
+    XPATH_EVALUATION_COST,
 )
+from inxs.profiling import Profile
 
 
 # config
 
 
-__version__ = pkg_resources.get_distribution("inxs").version
+def __getattr__(name: str) -> AnyType:
+    # the version is looked up on demand as that's costly
+    if name == "__version__":
+        global __version__
+        try:
+            from importlib.metadata import version
+        except ImportError:  # Python < 3.8
+            from importlib_metadata import version
+        __version__ = version("inxs")
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 HANDLER_CACHES_SIZE = getenv("INXS_HANDLER_CACHE_SIZE", None)
 if HANDLER_CACHES_SIZE is not None:
@@ -70,7 +103,7 @@ class FlowControl(InxsException):
 
     def __init__(self):
         super().__init__()
-        dbg(f"{self.__class__.__name__} is evoked.")
+        dbg("%s is evoked.", self.__class__.__name__)
 
 
 class AbortRule(FlowControl):
@@ -90,6 +123,47 @@ class SkipToNextNode(FlowControl):
     """
 
 
+class SkipDescendants(FlowControl):
+    """ Can be raised to prevent that the descendants of the current node are
+        traversed by the currently processed :class:`inxs.Rule`. This has only an
+        effect with top-to-bottom traversal orders. """
+
+
+class _FlowControlSignal:
+    """ The type of the objects that a handler can return instead of raising a
+        :class:`FlowControl` exception. """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+ABORT_RULE = _FlowControlSignal("ABORT_RULE")
+""" Can be returned by a handler with the same effect as raising :class:`AbortRule`. """
+ABORT_TRANSFORMATION = _FlowControlSignal("ABORT_TRANSFORMATION")
+""" Can be returned by a handler with the same effect as raising
+    :class:`AbortTransformation`. """
+SKIP_DESCENDANTS = _FlowControlSignal("SKIP_DESCENDANTS")
+""" Can be returned by a handler with the same effect as raising
+    :class:`SkipDescendants`. """
+SKIP_TO_NEXT_NODE = _FlowControlSignal("SKIP_TO_NEXT_NODE")
+""" Can be returned by a handler with the same effect as raising
+    :class:`SkipToNextNode`. """
+
+_FLOW_CONTROL_SIGNALS = {
+    AbortRule: ABORT_RULE,
+    AbortTransformation: ABORT_TRANSFORMATION,
+    SkipDescendants: SKIP_DESCENDANTS,
+    SkipToNextNode: SKIP_TO_NEXT_NODE,
+}
+""" The signals that are used instead of raising the flow control exceptions that
+    are given as handlers. """
+
+
 # types
 
 AttributesConditionType = Union[
@@ -117,37 +191,47 @@ def _condition_factory(condition: ConditionType) -> Callable:
             # assumes tag
             dbg(f"Adding {condition} as tag's local name condition.")
             return HasLocalname(condition)
-        try:  # it may be a css selctor
-            _condition = _css_selector_translator(condition)
-        except cssselect.SelectorError:
-            pass
-        else:
-            dbg(
-                f"Translated css selector {condition}` to XPath expression "
-                f"{_condition}."
-            )
-            condition = _condition
+        if _translate_css_selector(condition) is not None:
+            dbg(f"Adding {condition} as css selector condition.")
+            return MatchesCSSSelector(condition)
         # assumes XPath
         dbg(f"Adding {condition} as XPath condition.")
         return MatchesXPath(condition)
     elif isinstance(condition, Mapping):
         dbg(f"Adding {condition} as attribute condition.")
         return MatchesAttributes(condition)
+    elif isinstance(condition, Key):
+        dbg(f"Adding {condition} as key condition.")
+        return condition._condition
     else:
         return condition
 
 
-class _CSSToXPathTranslator(cssselect.GenericTranslator):
-    def selector_to_xpath(self, *args, **kwargs):
-        result = super().selector_to_xpath(*args, **kwargs)
-        if result.startswith("descendant-or-self::"):
-            # though this should be equivalent, the abbreviated form proved
-            # to work in cases where the full wouldn't
-            result = result.replace("descendant-or-self::", "//", 1)
-        return result
+@lru_cache(maxsize=None)
+def _get_css_selector_translator() -> Tuple[Callable[[str], str], Type[Exception]]:
+    # cssselect is only imported when a condition may be a css selector
+    import cssselect
 
+    class _CSSToXPathTranslator(cssselect.GenericTranslator):
+        def selector_to_xpath(self, *args, **kwargs):
+            result = super().selector_to_xpath(*args, **kwargs)
+            if result.startswith("descendant-or-self::"):
+                # though this should be equivalent, the abbreviated form proved
+                # to work in cases where the full wouldn't
+                result = result.replace("descendant-or-self::", "//", 1)
+            return result
 
-_css_selector_translator = _CSSToXPathTranslator().css_to_xpath
+    return _CSSToXPathTranslator().css_to_xpath, cssselect.SelectorError
+
+
+def _translate_css_selector(selector: str) -> Optional[str]:
+    """ Returns the XPath expression that is equivalent to a css selector or ``None``
+        if ``selector`` isn't a css selector. """
+    translate, error = _get_css_selector_translator()
+    try:
+        return translate(selector)
+    except error:
+        return None
 
 
 def dot_lookup(obj: AnyType, name: str):
@@ -168,10 +252,47 @@ def _flatten_sequence(seq: Sequence):
     return tuple(result)
 
 
+def _get_candidates_selector(condition: Callable) -> Union[Callable, None]:
+    return getattr(condition, CANDIDATES_SELECTOR_ATTRIBUTE, None)
+
+
 def _is_any_node_condition(_, __):
     return True
 
 
+def _is_descendant_or_self(node: TagNode, ancestor: TagNode) -> bool:
+    while node is not None:
+        if node is ancestor:
+            return True
+        node = node.parent
+    return False
+
+
+def _has_ancestor_in(element: etree._Element, elements: Set[etree._Element]) -> bool:
+    return any(x in elements for x in element.iterancestors())
+
+
+def _count_ancestors(element: etree._Element) -> int:
+    return sum(1 for _ in element.iterancestors())
+
+
+def _skip_descendants(nodes: Iterator[TagNode]) -> None:
+    """ Requests from a traverser not to descend into the last yielded node. """
+    try:
+        nodes.send(True)
+    except StopIteration:
+        pass
+
+
+def _element_wrapper(node: Optional[TagNode]) -> Callable[[etree._Element], TagNode]:
+    """ Returns a function that returns the :class:`delb.TagNode` of an element in
+        the tree of ``node``, or of a new tree if ``node`` is ``None``. delb doesn't
+        provide a public interface to wrap :mod:`lxml` elements, its private one is
+        only used here. """
+    cache = {} if node is None else node._wrapper_cache
+    return partial(_get_or_create_element_wrapper, cache=cache)
+
+
 def _is_flow_control(obj: AnyType) -> bool:
     try:
         return issubclass(obj, FlowControl)
@@ -179,32 +300,530 @@ def _is_flow_control(obj: AnyType) -> bool:
         return False
 
 
+def _is_read_only(handler: Callable) -> bool:
+    """ Tests whether a :term:`handler function` is known not to modify the tree. """
+    if isinstance(handler, Transformation):
+        return bool(handler.config.read_only)
+    return _is_flow_control(handler) or hasattr(handler, READ_ONLY_ATTRIBUTE)
+
+
 def _is_root_condition(node: TagNode, transformation: "Transformation"):
     return node.parent is None
 
 
+def _iter_tag_nodes(root: TagNode, tag: AnyType) -> Iterator[TagNode]:
+    """ Yields the root and its descendants whose tag matches the ``tag`` argument of
+        :meth:`lxml.etree._Element.iter` in document order. """
+    # lxml's iteration is considerably faster than any traversal with delb's API
+    wrap = _element_wrapper(root)
+    for element in root._etree_obj.iter(tag):
+        yield wrap(element)
+
+
+def _select_by_attribute(
+    root: TagNode, name: str, value: Union[str, None]
+) -> Dict[int, TagNode]:
+    """ Returns the root and its descendants that have an attribute ``name``, with
+        the given ``value`` unless that is ``None``, in document order. """
+    # the evaluation is done with lxml because delb's XPath interface would
+    # restrict the wildcard to the root's default namespace
+    if name.startswith("{"):
+        namespace, local_name = name[1:].split("}", maxsplit=1)
+    else:
+        namespace, local_name = "", name
+    expression = (
+        "descendant-or-self::*[@*[namespace-uri()=$namespace and local-name()=$name"
+    )
+    if value is None:
+        expression += "]]"
+        variables = {}
+    else:
+        expression += " and .=$value]]"
+        variables = {"value": value}
+
+    wrap = _element_wrapper(root)
+    result = {}
+    for element in root._etree_obj.xpath(
+        expression, namespace=namespace, name=local_name, **variables
+    ):
+        node = wrap(element)
+        result[id(node)] = node
+    return result
+
+
 singleton_handler = lru_cache(HANDLER_CACHES_SIZE)
 
 
+# index
+
+
+def _document_order_key(node: TagNode) -> Tuple[int, ...]:
+    result = []
+    while node.parent is not None:
+        result.append(node.index)
+        node = node.parent
+    return tuple(reversed(result))
+
+
+class _Index:
+    """ The base class of indexes that map keys to buckets of nodes which are sorted
+        into document order when they're looked up. """
+
+    __slots__ = ("_unordered",)
+
+    @staticmethod
+    def _elements(node: TagNode, descendants: bool) -> Iterator[etree._Element]:
+        if descendants:
+            return node._etree_obj.iter(etree.Element)
+        return iter((node._etree_obj,))
+
+    def get(self, mapping: Dict[AnyType, Dict[int, TagNode]], key: AnyType):
+        """ Returns the nodes from the given ``mapping`` that are indexed with ``key``
+            in document order. """
+        bucket = mapping.get(key)
+        if bucket is None:
+            return {}
+        if id(bucket) in self._unordered:
+            nodes = sorted(bucket.values(), key=_document_order_key)
+            bucket.clear()
+            bucket.update((id(x), x) for x in nodes)
+            self._unordered.discard(id(bucket))
+        return bucket
+
+
+class _NodesIndex(_Index):
+    """ Maps the tag names, namespaces and attributes of a tree's tag nodes to these
+        nodes in document order. The index is built in one pass over the tree and must
+        be updated by handlers that change any of these properties. """
+
+    __slots__ = ("attribute_values", "attributes", "local_names", "names", "namespaces")
+
+    def __init__(self, root: TagNode):
+        self.attribute_values: Dict[Tuple[str, str], Dict[int, TagNode]] = {}
+        self.attributes: Dict[str, Dict[int, TagNode]] = {}
+        self.local_names: Dict[str, Dict[int, TagNode]] = {}
+        self.names: Dict[Tuple[Union[str, None], str], Dict[int, TagNode]] = {}
+        self.namespaces: Dict[Union[str, None], Dict[int, TagNode]] = {}
+        self._unordered = set()
+
+        self.add(root)
+        self._unordered.clear()
+
+    def _buckets(
+        self, element: etree._Element, create: bool
+    ) -> Iterator[Dict[int, TagNode]]:
+        tag = element.tag
+        if tag.startswith("{"):
+            namespace, local_name = tag[1:].split("}", maxsplit=1)
+        else:
+            namespace, local_name = None, tag
+        keys = [
+            (self.local_names, local_name),
+            (self.names, (namespace, local_name)),
+            (self.namespaces, namespace),
+        ]
+        for item in element.attrib.items():
+            keys.append((self.attributes, item[0]))
+            keys.append((self.attribute_values, item))
+
+        for mapping, key in keys:
+            if create:
+                yield mapping.setdefault(key, {})
+            elif key in mapping:
+                yield mapping[key]
+
+    def add(self, node: TagNode, descendants: bool = True) -> None:
+        """ Adds a node that was changed or attached to the tree and its
+            descendants unless ``descendants`` is ``False``. """
+        wrap = _element_wrapper(node)
+        for element in self._elements(node, descendants):
+            tag_node = wrap(element)
+            key = id(tag_node)
+            for bucket in self._buckets(element, create=True):
+                if key not in bucket:
+                    bucket[key] = tag_node
+                    self._unordered.add(id(bucket))
+
+    def discard(self, node: TagNode, descendants: bool = True) -> None:
+        """ Removes a node that is about to be changed or detached from the tree and
+            its descendants unless ``descendants`` is ``False``. """
+        wrap = _element_wrapper(node)
+        for element in self._elements(node, descendants):
+            key = id(wrap(element))
+            for bucket in self._buckets(element, create=False):
+                bucket.pop(key, None)
+
+
+class _KeyDefinition:
+    """ Holds the compiled arguments of :func:`inxs.lib.build_key`. A key whose
+        conditions are ``local`` only depends on the names and attributes of the
+        indexed nodes and can be updated with each changed node. """
+
+    __slots__ = ("conditions", "local", "match", "use")
+
+    def __init__(
+        self,
+        match: Union[ConditionType, Sequence[ConditionType]],
+        use: Union[str, Callable],
+    ):
+        if not isinstance(match, Sequence) or isinstance(match, str):
+            match = (match,)
+        self.conditions = tuple(_condition_factory(x) for x in _flatten_sequence(match))
+        self.local = _conditions_tree_is_local(
+            ("all", [_conditions_tree(x) for x in self.conditions])
+        )
+        self.match = _compile_conditions(self.conditions)
+        if isinstance(use, str):
+            self.use = lambda node: node.attributes.get(use)
+        else:
+            self.use = use
+
+
+class _KeyIndex(_Index):
+    """ Maps the values that a key's ``use`` function returns for the nodes which
+        match its conditions to these nodes in document order. Like the
+        :class:`_NodesIndex` it's built in one pass and must be updated by handlers
+        that change keyed nodes. """
+
+    __slots__ = ("definition", "transformation", "values")
+
+    def __init__(
+        self,
+        nodes: Iterator[TagNode],
+        definition: _KeyDefinition,
+        transformation: "Transformation",
+    ):
+        self.definition = definition
+        self.transformation = transformation
+        self.values: Dict[AnyType, Dict[int, TagNode]] = {}
+        self._unordered = set()
+
+        for node in nodes:
+            for value in self._values(node):
+                self.values.setdefault(value, {})[id(node)] = node
+
+    def _values(self, node: TagNode) -> Tuple[AnyType, ...]:
+        if not self.definition.match(node, self.transformation):
+            return ()
+        value = self.definition.use(node)
+        if value is None:
+            return ()
+        if isinstance(value, (frozenset, list, set, tuple)):
+            return tuple(value)
+        return (value,)
+
+    def add(self, node: TagNode, descendants: bool = True) -> None:
+        """ Adds a node that was changed or attached to the tree and its
+            descendants unless ``descendants`` is ``False``. """
+        wrap = _element_wrapper(node)
+        for element in self._elements(node, descendants):
+            tag_node = wrap(element)
+            for value in self._values(tag_node):
+                bucket = self.values.setdefault(value, {})
+                if id(tag_node) not in bucket:
+                    bucket[id(tag_node)] = tag_node
+                    self._unordered.add(id(bucket))
+
+    def discard(self, node: TagNode, descendants: bool = True) -> None:
+        """ Removes a node that is about to be changed or detached from the tree and
+            its descendants unless ``descendants`` is ``False``. """
+        wrap = _element_wrapper(node)
+        for element in self._elements(node, descendants):
+            tag_node = wrap(element)
+            for value in self._values(tag_node):
+                bucket = self.values.get(value)
+                if bucket is not None:
+                    bucket.pop(id(tag_node), None)
+
+
+class _Indexes:
+    """ Updates multiple indexes at once. """
+
+    __slots__ = ("indexes",)
+
+    def __init__(self, indexes: Sequence[_Index]):
+        self.indexes = indexes
+
+    def add(self, node: TagNode, descendants: bool = True) -> None:
+        for index in self.indexes:
+            index.add(node, descendants)
+
+    def discard(self, node: TagNode, descendants: bool = True) -> None:
+        for index in self.indexes:
+            index.discard(node, descendants)
+
+
 # traverser
 
 
-def traverse_df_ltr_btt(root: TagNode) -> Iterator[TagNode]:
-    def yield_children(node):
-        for child in tuple(node.child_nodes(is_tag_node)):
-            yield from yield_children(child)
-        yield node
+def _first_child_element(element: etree._Element) -> Union[etree._Element, None]:
+    return next(element.iterchildren(etree.Element), None)
+
+
+def _last_child_element(element: etree._Element) -> Union[etree._Element, None]:
+    return next(element.iterchildren(etree.Element, reversed=True), None)
+
 
-    yield from yield_children(root)
+def _next_sibling_element(element: etree._Element) -> Union[etree._Element, None]:
+    return next(element.itersiblings(etree.Element), None)
+
+
+def _previous_sibling_element(element: etree._Element) -> Union[etree._Element, None]:
+    return next(element.itersiblings(etree.Element, preceding=True), None)
+
+
+def _continuing_sibling(
+    element: etree._Element,
+    parent: etree._Element,
+    sibling: Union[etree._Element, None],
+    next_sibling: Callable,
+) -> Union[etree._Element, None]:
+    """ Returns the sibling that a traversal continues with after ``element`` was
+        yielded. That is determined anew if the element is still attached to
+        ``parent`` as a handler may have detached its siblings, otherwise the
+        ``sibling`` that was determined before is used if it's still in place. """
+    if element.getparent() is parent:
+        return next_sibling(element)
+    if sibling is not None and sibling.getparent() is parent:
+        return sibling
+    return None
+
+
+# the traversers are generators that accept a truthy value that is sent to them after
+# a node was yielded as request not to descend into that node's children, they then
+# yield None to acknowledge that. only top-to-bottom traversals can follow such a
+# request.
+
+
+def _traverse_depth_first_bottom_to_top(
+    root: TagNode, first_child: Callable, next_sibling: Callable
+) -> Iterator[TagNode]:
+    wrap = _element_wrapper(root)
+    parents: List[etree._Element] = []
+    element, descend = root._etree_obj, True
+
+    while True:
+        if descend:
+            child = first_child(element)
+            while child is not None:
+                parents.append(element)
+                element, child = child, first_child(child)
+
+        if not parents:
+            if (yield wrap(element)):
+                yield None
+            return
+
+        # determined beforehand as a handler may detach the node
+        sibling = next_sibling(element)
+        if (yield wrap(element)):
+            yield None
+        sibling = _continuing_sibling(element, parents[-1], sibling, next_sibling)
+        if sibling is None:
+            element, descend = parents.pop(), False
+        else:
+            element, descend = sibling, True
+
+
+def _traverse_depth_first_top_to_bottom(
+    root: TagNode, first_child: Callable, next_sibling: Callable
+) -> Iterator[TagNode]:
+    wrap = _element_wrapper(root)
+    root_element = root._etree_obj
+    if (yield root):
+        yield None
+        return
+
+    # the stacks hold the ancestors of the current element and their siblings that
+    # are to be continued with
+    parents, pending_siblings = [root_element], []
+    element = first_child(root_element)
+
+    while True:
+        if element is None:
+            parents.pop()
+            if not pending_siblings:
+                return
+            element = pending_siblings.pop()
+            continue
+
+        # determined beforehand as a handler may detach the node
+        sibling = next_sibling(element)
+        if (yield wrap(element)):
+            yield None
+            child = None
+        elif element.getparent() is parents[-1]:
+            child = first_child(element)
+        else:
+            child = None
+        sibling = _continuing_sibling(element, parents[-1], sibling, next_sibling)
+
+        if child is None:
+            element = sibling
+        else:
+            parents.append(element)
+            pending_siblings.append(sibling)
+            element = child
+
+
+def _traverse_width_first_bottom_to_top(
+    root: TagNode, right_to_left: bool
+) -> Iterator[TagNode]:
+    """ A width-first traversal from the bottom to the top is bottom-up by nature, the
+        deepest level can only be yielded after all others are known. Therefore this
+        traverser isn't lazy, it collects the elements of all levels in one pass from
+        the top to the bottom and yields them in reverse order. Wrappers are only
+        created for the elements that are yielded and the elements of a level are
+        released when it has been yielded. """
+    wrap = _element_wrapper(root)
+
+    levels = []
+    level = list(root._etree_obj.iterchildren(etree.Element, reversed=right_to_left))
+    while level:
+        levels.append(level)
+        level = [
+            y
+            for x in level
+            for y in x.iterchildren(etree.Element, reversed=right_to_left)
+        ]
+
+    while levels:
+        for element in levels.pop():
+            if (yield wrap(element)):
+                yield None
+
+    if (yield root):
+        yield None
+
+
+def _traverse_width_first_top_to_bottom(
+    root: TagNode, right_to_left: bool
+) -> Iterator[TagNode]:
+    wrap = _element_wrapper(root)
+    queue = deque(((root._etree_obj, root._etree_obj.getparent()),))
+
+    while queue:
+        element, parent = queue.popleft()
+        if (yield wrap(element)):
+            yield None
+        elif element.getparent() is parent:
+            queue.extend(
+                (x, element)
+                for x in element.iterchildren(etree.Element, reversed=right_to_left)
+            )
+
+
+def _limit_depth(
+    nodes: Iterator[TagNode], root: TagNode, max_depth: int, top_to_bottom: bool
+) -> Iterator[TagNode]:
+    """ Yields the nodes of a traverser that aren't more than ``max_depth`` levels
+        below ``root``. Top-to-bottom traversers are requested not to descend further,
+        deeper nodes are dropped otherwise. """
+    root_depth = _count_ancestors(root._etree_obj)
+    for node in nodes:
+        depth = _count_ancestors(node._etree_obj) - root_depth
+        if depth > max_depth:
+            continue
+        skip = yield node
+        if skip:
+            yield None
+        if skip or (top_to_bottom and depth == max_depth):
+            _skip_descendants(nodes)
+
+
+def traverse_df_ltr_btt(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_depth_first_bottom_to_top(
+        root, _first_child_element, _next_sibling_element
+    )
 
 
 def traverse_df_ltr_ttb(root: TagNode) -> Iterator[TagNode]:
-    yield root
-    yield from root.child_nodes(is_tag_node, recurse=True)
+    return _traverse_depth_first_top_to_bottom(
+        root, _first_child_element, _next_sibling_element
+    )
+
+
+def traverse_df_rtl_btt(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_depth_first_bottom_to_top(
+        root, _last_child_element, _previous_sibling_element
+    )
+
+
+def traverse_df_rtl_ttb(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_depth_first_top_to_bottom(
+        root, _last_child_element, _previous_sibling_element
+    )
 
 
 def traverse_root(root: TagNode) -> Iterator[TagNode]:
-    yield root
+    if (yield root):
+        yield None
+
+
+def traverse_wf_ltr_btt(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_width_first_bottom_to_top(root, right_to_left=False)
+
+
+def traverse_wf_ltr_ttb(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_width_first_top_to_bottom(root, right_to_left=False)
+
+
+def traverse_wf_rtl_btt(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_width_first_bottom_to_top(root, right_to_left=True)
+
+
+def traverse_wf_rtl_ttb(root: TagNode) -> Iterator[TagNode]:
+    return _traverse_width_first_top_to_bottom(root, right_to_left=True)
+
+
+# candidates orders
+# these take nodes in document order and return them in a traversal order
+
+
+def _order_df_ltr_btt(nodes: Sequence[TagNode]) -> List[TagNode]:
+    result, pending = [], []
+    for node in nodes:
+        while pending and not _is_descendant_or_self(node, pending[-1]):
+            result.append(pending.pop())
+        pending.append(node)
+    result.extend(reversed(pending))
+    return result
+
+
+def _order_df_ltr_ttb(nodes: Sequence[TagNode]) -> Sequence[TagNode]:
+    return nodes
+
+
+def _order_df_rtl_btt(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return list(reversed(nodes))
+
+
+def _order_df_rtl_ttb(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return list(reversed(_order_df_ltr_btt(nodes)))
+
+
+def _depth(node: TagNode) -> int:
+    result = 0
+    while node.parent is not None:
+        node = node.parent
+        result += 1
+    return result
+
+
+def _order_wf_ltr_btt(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return [x[2] for x in sorted((-_depth(x), i, x) for i, x in enumerate(nodes))]
+
+
+def _order_wf_ltr_ttb(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return [x[2] for x in sorted((_depth(x), i, x) for i, x in enumerate(nodes))]
+
+
+def _order_wf_rtl_btt(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return [x[2] for x in sorted((-_depth(x), -i, x) for i, x in enumerate(nodes))]
+
+
+def _order_wf_rtl_ttb(nodes: Sequence[TagNode]) -> List[TagNode]:
+    return [x[2] for x in sorted((_depth(x), -i, x) for i, x in enumerate(nodes))]
 
 
 # rules definition
@@ -219,6 +838,8 @@ def Any(*conditions: Sequence[ConditionType]) -> Callable:
     def evaluator(node: TagNode, transformation: Transformation) -> bool:
         return any(x(node, transformation) for x in conditions)
 
+    setattr(evaluator, COMBINATOR_ATTRIBUTE, ("any", conditions))
+
     return evaluator
 
 
@@ -228,7 +849,15 @@ def OneOf(*conditions: Sequence[ConditionType]) -> Callable:
     conditions = tuple(_condition_factory(x) for x in _flatten_sequence(conditions))
 
     def evaluator(node: TagNode, transformation: Transformation) -> bool:
-        return [x(node, transformation) for x in conditions].count(True) == 1
+        matched = False
+        for condition in conditions:
+            if condition(node, transformation):
+                if matched:
+                    return False
+                matched = True
+        return matched
+
+    setattr(evaluator, COMBINATOR_ATTRIBUTE, ("one", conditions))
 
     return evaluator
 
@@ -242,9 +871,321 @@ def Not(*conditions: Sequence[ConditionType]) -> Callable:
     def evaluator(node: TagNode, transformation: Transformation) -> bool:
         return not any(x(node, transformation) for x in conditions)
 
+    setattr(evaluator, COMBINATOR_ATTRIBUTE, ("not", conditions))
+
+    return evaluator
+
+
+# conditions compilation
+
+# the nodes of a conditions' tree are tuples of a kind and a payload:
+# ("leaf", condition), ("constant", boolean), ("all", children), ("any", children),
+# ("not", child) and ("one", ((child, weight), ...))
+
+
+def _conditions_tree(condition: Callable) -> Tuple[str, AnyType]:
+    combinator = getattr(condition, COMBINATOR_ATTRIBUTE, None)
+    if combinator is not None:
+        kind, conditions = combinator
+        children = [_conditions_tree(x) for x in conditions]
+        if kind == "not":
+            return "not", ("any", children)
+        elif kind == "one":
+            return "one", tuple((x, 1) for x in children)
+        return kind, children
+
+    if condition is _is_any_node_condition:
+        return "constant", True
+
+    constant = getattr(condition, CONSTANT_CONDITION_ATTRIBUTE, None)
+    if constant is not None:
+        try:
+            return "constant", bool(constant())
+        except Exception:
+            pass
+
+    return "leaf", condition
+
+
+def _conditions_tree_key(tree: Tuple[str, AnyType]) -> Tuple:
+    kind, payload = tree
+    if kind == "leaf":
+        return kind, id(payload)
+    elif kind == "constant":
+        return tree
+    elif kind == "not":
+        return kind, _conditions_tree_key(payload)
+    elif kind == "one":
+        return kind, tuple((_conditions_tree_key(x), w) for x, w in payload)
+    return kind, tuple(_conditions_tree_key(x) for x in payload)
+
+
+def _conditions_tree_cost(tree: Tuple[str, AnyType]) -> Optional[int]:
+    """ Returns the estimated cost to evaluate a conditions' tree, ``None`` if it
+        contains conditions of unknown cost. """
+    kind, payload = tree
+    if kind == "leaf":
+        return getattr(payload, CONDITION_COST_ATTRIBUTE, None)
+    elif kind == "constant":
+        return 0
+    elif kind == "not":
+        return _conditions_tree_cost(payload)
+    elif kind == "one":
+        children = [x for x, _ in payload]
+    else:
+        children = payload
+    costs = [_conditions_tree_cost(x) for x in children]
+    return None if None in costs else sum(costs)
+
+
+def _conditions_tree_is_local(tree: Tuple[str, AnyType]) -> bool:
+    """ Tests whether a conditions' tree only depends on the tested node's name,
+        namespace and attributes. """
+    kind, payload = tree
+    if kind == "leaf":
+        return hasattr(payload, LOCAL_CONDITION_ATTRIBUTE)
+    elif kind == "constant":
+        return True
+    elif kind == "not":
+        return _conditions_tree_is_local(payload)
+    elif kind == "one":
+        return all(_conditions_tree_is_local(x) for x, _ in payload)
+    return all(_conditions_tree_is_local(x) for x in payload)
+
+
+def _simplify_conditions_tree(tree: Tuple[str, AnyType]) -> Tuple[str, AnyType]:
+    """ Folds constants, removes redundant conditions and orders the operands of
+        conjunctions and disjunctions so that those with a known low cost are
+        evaluated first. Operands of unknown cost, e.g. custom functions, are never
+        moved ahead of others as they may rely on preceding tests. """
+    kind, payload = tree
+
+    if kind in ("leaf", "constant"):
+        return tree
+
+    elif kind == "not":
+        child = _simplify_conditions_tree(payload)
+        if child[0] == "constant":
+            return "constant", not child[1]
+        return kind, child
+
+    elif kind == "one":
+        weights: Dict[Tuple, int] = {}
+        children: Dict[Tuple, Tuple[str, AnyType]] = {}
+        hits = 0
+        for child, weight in payload:
+            child = _simplify_conditions_tree(child)
+            if child[0] == "constant":
+                hits += weight if child[1] else 0
+                continue
+            key = _conditions_tree_key(child)
+            children[key] = child
+            weights[key] = weights.get(key, 0) + weight
+        if hits > 1:
+            return "constant", False
+        if hits == 1:
+            # none of the others must match
+            return _simplify_conditions_tree(("not", ("any", list(children.values()))))
+        if not children:
+            return "constant", False
+        if len(children) == 1:
+            (key, child), = children.items()
+            return child if weights[key] == 1 else ("constant", False)
+        return kind, tuple((children[x], weights[x]) for x in children)
+
+    # a conjunction ("all") or disjunction ("any")
+    neutral, absorbing = kind == "all", kind == "any"
+    other_kind = "any" if kind == "all" else "all"
+
+    operands: Dict[Tuple, Tuple[str, AnyType]] = {}
+    for child in payload:
+        child = _simplify_conditions_tree(child)
+        if child[0] == kind:
+            flattened = child[1]
+        else:
+            flattened = (child,)
+        for operand in flattened:
+            if operand[0] == "constant":
+                if operand[1] is absorbing:
+                    return operand
+                continue
+            operands.setdefault(_conditions_tree_key(operand), operand)
+
+    # e.g. in `a and (a or b)` the disjunction is redundant
+    keys = set(operands)
+    for key, operand in tuple(operands.items()):
+        if operand[0] == other_kind and any(
+            _conditions_tree_key(x) in keys for x in operand[1]
+        ):
+            del operands[key]
+
+    if not operands:
+        return "constant", neutral
+    if len(operands) == 1:
+        return next(iter(operands.values()))
+
+    known, unknown = [], []
+    for operand in operands.values():
+        cost = _conditions_tree_cost(operand)
+        if cost is None:
+            unknown.append(operand)
+        else:
+            known.append((cost, len(known), operand))
+    return kind, [x[2] for x in sorted(known)] + unknown
+
+
+def _one_of_weighted(conditions: Sequence[Tuple[Callable, int]]) -> Callable:
+    def evaluator(node: TagNode, transformation: Transformation) -> bool:
+        hits = 0
+        for condition, weight in conditions:
+            if condition(node, transformation):
+                hits += weight
+                if hits > 1:
+                    return False
+        return hits == 1
+
+    return evaluator
+
+
+def _constant_condition(value: bool) -> Callable:
+    def evaluator(_, __) -> bool:
+        return value
+
     return evaluator
 
 
+def _generate_conditions_evaluator(tree: Tuple[str, AnyType]) -> Callable:
+    """ Generates a function that evaluates a conditions' tree in one boolean
+        expression. """
+    kind, payload = tree
+    if kind == "leaf":
+        return payload
+    elif kind == "constant":
+        return _is_any_node_condition if payload else _constant_condition(False)
+
+    namespace: Dict[str, AnyType] = {}
+
+    def bind(obj: Callable) -> str:
+        name = f"c{len(namespace)}"
+        namespace[name] = obj
+        return f"{name}(node, transformation)"
+
+    def expression(tree: Tuple[str, AnyType]) -> str:
+        kind, payload = tree
+        if kind == "leaf":
+            return bind(payload)
+        elif kind == "constant":
+            return repr(payload)
+        elif kind == "not":
+            return f"(not {expression(payload)})"
+        elif kind == "one":
+            return bind(
+                _one_of_weighted(
+                    tuple((_generate_conditions_evaluator(x), w) for x, w in payload)
+                )
+            )
+        operator = " and " if kind == "all" else " or "
+        return "(" + operator.join(expression(x) for x in payload) + ")"
+
+    source = "def evaluator(node, transformation):\n" f"    return {expression(tree)}\n"
+    exec(compile(source, "<inxs conditions>", "exec"), namespace)
+    return namespace["evaluator"]
+
+
+def _compile_conditions(conditions: Sequence[Callable]) -> Callable:
+    """ Returns one function that evaluates whether all of the given conditions
+        match, including those that are nested with :func:`Any`, :func:`Not` and
+        :func:`OneOf`. """
+    tree = _simplify_conditions_tree(("all", [_conditions_tree(x) for x in conditions]))
+    dbg(f"Compiled conditions tree: {tree}")
+    return _generate_conditions_evaluator(tree)
+
+
+class _AdaptiveConditions:
+    """ Evaluates a rule's conditions like the function that :func:`_compile_conditions`
+        returns. For the first ``sample_size`` calls it measures how long each
+        side-effect free operand of the outermost conjunction takes and how often it
+        fails, these operands are then tested for every node. Afterwards they are
+        ordered by their mean time divided by their rate of failures, which minimizes
+        the expected time to evaluate the conjunction, and compiled into one
+        function that is bound as ``compiled`` attribute.
+        The conditions are evaluated outside of a lock, the measurements of concurrent
+        calls from multiple threads are then added to the statistics under it. """
+
+    __slots__ = (
+        "calls",
+        "compiled",
+        "lock",
+        "others",
+        "others_evaluator",
+        "sample_size",
+        "statistics",
+    )
+
+    def __init__(self, conditions: Sequence[Callable], sample_size: int):
+        tree = _simplify_conditions_tree(
+            ("all", [_conditions_tree(x) for x in conditions])
+        )
+        operands = tree[1] if tree[0] == "all" else [tree]
+        # the evaluator, failures and total time per side-effect free operand
+        self.statistics: List[List] = []
+        self.others: List[Tuple[str, AnyType]] = []
+        for operand in operands:
+            if _conditions_tree_cost(operand) is None:
+                self.others.append(operand)
+            else:
+                self.statistics.append(
+                    [operand, _generate_conditions_evaluator(operand), 0, 0.0]
+                )
+
+        self.calls = 0
+        self.lock = Lock()
+        self.sample_size = sample_size
+        self.compiled: Optional[Callable] = None
+        if len(self.statistics) < 2:
+            self.compiled = _generate_conditions_evaluator(tree)
+        else:
+            self.others_evaluator = _generate_conditions_evaluator(
+                _simplify_conditions_tree(("all", self.others))
+            )
+
+    def __call__(self, node: TagNode, transformation: "Transformation") -> bool:
+        if self.compiled is not None:
+            return self.compiled(node, transformation)
+
+        result = True
+        measurements = []
+        for statistics in self.statistics:
+            started = perf_counter()
+            matched = statistics[1](node, transformation)
+            measurements.append((not matched, perf_counter() - started))
+            if not matched:
+                result = False
+
+        with self.lock:
+            # another thread may have compiled the conditions in the meantime
+            if self.compiled is None:
+                for statistics, (failed, time) in zip(self.statistics, measurements):
+                    statistics[2] += failed
+                    statistics[3] += time
+                self.calls += 1
+                if self.calls >= self.sample_size:
+                    self._compile()
+
+        return result and self.others_evaluator(node, transformation)
+
+    def _compile(self) -> None:
+        calls = self.calls
+        ranks = sorted(
+            ((total_time / calls) / max(failures / calls, 0.5 / calls), i, operand)
+            for i, (operand, _, failures, total_time) in enumerate(self.statistics)
+        )
+        dbg(f"Ordered conditions by their measured costs: {ranks}")
+        self.compiled = _generate_conditions_evaluator(
+            ("all", [x[2] for x in ranks] + self.others)
+        )
+
+
 @singleton_handler
 def HasNamespace(namespace: AnyStr) -> Callable:
     """ Returns a callable that tests an node for the given tag namespace. """
@@ -252,6 +1193,18 @@ def HasNamespace(namespace: AnyStr) -> Callable:
     def evaluator(node: TagNode, _) -> bool:
         return node.namespace == namespace
 
+    def select_candidates(transformation: Transformation) -> Dict[int, TagNode]:
+        index = transformation._get_index()
+        if index is not None:
+            return index.get(index.namespaces, namespace)
+        # lxml matches the elements without a namespace with an empty one
+        tag = "{" + ("" if namespace is None else namespace) + "}*"
+        return {id(x): x for x in _iter_tag_nodes(transformation.root, tag)}
+
+    setattr(evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, select_candidates)
+    setattr(evaluator, CONDITION_COST_ATTRIBUTE, NAME_TEST_COST)
+    setattr(evaluator, LOCAL_CONDITION_ATTRIBUTE, None)
+
     return evaluator
 
 
@@ -262,23 +1215,120 @@ def HasLocalname(name: AnyStr) -> Callable:
     def evaluator(node: TagNode, _) -> bool:
         return node.local_name == name
 
+    def select_candidates(transformation: Transformation) -> Dict[int, TagNode]:
+        index = transformation._get_index()
+        if index is not None:
+            return index.get(index.local_names, name)
+        return {id(x): x for x in _iter_tag_nodes(transformation.root, "{*}" + name)}
+
+    setattr(evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, select_candidates)
+    setattr(evaluator, CONDITION_COST_ATTRIBUTE, NAME_TEST_COST)
+    setattr(evaluator, LOCAL_CONDITION_ATTRIBUTE, None)
+
     return evaluator
 
 
+def _compiled_selector_evaluator(binder: Callable, xpath: str) -> Callable:
+    """ Returns a condition evaluator for a selector that was compiled by
+        :mod:`inxs.selectors`. The equivalent XPath expression is evaluated if the
+        selector can't be bound to the :term:`transformation root`. """
+
+    def evaluator(node: TagNode, transformation: Transformation) -> bool:
+        bound = transformation._bind_selector(binder)
+        if bound is None:
+            return id(node) in transformation._evaluate_xpath(xpath)
+        return bound[0](node._etree_obj)
+
+    def select_candidates(transformation: Transformation) -> Dict[int, TagNode]:
+        bound = transformation._bind_selector(binder)
+        if bound is None:
+            return transformation._evaluate_xpath(xpath)
+        predicate, tag = bound
+        root = transformation.root
+        wrap = _element_wrapper(root)
+        result = {}
+        for element in root._etree_obj.iter(tag):
+            if predicate(element):
+                node = wrap(element)
+                result[id(node)] = node
+        return result
+
+    setattr(evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, select_candidates)
+    setattr(evaluator, CONDITION_COST_ATTRIBUTE, COMPILED_SELECTOR_COST)
+
+    return evaluator
+
+
+@singleton_handler
+def MatchesCSSSelector(selector: str) -> Callable:
+    """ Returns a callable that tests a node for the given css selector. The selector
+        is matched from right to left against the node, its ancestors and siblings
+        without an evaluation on the whole document. Selectors with pseudo-classes
+        or pseudo-elements that can't be matched that way are translated to an XPath
+        expression that is tested with :func:`MatchesXPath`.
+        Names without a namespace prefix refer to the default namespace of the
+        :term:`transformation root`, other prefixes are looked up in its namespace
+        declarations. """
+    from inxs.selectors import compile_css_selector
+
+    xpath = _translate_css_selector(selector)
+    if xpath is None:
+        raise InxsException(f"'{selector}' is not a valid css selector.")
+
+    binder = compile_css_selector(selector)
+    if binder is None:
+        dbg(f"Translated css selector '{selector}' to XPath expression '{xpath}'.")
+        return MatchesXPath(xpath)
+
+    return _compiled_selector_evaluator(binder, xpath)
+
+
 @singleton_handler
 def MatchesXPath(xpath: Union[str, Callable]) -> Callable:
     """ Returns a callable that tests an node for the given XPath expression (whether
         the evaluation result on the :term:`transformation root` contains it).
         If the ``xpath`` argument is a callable, it will be called with the current
-        transformation as argument to obtain the expression. """
+        transformation as argument to obtain the expression.
+        Expressions that consist of location paths with the axes and tests that
+        :func:`inxs.selectors.compile_xpath` supports are matched locally against
+        the node and its ancestors. Other expressions are evaluated on the
+        transformation root and the results are cached during a transformation until
+        a handler function that may have changed the tree was applied. """
+    if not callable(xpath):
+        from inxs.selectors import compile_xpath
+
+        binder = compile_xpath(xpath)
+        if binder is not None:
+            return _compiled_selector_evaluator(binder, xpath)
 
     def callable_evaluator(node: TagNode, transformation: Transformation) -> bool:
         _xpath = xpath(transformation)
-        dbg(f"Resolved XPath from callable: '{_xpath}'")
-        return node in transformation.root.xpath(_xpath)
+        if transformation.states.trace:
+            dbg(f"Resolved XPath from callable: '{_xpath}'")
+        return id(node) in transformation._evaluate_xpath(_xpath)
 
     def string_evaluator(node: TagNode, transformation: Transformation) -> bool:
-        return node in transformation.root.xpath(xpath)
+        return id(node) in transformation._evaluate_xpath(xpath)
+
+    def select_candidates_from_callable(
+        transformation: Transformation
+    ) -> Dict[int, TagNode]:
+        return transformation._evaluate_xpath(xpath(transformation))
+
+    def select_candidates_from_string(
+        transformation: Transformation
+    ) -> Dict[int, TagNode]:
+        return transformation._evaluate_xpath(xpath)
+
+    setattr(
+        callable_evaluator,
+        CANDIDATES_SELECTOR_ATTRIBUTE,
+        select_candidates_from_callable,
+    )
+    setattr(
+        string_evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, select_candidates_from_string
+    )
+    setattr(string_evaluator, CONDITION_COST_ATTRIBUTE, XPATH_EVALUATION_COST)
 
     return callable_evaluator if callable(xpath) else string_evaluator
 
@@ -297,7 +1347,8 @@ def MatchesAttributes(constraints: AttributesConditionType) -> Callable:
 
     def callable_evaluator(node: TagNode, transformation: Transformation):
         _constraints = constraints(transformation)
-        dbg(f"Resolved attributes' constraints from callable: '{_constraints}'")
+        if transformation.states.trace:
+            dbg(f"Resolved attributes' constraints from callable: '{_constraints}'")
         return MatchesAttributes(_constraints)(node, transformation)
 
     if callable(constraints):
@@ -310,6 +1361,11 @@ def MatchesAttributes(constraints: AttributesConditionType) -> Callable:
     key_re_constraints = {
         k: v for k, v in constraints.items() if isinstance(k, Pattern) and v is not None
     }
+    selectable_constraints = tuple(
+        (k, v)
+        for k, v in constraints.items()
+        if isinstance(k, str) and (v is None or isinstance(v, str))
+    )
 
     def evaluator(node: TagNode, _) -> bool:
         attributes = node.attributes
@@ -355,6 +1411,27 @@ def MatchesAttributes(constraints: AttributesConditionType) -> Callable:
 
         return True
 
+    def select_candidates(transformation: Transformation) -> Dict[int, TagNode]:
+        index = transformation._get_index()
+        if index is None:
+            # constraints with a value are supposedly more selective
+            key, value = max(selectable_constraints, key=lambda x: x[1] is not None)
+            return _select_by_attribute(transformation.root, key, value)
+        return min(
+            (
+                index.get(index.attributes, key)
+                if value is None
+                else index.get(index.attribute_values, (key, value))
+                for key, value in selectable_constraints
+            ),
+            key=len,
+        )
+
+    if selectable_constraints:
+        setattr(evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, select_candidates)
+    setattr(evaluator, CONDITION_COST_ATTRIBUTE, ATTRIBUTES_TEST_COST)
+    setattr(evaluator, LOCAL_CONDITION_ATTRIBUTE, None)
+
     return evaluator
 
 
@@ -368,13 +1445,11 @@ def Ref(name: str) -> Callable:
     """
 
     def simple_resolver(transformation: Transformation) -> AnyType:
-        dbg("Resolving {name}.")
         return transformation._available_symbols[name]
 
     setattr(simple_resolver, REF_IDENTIFYING_ATTRIBUTE, None)
 
     def dot_resolver(transformation: Transformation) -> AnyType:
-        dbg(f"Resolving {name}.")
         token = name.split(".")
         obj = transformation._available_symbols[token[0]]
         for _name in token[1:]:
@@ -401,30 +1476,77 @@ def If(x: AnyType, operator: Callable, y: AnyType) -> Callable:
 
     # TODO allow single arguments
     # TODO? allow primitive expressions for stdlib.operator's members
+    x_plan = _HandlerPlan(x) if callable(x) else None
+    y_plan = _HandlerPlan(y) if callable(y) else None
+
     def evaluator(_, transformation: Transformation) -> AnyType:
-        if callable(x):
-            _x = x(
-                **dependency_injection.resolve_dependencies(
-                    x, transformation._available_symbols
-                ).as_kwargs
-            )
-            dbg(f"x resolved to '{_x}'")
+        trace = transformation.states.trace
+        if x_plan is not None:
+            _x = x_plan(transformation)
+            if trace:
+                dbg(f"x resolved to '{_x}'")
         else:
             _x = x
-        if callable(y):
-            _y = y(
-                **dependency_injection.resolve_dependencies(
-                    y, transformation._available_symbols
-                ).as_kwargs
-            )
-            dbg(f"y resolved to '{_y}'")
+        if y_plan is not None:
+            _y = y_plan(transformation)
+            if trace:
+                dbg(f"y resolved to '{_y}'")
         else:
             _y = y
         return operator(_x, _y)
 
+    if x_plan is None and y_plan is None:
+        setattr(evaluator, CONSTANT_CONDITION_ATTRIBUTE, partial(operator, x, y))
+
     return evaluator
 
 
+class Key:
+    """ Refers to the nodes that the key named ``name``, which is built by an
+        :func:`inxs.lib.build_key` step, has indexed with ``value``. An instance can
+        be used like a :func:`Ref` to resolve these nodes as list in document order,
+        and as condition of a :class:`Rule` that matches these nodes. ``value`` can
+        be given as callable that is called like a :term:`handler function` to get
+        the value during the processing, e.g. a :func:`Ref`. See :ref:`keys`.
+
+        Examples:
+
+        >>> Key('ids', lib.get_attribute('corresp'))  # doctest: +SKIP
+    """
+
+    __slots__ = ("name", "value", "_condition", "_value_plan")
+
+    def __init__(self, name: str, value: AnyType):
+        self.name = name
+        self.value = value
+        self._value_plan = _HandlerPlan(value) if callable(value) else None
+
+        def evaluator(node: TagNode, transformation: Transformation) -> bool:
+            return id(node) in self._lookup(transformation)
+
+        if self._value_plan is None:
+            setattr(evaluator, CANDIDATES_SELECTOR_ATTRIBUTE, self._lookup)
+            setattr(evaluator, CONDITION_COST_ATTRIBUTE, ATTRIBUTES_TEST_COST)
+        self._condition = evaluator
+
+    def __call__(self, transformation: "Transformation") -> List[TagNode]:
+        return list(self._lookup(transformation).values())
+
+    def __repr__(self):
+        return f"Key({self.name!r}, {self.value!r})"
+
+    def _lookup(self, transformation: "Transformation") -> Dict[int, TagNode]:
+        if self._value_plan is None:
+            value = self.value
+        else:
+            value = self._value_plan(transformation)
+        key = transformation._get_key(self.name)
+        return key.get(key.values, value)
+
+
+setattr(Key, REF_IDENTIFYING_ATTRIBUTE, None)
+
+
 class Rule:
     """ Instances of this class can be used as conditional :term:`transformation
         steps` that are evaluated against all traversed nodes.
@@ -451,9 +1573,46 @@ class Rule:
                                 :attr:`Transformation.config.traversal_order`, see
                                 :ref:`traversal_strategies` for details.
         :type traversal_order: Integer.
+        :param read_only: Declares that the rule's handlers don't modify the document
+                          tree. Cached evaluation results, e.g. of XPath expressions,
+                          are then retained after its handlers were applied. This is
+                          implied when all handlers are known not to modify the tree,
+                          e.g. the ones from :mod:`inxs.lib` that only read from it.
+        :type read_only: Boolean.
+        :param record: The name of the record elements that the rule is applied to
+                       by a :class:`inxs.streaming.StreamingTransformation`, either
+                       as local name or in Clark notation. Defaults to the
+                       transformation's ``record`` configuration value.
+        :type record: String.
+        :param prune: Conditions that prevent the descendants of a node from being
+                      traversed by this rule when all of them match, regardless
+                      whether the node itself matched the rule's conditions. This
+                      has only an effect with top-to-bottom traversal orders, see
+                      :ref:`pruning`. Rules with such conditions don't select
+                      candidates and aren't fused.
+        :type prune: A single callable, string or mapping, or a :term:`sequence`
+                     of such.
+        :param scope: Conditions that the roots of the subtrees match which this
+                      rule is restricted to. Only the outermost matching nodes are
+                      considered, see :ref:`scopes`.
+        :type scope: A single callable, string or mapping, or a :term:`sequence`
+                     of such.
+        :param max_depth: The number of levels below the scopes' roots, or the
+                          transformation root, that this rule is applied to.
+        :type max_depth: Integer.
     """
 
-    __slots__ = ("name", "conditions", "handlers", "traversal_order")
+    __slots__ = (
+        "name",
+        "conditions",
+        "handlers",
+        "traversal_order",
+        "read_only",
+        "record",
+        "prune",
+        "scope",
+        "max_depth",
+    )
 
     def __init__(
         self,
@@ -461,6 +1620,11 @@ class Rule:
         handlers: Union[Callable, Sequence[Callable]],
         name: str = None,
         traversal_order: int = None,
+        read_only: bool = False,
+        record: str = None,
+        prune: Union[ConditionType, Sequence[ConditionType], None] = None,
+        scope: Union[ConditionType, Sequence[ConditionType], None] = None,
+        max_depth: int = None,
     ) -> None:
 
         self.name: str = name
@@ -480,6 +1644,32 @@ class Rule:
             handlers = (handlers,)
         self.handlers = _flatten_sequence(handlers)
         self.traversal_order = traversal_order
+        self.read_only = read_only or all(_is_read_only(x) for x in self.handlers)
+        self.record = record
+
+        if prune is None:
+            self.prune: Optional[Callable] = None
+        else:
+            if not isinstance(prune, Sequence) or isinstance(prune, str):
+                prune = (prune,)
+            self.prune = _compile_conditions(
+                tuple(_condition_factory(x) for x in _flatten_sequence(prune))
+            )
+
+        if scope is None:
+            self.scope: Optional[Tuple[Callable, ...]] = None
+        else:
+            if not isinstance(scope, Sequence) or isinstance(scope, str):
+                scope = (scope,)
+            self.scope = tuple(_condition_factory(x) for x in _flatten_sequence(scope))
+        self.max_depth = max_depth
+
+    @property
+    def _restricts_traversal(self) -> bool:
+        """ Whether the rule may not traverse all nodes per se. """
+        return not (
+            self.prune is None and self.scope is None and self.max_depth is None
+        )
 
 
 class Once(Rule):
@@ -490,15 +1680,185 @@ class Once(Rule):
         self.handlers += (AbortRule,)
 
 
+# batch processing
+
+
+BatchInputType = Union[Document, TagNode, bytes, str, PathLike]
+
+_batch_transformation = None
+""" The transformation that is applied by a worker process of
+    :meth:`Transformation.map`. """
+
+
+class _SerializedTree:
+    """ Wraps a tree that is passed between processes as serialized XML. """
+
+    __slots__ = ("data", "is_document")
+
+    def __init__(self, tree: Union[Document, TagNode]):
+        self.data = str(tree).encode("utf-8")
+        self.is_document = isinstance(tree, Document)
+
+    def load(self) -> Union[Document, TagNode]:
+        document = Document(self.data)
+        return document if self.is_document else document.root
+
+
+def _init_batch_worker(transformation: "Transformation") -> None:
+    global _batch_transformation
+    _batch_transformation = transformation
+
+
+def _load_batch_input(input: BatchInputType) -> Tuple[Union[Document, TagNode], bool]:
+    """ Returns the tree to process and whether it was loaded, hence doesn't need to
+        be copied. """
+    if isinstance(input, (Document, TagNode)):
+        return input, False
+    if isinstance(input, _SerializedTree):
+        return input.load(), True
+    if isinstance(input, str):
+        input = Path(input)
+    return Document(input), True
+
+
+def _transform_batch_input(
+    transformation: "Transformation",
+    input: BatchInputType,
+    copy: Union[bool, None],
+    context: Dict[str, AnyType],
+) -> AnyType:
+    input, loaded = _load_batch_input(input)
+    return transformation(input, copy=False if loaded else copy, **context)
+
+
+def _transform_batch_input_in_process(
+    input: BatchInputType, copy: Union[bool, None], context: Dict[str, AnyType]
+) -> AnyType:
+    result = _transform_batch_input(_batch_transformation, input, copy, context)
+    if isinstance(result, (Document, TagNode)):
+        return _SerializedTree(result)
+    return result
+
+
+def _yield_batch_results(
+    executor: Executor,
+    function: Callable,
+    inputs: Iterable[AnyType],
+    window: int,
+    ordered: bool,
+) -> Iterator[AnyType]:
+    # only a limited number of inputs is submitted at a time to keep the memory
+    # consumption independent from the number of inputs
+    if ordered:
+        pending = deque()
+        for input in inputs:
+            pending.append(executor.submit(function, input))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    else:
+        pending = set()
+        for input in inputs:
+            pending.add(executor.submit(function, input))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
 # transformation
 
 
+class _HandlerPlan:
+    """ Holds the result of a once analysed signature of a :term:`handler function`
+        and calls it with the symbols that it requires. """
+
+    __slots__ = (
+        "handler",
+        "parameters",
+        "defaults",
+        "is_flow_control",
+        "is_transformation",
+        "signal",
+        "maintains_index",
+        "is_read_only",
+    )
+
+    def __init__(self, handler: Callable):
+        self.handler = handler
+        self.is_flow_control = _is_flow_control(handler)
+        self.is_transformation = isinstance(handler, Transformation)
+        self.maintains_index = self.is_flow_control or hasattr(
+            handler, MAINTAINS_INDEX_ATTRIBUTE
+        )
+        self.is_read_only = _is_read_only(handler)
+        self.signal = (
+            _FLOW_CONTROL_SIGNALS.get(handler) if self.is_flow_control else None
+        )
+        if self.is_flow_control or self.is_transformation:
+            self.parameters, self.defaults = (), {}
+        else:
+            signature = dependency_injection.get_signature(handler)
+            self.parameters = signature.parameters
+            self.defaults = signature.optional
+            # the signatures of bound methods and callable objects contain the
+            # instance that is passed implicitly
+            if (
+                self.parameters
+                and self.parameters[0] == "self"
+                and not inspect.isfunction(handler)
+            ):
+                self.parameters = self.parameters[1:]
+
+    def __call__(self, transformation: "Transformation") -> AnyType:
+        if self.is_flow_control:
+            if self.signal is None:
+                raise self.handler
+            return self.signal
+
+        states = transformation.states
+        if self.is_transformation:
+            return self.handler(input=states.current_node or states.root, copy=False)
+
+        symbols = states.symbols_chain
+        args = []
+        for name in self.parameters:
+            if name == "node":
+                args.append(states.current_node)
+            elif name == "previous_result":
+                args.append(states.previous_result)
+            elif name in symbols:
+                args.append(symbols[name])
+            elif name in self.defaults:
+                args.append(self.defaults[name])
+            else:
+                # let the call fail or leave it to a bound method's self
+                return self.handler(**self._resolve_kwargs(transformation))
+        return self.handler(*args)
+
+    def _resolve_kwargs(self, transformation: "Transformation") -> Dict[str, AnyType]:
+        symbols = transformation._available_symbols
+        result = {}
+        for name in self.parameters:
+            if name in symbols:
+                result[name] = symbols[name]
+            elif name in self.defaults:
+                result[name] = self.defaults[name]
+        return result
+
+
 class Transformation:
     """ A transformation instance is defined by its :term:`transformation steps` and
         :term:`configuration`. It is to be called with a :class:`delb.Document` or
         :class:`delb.TagNode` instance as :term:`transformation root`, only this node
         (or the root node of a ``Document``) and its children will be considered during
-        traversal.
+        traversal. The states of a call are bound to the calling thread, hence an
+        instance can be called concurrently from multiple threads and reentrantly
+        from its own handlers.
 
         :param steps: The designated transformation steps of the instance are given
                       as a sequence of positional arguments.
@@ -513,6 +1873,13 @@ class Transformation:
                        - ``context`` can be provided as mapping with items that are
                          added to the :term:`context` before a (sub-)document is
                          processed.
+                       - ``adaptive_conditions`` enables the reordering of rules'
+                         conditions by their costs and selectivity that are measured
+                         during the first calls, see :ref:`adaptive_conditions`. It
+                         defaults to ``False``, ``True`` sets the number of measured
+                         calls per rule to
+                         :attr:`~inxs.Transformation.conditions_sample_size`,
+                         alternatively that number can be given.
                        - ``common_rule_conditions`` can be used to define one or more
                          conditions that must match in all rule evaluations. E.g. a
                          transformation could be restricted to nodes with a
@@ -520,7 +1887,31 @@ class Transformation:
                          Can be given as a single object (e.g. a string) or as sequence.
                        - ``copy`` is a boolean that defaults to ``True`` and indicates
                          whether to process on a copy of the document's tree object.
+                       - ``fuse_rules`` is a boolean that defaults to ``False``. When
+                         enabled, adjacent rules that share a traversal order are
+                         evaluated during one traversal, see :ref:`fused_rules`.
+                         Rules whose candidates can be selected are never fused.
+                       - ``index`` is a boolean that defaults to ``False``. When
+                         enabled, the tag nodes are indexed by their names,
+                         namespaces and attributes once per transformation call. The
+                         index is then used to select rule candidates, see
+                         :ref:`candidates_selection`.
                        - ``name`` can be used to identify a transformation.
+                       - ``profile`` is a boolean that defaults to ``False``. When
+                         enabled, statistics about the evaluation of steps, conditions
+                         and handlers are collected in the transformation's
+                         :attr:`profile`, see :ref:`profiling`.
+                       - ``read_only`` declares whether the transformation modifies
+                         the processed tree. It defaults to ``None`` and is then
+                         determined as ``True`` if all rules are read-only and all
+                         simple steps are known not to modify the tree. A read-only
+                         transformation doesn't copy the tree unless the
+                         ``result_object`` is ``'root'`` or a call's ``copy``
+                         argument is ``True``.
+                       - ``select_candidates`` is a boolean that defaults to ``True``
+                         and allows rules to only consider the nodes that one of their
+                         conditions selects instead of traversing all nodes, see
+                         :ref:`candidates_selection`.
                        - ``result_object`` sets the transformation's attribute that
                          is returned as result. Dot-notation lookup (e.g.
                          ``context.target``) is implemented. Per default the
@@ -531,14 +1922,29 @@ class Transformation:
                          values.
     """
 
-    __slots__ = ("config", "steps", "states")
+    __slots__ = (
+        "config",
+        "profile",
+        "steps",
+        "_conditions_evaluators",
+        "_execution_plan",
+        "_handler_plans",
+        "_local",
+        "_scope_evaluators",
+    )
 
     config_defaults = {
+        "adaptive_conditions": False,
         "common_rule_conditions": None,
         "context": {},
         "copy": True,
+        "fuse_rules": False,
+        "index": False,
         "name": None,
+        "profile": False,
+        "read_only": None,
         "result_object": "root",
+        "select_candidates": True,
         "traversal_order": (
             TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM
         ),
@@ -547,6 +1953,10 @@ class Transformation:
         actually affects the class unless a copy of this mapping as copied and bound
         as instance attribute. """
 
+    conditions_sample_size = 1000
+    """ The number of calls per rule whose conditions' costs are measured if the
+        ``adaptive_conditions`` :term:`configuration` value is ``True``. """
+
     traversers = {
         TRAVERSE_DEPTH_FIRST
         | TRAVERSE_LEFT_TO_RIGHT
@@ -554,9 +1964,54 @@ class Transformation:
         TRAVERSE_DEPTH_FIRST
         | TRAVERSE_LEFT_TO_RIGHT
         | TRAVERSE_TOP_TO_BOTTOM: traverse_df_ltr_ttb,
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_BOTTOM_TO_TOP: traverse_df_rtl_btt,
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_TOP_TO_BOTTOM: traverse_df_rtl_ttb,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_BOTTOM_TO_TOP: traverse_wf_ltr_btt,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_TOP_TO_BOTTOM: traverse_wf_ltr_ttb,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_BOTTOM_TO_TOP: traverse_wf_rtl_btt,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_TOP_TO_BOTTOM: traverse_wf_rtl_ttb,
         TRAVERSE_ROOT_ONLY: traverse_root,
     }
 
+    _candidates_orders = {
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_BOTTOM_TO_TOP: _order_df_ltr_btt,
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_TOP_TO_BOTTOM: _order_df_ltr_ttb,
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_BOTTOM_TO_TOP: _order_df_rtl_btt,
+        TRAVERSE_DEPTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_TOP_TO_BOTTOM: _order_df_rtl_ttb,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_BOTTOM_TO_TOP: _order_wf_ltr_btt,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_LEFT_TO_RIGHT
+        | TRAVERSE_TOP_TO_BOTTOM: _order_wf_ltr_ttb,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_BOTTOM_TO_TOP: _order_wf_rtl_btt,
+        TRAVERSE_WIDTH_FIRST
+        | TRAVERSE_RIGHT_TO_LEFT
+        | TRAVERSE_TOP_TO_BOTTOM: _order_wf_rtl_ttb,
+    }
+
     def __init__(self, *steps: StepType, **config: AnyType) -> None:
         dbg(f"Initializing transformation instance named: '{config.get('name')}'.")
         self.steps = _flatten_sequence(steps)
@@ -564,7 +2019,30 @@ class Transformation:
         self._set_config_defaults()
         self._expand_rules_conditions()
         self._validate_steps()
-        self.states = None
+        self._execution_plan = self._make_execution_plan()
+        self._handler_plans = self._compile_handler_plans()
+        self._conditions_evaluators = self._compile_conditions_evaluators()
+        self._scope_evaluators = {
+            x: _compile_conditions(x.scope)
+            for x in self.steps
+            if isinstance(x, Rule) and x.scope is not None
+        }
+        if self.config.read_only is None:
+            self.config.read_only = all(
+                x.read_only if isinstance(x, Rule) else _is_read_only(x)
+                for x in self.steps
+            )
+        self._local = local()
+        self.profile = Profile(self.steps) if self.config.profile else None
+        """ A :class:`inxs.profiling.Profile` with the accumulated statistics of all
+            calls if the ``profile`` configuration value is ``True``. """
+
+    @property
+    def states(self) -> Union[SimpleNamespace, None]:
+        """ The namespace that holds the states of the current thread's innermost call
+            of the transformation, ``None`` if it isn't processing. """
+        stack = getattr(self._local, "states", None)
+        return stack[-1] if stack else None
 
     @property
     def name(self):
@@ -590,18 +2068,150 @@ class Transformation:
                         step.handlers,
                         step.name,
                         step.traversal_order,
+                        step.read_only,
+                        step.record,
+                        step.prune,
+                        step.scope,
+                        step.max_depth,
                     )
                 )
             else:
                 expanded_steps.append(step)
         self.steps = tuple(expanded_steps)
 
+    def _make_execution_plan(self) -> Tuple[StepType, ...]:
+        """ Returns the steps as they are to be processed. If enabled, adjacent rules
+            with the same traversal order are grouped into tuples. """
+        if not self.config.fuse_rules:
+            return self.steps
+
+        result: List = []
+        group: List[Rule] = []
+
+        def traversal_order(rule: Rule) -> int:
+            if rule.traversal_order is None:
+                return self.config.traversal_order
+            return rule.traversal_order
+
+        def close_group():
+            if len(group) > 1:
+                dbg(f"Fusing rules {[x.name for x in group]}.")
+                result.append(tuple(group))
+            else:
+                result.extend(group)
+            group.clear()
+
+        for step in self.steps:
+            if (
+                isinstance(step, Rule)
+                and not step._restricts_traversal
+                and not self._can_select_candidates(step)
+            ):
+                if group and traversal_order(group[0]) != traversal_order(step):
+                    close_group()
+                group.append(step)
+            else:
+                close_group()
+                result.append(step)
+        close_group()
+
+        return tuple(result)
+
     def _set_config_defaults(self) -> None:
         for key, value in self.config_defaults.items():
             if not hasattr(self.config, key):
                 dbg(f"Using default value '{value}' for config key '{key}'.")
                 setattr(self.config, key, value)
 
+    def map(
+        self,
+        inputs: Iterable[BatchInputType],
+        workers: int = None,
+        executor: str = "process",
+        ordered: bool = True,
+        copy: bool = None,
+        **context: AnyType,
+    ) -> Iterator[AnyType]:
+        """ Applies the transformation to each of the ``inputs`` with a pool of
+            workers and yields the results.
+
+            :param inputs: An iterable of :class:`delb.Document` or
+                           :class:`delb.TagNode` instances, paths to documents
+                           (strings are considered as such) or documents' contents as
+                           ``bytes``.
+            :param workers: The number of workers, defaults to the number of CPUs.
+            :param executor: Either ``'process'`` or ``'thread'``. Each worker
+                             process inherits the transformation when it's forked,
+                             trees are passed between processes as serialized XML.
+                             Process pools require the ``fork`` start method, a
+                             :exc:`RuntimeError` is raised where it isn't
+                             available, e.g. on Windows.
+            :param ordered: Whether the results are yielded in the order of the
+                            inputs or as they are completed.
+            :param copy: Overrides the ``copy`` :term:`configuration` value for
+                         inputs that are trees, loaded documents aren't copied.
+            :param context: Items that are added to the :term:`context` of each call.
+        """
+        # multiprocessing is imported here as that's costly and only needed in batches
+        import multiprocessing
+
+        if workers is None:
+            workers = cpu_count() or 1
+        elif workers < 1:
+            raise ValueError("The number of workers must be positive.")
+
+        if executor == "process":
+            # transformations can't be pickled as their conditions are closures
+            if "fork" not in multiprocessing.get_all_start_methods():
+                raise RuntimeError(
+                    "Transformation.map with process workers requires the 'fork' "
+                    "start method, use executor='thread' instead."
+                )
+        elif executor != "thread":
+            raise ValueError("The executor must be either 'process' or 'thread'.")
+
+        # the arguments are validated when map is called, the results are yielded
+        # by a generator
+        return self._map(inputs, workers, executor, ordered, copy, context)
+
+    def _map(
+        self,
+        inputs: Iterable[BatchInputType],
+        workers: int,
+        executor: str,
+        ordered: bool,
+        copy: Optional[bool],
+        context: Dict[str, AnyType],
+    ) -> Iterator[AnyType]:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        if executor == "process":
+            pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_batch_worker,
+                initargs=(self,),
+            )
+            function = partial(
+                _transform_batch_input_in_process, copy=copy, context=context
+            )
+            inputs = (
+                _SerializedTree(x) if isinstance(x, (Document, TagNode)) else x
+                for x in inputs
+            )
+        else:
+            pool = ThreadPoolExecutor(workers)
+            function = partial(_transform_batch_input, self, copy=copy, context=context)
+
+        with pool:
+            for result in _yield_batch_results(
+                pool, function, inputs, window=workers * 2, ordered=ordered
+            ):
+                if isinstance(result, _SerializedTree):
+                    result = result.load()
+                yield result
+
     def _validate_steps(self):
         assert all(
             isinstance(x, (Callable, Rule)) for x in self.steps
@@ -611,22 +2221,19 @@ class Transformation:
         self, input: Union[Document, TagNode], copy: bool = None, **context: AnyType
     ) -> AnyType:
 
-        copy = self.config.copy if copy is None else copy
-        self._init_transformation(input, copy, context)
+        if copy is None:
+            copy = self.config.copy
+            if copy and self.config.read_only and self.config.result_object != "root":
+                dbg("Not cloning the source for a read-only transformation.")
+                copy = False
+        self._init_transformation(input, copy, self._resolve_context(context))
+        try:
+            return self._process(input)
+        finally:
+            self._finalize_transformation()
 
-        for step in self.steps:
-            _step_name = step.name if hasattr(step, "name") else step.__name__
-            dbg(f"Processing rule '{_step_name}'.")
-
-            self.states.current_step = step
-            try:
-                if isinstance(step, Rule):
-                    self._apply_rule(step)
-                else:
-                    self._apply_handlers(step)
-            except AbortTransformation:
-                dbg("Aborting due to 'AbortTransformation'.")
-                break
+    def _process(self, input: Union[Document, TagNode]) -> AnyType:
+        self._apply_steps(self._execution_plan)
 
         if self.config.result_object:
             result = dot_lookup(self, self.config.result_object)
@@ -637,14 +2244,59 @@ class Transformation:
         else:
             result = None
 
-        self._finalize_transformation()
         return result
 
+    def _apply_steps(self, steps: Sequence[Union[StepType, Tuple[Rule, ...]]]) -> bool:
+        """ Applies the given steps of the execution plan, returns ``False`` if the
+            transformation was aborted. """
+        states = self.states
+        profile, trace = states.profile, states.trace
+
+        for step in steps:
+            if not trace:
+                pass
+            elif isinstance(step, tuple):
+                dbg(f"Processing fused rules {[x.name for x in step]}.")
+            else:
+                _step_name = step.name if hasattr(step, "name") else step.__name__
+                dbg(f"Processing rule '{_step_name}'.")
+
+            states.current_step = step
+            if profile is not None:
+                started = perf_counter()
+            try:
+                if isinstance(step, tuple):
+                    signal = self._apply_fused_rules(step)
+                elif isinstance(step, Rule):
+                    signal = self._apply_rule(step)
+                else:
+                    signal = self._apply_handlers(step)
+                    if signal is not None and signal is not ABORT_TRANSFORMATION:
+                        raise RuntimeError(
+                            f"The flow control signal {signal} was given outside of "
+                            "a rule's handlers."
+                        )
+            except AbortTransformation:
+                signal = ABORT_TRANSFORMATION
+            aborted = signal is ABORT_TRANSFORMATION
+
+            if profile is not None:
+                profile.record(step, "step", None, perf_counter() - started)
+            if aborted:
+                if trace:
+                    dbg("Aborting due to 'AbortTransformation'.")
+                return False
+
+        return True
+
+    def _resolve_context(self, context: Dict[AnyStr, AnyType]) -> SimpleNamespace:
+        resolved_context = deepcopy(self.config.context)
+        resolved_context.update(context)
+        dbg(f"Initial context:\n{resolved_context}")
+        return SimpleNamespace(**resolved_context)
+
     def _init_transformation(
-        self,
-        input: Union[Document, TagNode],
-        copy: bool,
-        context: Dict[AnyStr, AnyType],
+        self, input: Union[Document, TagNode], copy: bool, context: SimpleNamespace
     ) -> None:
         dbg("Initializing processing.")
         if not isinstance(input, (Document, TagNode)):
@@ -653,59 +2305,271 @@ class Transformation:
                 f"got a {type(input)}."
             )
 
-        self.states = SimpleNamespace()
-        self.states.current_node = None
-        self.states.previous_result = None
-
-        resolved_context = deepcopy(self.config.context)
-        resolved_context.update(context)
-        dbg(f"Initial context:\n{resolved_context}")
-        self.states.context = SimpleNamespace(**resolved_context)
+        states = SimpleNamespace()
+        states.current_node = None
+        states.previous_result = None
+        states.index = None
+        states.keys = {}
+        states.key_definitions = {}
+        states.xpath_results = {}
+        states.bound_selectors = {}
+        states.context = context
+        states.profile = None if self.profile is None else Profile(self.steps)
+        # the hot paths only log if debug messages are handled during this call
+        states.trace = logger.isEnabledFor(logging.DEBUG)
 
         if isinstance(input, Document):
             if copy:
                 dbg("Cloning source.")
                 input = input.clone()
-            self.states.root = input.root
+            states.root = input.root
         else:
             if copy:
                 dbg("Cloning source.")
                 input = input.clone(deep=True)
-            self.states.root = input
+            states.root = input
 
         static_symbols = {
             "config": self.config,
-            "context": self.states.context,
-            "nsmap": self.states.root.namespaces,
-            "root": self.states.root,
+            "context": states.context,
+            "nsmap": states.root.namespaces,
+            "root": states.root,
             "transformation": self,
         }
-        self.states.dynamic_symbols = {}
-        self.states.symbols_chain = ChainMap(
-            self.states.dynamic_symbols,
+        states.dynamic_symbols = {}
+        states.symbols_chain = ChainMap(
+            states.dynamic_symbols,
             static_symbols,
-            self.states.context.__dict__,
+            states.context.__dict__,
             self.config.__dict__,
         )
 
-    def _apply_rule(self, rule: Rule) -> None:
-        traverser = self._get_traverser(rule.traversal_order)
-        dbg(f"Using traverser: {traverser}")
-
-        for node in traverser(self.states.root):
-            dbg(f"Evaluating {node}.")
-            self.states.current_node = node
+        stack = getattr(self._local, "states", None)
+        if stack is None:
+            stack = self._local.states = []
+        stack.append(states)
+
+    def _apply_rule(self, rule: Rule) -> Optional[_FlowControlSignal]:
+        """ Applies a rule to all its candidates, returns :obj:`ABORT_TRANSFORMATION`
+            if a handler signalled that. """
+        states = self.states
+        trace = states.trace
+        nodes = self._select_candidates(rule)
+        if nodes is None:
+            traverser = self._get_traverser(rule.traversal_order)
+            if trace:
+                dbg(f"Using traverser: {traverser}")
+            if rule.scope is None and rule.max_depth is None:
+                nodes = traverser(states.root)
+            else:
+                nodes = self._traverse_scopes(rule, traverser)
+        if states.profile is None:
+            test_conditions = self._get_conditions_evaluator(rule)
+        else:
+            test_conditions = partial(self._test_conditions_profiled, rule.conditions)
+
+        prune = rule.prune
+        result = None
+        for node in nodes:
+            if trace:
+                dbg("Evaluating %s.", node)
+            states.current_node = node
             try:
-                if self._test_conditions(node, rule.conditions):
-                    self._apply_handlers(*rule.handlers)
+                if test_conditions(node, self):
+                    signal = self._apply_rule_handlers(rule)
+                else:
+                    signal = None
             except AbortRule:
-                dbg("Aborting rule.")
-                break
+                signal = ABORT_RULE
+            except SkipDescendants:
+                signal = SKIP_DESCENDANTS
             except SkipToNextNode:
-                dbg("Skipping to next node.")
+                signal = SKIP_TO_NEXT_NODE
+
+            if signal is None or signal is SKIP_TO_NEXT_NODE:
+                if prune is not None and prune(node, self):
+                    _skip_descendants(nodes)
+                continue
+            elif signal is SKIP_DESCENDANTS:
+                _skip_descendants(nodes)
                 continue
+            elif signal is ABORT_TRANSFORMATION:
+                result = signal
+            if trace:
+                dbg("Aborting rule.")
+            break
 
-        self.states.current_node = None
+        states.current_node = None
+        return result
+
+    def _apply_fused_rules(self, rules: Sequence[Rule]) -> Optional[_FlowControlSignal]:
+        states = self.states
+        trace = states.trace
+        traverser = self._get_traverser(rules[0].traversal_order)
+        if trace:
+            dbg(f"Using traverser: {traverser}")
+
+        if states.profile is None:
+            tests = [self._get_conditions_evaluator(x) for x in rules]
+        else:
+            tests = [
+                partial(self._test_conditions_profiled, x.conditions) for x in rules
+            ]
+
+        # the elements whose descendants are skipped by a rule are collected in a set
+        # per rule
+        active_rules = [(x, y, set()) for x, y in zip(rules, tests)]
+        nodes = traverser(states.root)
+        for node in nodes:
+            if trace:
+                dbg("Evaluating %s.", node)
+            states.current_node = node
+            aborted_rules = None
+            skipping = False
+
+            for rule, test_conditions, skipped in active_rules:
+                if skipped and _has_ancestor_in(node._etree_obj, skipped):
+                    continue
+                states.current_step = rule
+                try:
+                    if not test_conditions(node, self):
+                        continue
+                    signal = self._apply_rule_handlers(rule)
+                except AbortRule:
+                    signal = ABORT_RULE
+                except SkipDescendants:
+                    signal = SKIP_DESCENDANTS
+                except SkipToNextNode:
+                    signal = SKIP_TO_NEXT_NODE
+
+                if signal is None or signal is SKIP_TO_NEXT_NODE:
+                    continue
+                elif signal is SKIP_DESCENDANTS:
+                    skipped.add(node._etree_obj)
+                    skipping = True
+                    continue
+                elif signal is ABORT_TRANSFORMATION:
+                    states.current_node = None
+                    return signal
+                if trace:
+                    dbg(f"Aborting rule '{rule.name}'.")
+                if aborted_rules is None:
+                    aborted_rules = []
+                aborted_rules.append(rule)
+
+            if aborted_rules is not None:
+                active_rules = [x for x in active_rules if x[0] not in aborted_rules]
+                if not active_rules:
+                    break
+
+            # the traverser can skip the subtree if no rule is interested in it
+            if skipping and all(node._etree_obj in x[2] for x in active_rules):
+                _skip_descendants(nodes)
+
+        states.current_node = None
+        return None
+
+    def _can_select_candidates(self, rule: Rule) -> bool:
+        if not self.config.select_candidates or rule._restricts_traversal:
+            return False
+        # candidates are selected before any handler is applied, nodes that a
+        # handler changes or adds could only be missed
+        if not (rule.read_only or self.config.read_only):
+            return False
+        traversal_order = rule.traversal_order
+        if traversal_order is None:
+            traversal_order = self.config.traversal_order
+        if traversal_order not in self._candidates_orders:
+            return False
+        return any(_get_candidates_selector(x) is not None for x in rule.conditions)
+
+    def _select_candidates(self, rule: Rule) -> Union[Iterator[TagNode], None]:
+        """ Returns the nodes that the most selective of a rule's conditions selects in
+            the rule's traversal order, ``None`` if no condition can select nodes. """
+        if not self._can_select_candidates(rule):
+            return None
+
+        candidates = min(
+            (
+                selector(self)
+                for selector in (_get_candidates_selector(x) for x in rule.conditions)
+                if selector is not None
+            ),
+            key=len,
+        )
+        if self.states.trace:
+            dbg(f"Selected {len(candidates)} candidate nodes.")
+
+        traversal_order = rule.traversal_order
+        if traversal_order is None:
+            traversal_order = self.config.traversal_order
+        order = self._candidates_orders[traversal_order]
+        return self._yield_candidates(order(tuple(candidates.values())))
+
+    def _yield_candidates(self, nodes: Sequence[TagNode]) -> Iterator[TagNode]:
+        # like the traversers, it accepts requests not to descend into a node
+        root = self.states.root
+        skipped: Set[etree._Element] = set()
+        for node in nodes:
+            # the node may be outside the transformation root or have been detached
+            if not _is_descendant_or_self(node, root):
+                continue
+            if skipped and _has_ancestor_in(node._etree_obj, skipped):
+                continue
+            if (yield node):
+                skipped.add(node._etree_obj)
+                yield None
+
+    def _select_nodes(self, conditions: Sequence[Callable]) -> Iterator[TagNode]:
+        """ Returns the nodes that may match the given conditions in document order,
+            the most selective of these selects them if possible. The iterator
+            accepts requests not to descend into a node like the traversers. """
+        selectors = [
+            x
+            for x in (_get_candidates_selector(y) for y in conditions)
+            if x is not None
+        ]
+        if self.config.select_candidates and selectors:
+            candidates = min((x(self) for x in selectors), key=len)
+            return self._yield_candidates(tuple(candidates.values()))
+        return traverse_df_ltr_ttb(self.states.root)
+
+    def _select_scope_roots(self, rule: Rule) -> List[TagNode]:
+        """ Returns the outermost nodes that match a rule's scope conditions in
+            document order, the transformation root if the rule has none. """
+        root = self.states.root
+        if rule.scope is None:
+            return [root]
+
+        test_scope = self._get_scope_evaluator(rule)
+        nodes = self._select_nodes(rule.scope)
+        result = []
+        for node in nodes:
+            if test_scope(node, self):
+                result.append(node)
+                _skip_descendants(nodes)
+        if self.states.trace:
+            dbg(f"Selected {len(result)} scope roots.")
+        return result
+
+    def _traverse_scopes(self, rule: Rule, traverser: Callable) -> Iterator[TagNode]:
+        """ Traverses the subtrees below a rule's scope roots up to its maximal
+            depth. """
+        traversal_order = rule.traversal_order
+        if traversal_order is None:
+            traversal_order = self.config.traversal_order
+        max_depth = rule.max_depth
+        top_to_bottom = bool(traversal_order & TRAVERSE_TOP_TO_BOTTOM)
+
+        roots = self._select_scope_roots(rule)
+        if not traversal_order & TRAVERSE_LEFT_TO_RIGHT:
+            roots.reverse()
+        for root in roots:
+            nodes = traverser(root)
+            if max_depth is not None:
+                nodes = _limit_depth(nodes, root, max_depth, top_to_bottom)
+            # requests to skip descendants are passed on to the traverser
+            yield from nodes
 
     @lru_cache(8)
     def _get_traverser(self, traversal_order: Union[int, None]) -> Callable:
@@ -716,34 +2580,214 @@ class Transformation:
             raise NotImplementedError
         return traverser
 
-    def _test_conditions(self, node: TagNode, conditions: Sequence[Callable]) -> bool:
-        # there's no dependency injection here because its overhead
-        # shall be avoided during testing conditions
+    def _test_conditions_profiled(
+        self, conditions: Sequence[Callable], node: TagNode, _
+    ) -> bool:
+        states = self.states
+        profile, rule = states.profile, states.current_step
+        result = True
         for condition in conditions:
-            dbg(f"Testing condition '{condition}'.")
-            if not condition(node, self):
-                dbg("The condition did not apply.")
-                return False
-            dbg("The condition applied.")
-        return True
+            started = perf_counter()
+            try:
+                matched = bool(condition(node, self))
+            finally:
+                profile.record(rule, "condition", condition, perf_counter() - started)
+            if not matched:
+                result = False
+                break
+            profile.record(rule, "condition", condition, 0.0, calls=0, matches=1)
+        profile.record(rule, "step", None, 0.0, calls=0, matches=result, nodes=1)
+        return result
 
-    def _apply_handlers(self, *handlers: Union[Callable, Exception]) -> None:
-        dbg("Applying handlers.")
+    def _apply_handlers(
+        self, *handlers: Union[Callable, Exception], read_only: bool = False
+    ) -> Optional[_FlowControlSignal]:
+        """ Applies the handlers until one returns a flow control signal, that is then
+            returned. After each handler that may have changed the tree the caches
+            that depend on its state are invalidated, unless ``read_only`` is
+            ``True``. """
+        states = self.states
+        profile, trace = states.profile, states.trace
+        read_only = read_only or self.config.read_only
+        if trace:
+            dbg("Applying handlers.")
         for handler in handlers:
-            if _is_flow_control(handler):
-                raise handler
-            kwargs = dependency_injection.resolve_dependencies(
-                handler, self._available_symbols
-            ).as_kwargs
-            if isinstance(handler, Transformation):
-                kwargs["input"] = self.states.current_node or self.states.root
-                kwargs["copy"] = False
-            dbg(f"Applying handler {handler}.")
-            self.states.previous_result = handler(**kwargs)
+            plan = self._get_handler_plan(handler)
+            if trace:
+                dbg(f"Applying handler {handler}.")
+            if profile is not None:
+                started = perf_counter()
+            try:
+                result = plan(self)
+            finally:
+                if profile is not None:
+                    profile.record(
+                        states.current_step,
+                        "handler",
+                        handler,
+                        perf_counter() - started,
+                    )
+                if not (read_only or plan.is_read_only):
+                    self._invalidate_caches(index=not plan.maintains_index)
+
+            if result.__class__ is _FlowControlSignal:
+                if trace:
+                    dbg("%s is signalled.", result)
+                return result
+            states.previous_result = result
+
+        return None
+
+    def _apply_rule_handlers(self, rule: Rule) -> Optional[_FlowControlSignal]:
+        return self._apply_handlers(*rule.handlers, read_only=rule.read_only)
+
+    def _compile_handler_plans(self) -> Dict[int, _HandlerPlan]:
+        result = {}
+        for step in self.steps:
+            handlers = step.handlers if isinstance(step, Rule) else (step,)
+            for handler in handlers:
+                if id(handler) not in result:
+                    result[id(handler)] = _HandlerPlan(handler)
+        return result
+
+    def _compile_conditions_evaluator(self, rule: Rule) -> Callable:
+        sample_size = self.config.adaptive_conditions
+        if not sample_size:
+            return _compile_conditions(rule.conditions)
+        if sample_size is True:
+            sample_size = self.conditions_sample_size
+        return _AdaptiveConditions(rule.conditions, sample_size)
+
+    def _compile_conditions_evaluators(self) -> Dict[Rule, Callable]:
+        # the rules are the keys, rather than their identities that may be reused
+        # once a rule that wasn't defined as step is garbage collected
+        return {
+            x: self._compile_conditions_evaluator(x)
+            for x in self.steps
+            if isinstance(x, Rule)
+        }
+
+    def _get_conditions_evaluator(self, rule: Rule) -> Callable:
+        evaluators = self._conditions_evaluators
+        evaluator = evaluators.get(rule)
+        if evaluator is None:
+            # the rule wasn't defined as step when the transformation was built
+            evaluator = evaluators[rule] = self._compile_conditions_evaluator(rule)
+        elif (
+            isinstance(evaluator, _AdaptiveConditions)
+            and evaluator.compiled is not None
+        ):
+            # the learned order is retained for all further calls
+            evaluator = evaluators[rule] = evaluator.compiled
+        return evaluator
+
+    def _get_scope_evaluator(self, rule: Rule) -> Callable:
+        evaluators = self._scope_evaluators
+        evaluator = evaluators.get(rule)
+        if evaluator is None:
+            evaluator = evaluators[rule] = _compile_conditions(rule.scope)
+        return evaluator
+
+    def _get_handler_plan(self, handler: Callable) -> _HandlerPlan:
+        plan = self._handler_plans.get(id(handler))
+        # the identity of a handler that was garbage collected may have been reused
+        if plan is None or plan.handler is not handler:
+            # the handler wasn't defined as step when the transformation was built
+            plan = self._handler_plans[id(handler)] = _HandlerPlan(handler)
+        return plan
+
+    def _evaluate_xpath(self, expression: str) -> Dict[int, TagNode]:
+        """ Returns the nodes that the evaluation of ``expression`` on the
+            :term:`transformation root` yields, mapped by their identity. """
+        states = self.states
+        result = states.xpath_results.get(expression)
+        if result is None:
+            if states.trace:
+                dbg(f"Evaluating XPath expression '{expression}'.")
+            result = states.xpath_results[expression] = {
+                id(x): x for x in states.root.xpath(expression)
+            }
+        return result
+
+    def _bind_selector(self, binder: Callable) -> AnyType:
+        """ Returns the compiled selector that ``binder`` binds to the namespace
+            declarations of the :term:`transformation root`. """
+        bound_selectors = self.states.bound_selectors
+        try:
+            return bound_selectors[binder]
+        except KeyError:
+            result = bound_selectors[binder] = binder(self.states.root._etree_obj)
+            return result
+
+    def _get_index(self) -> Union[_NodesIndex, None]:
+        """ Returns the index of the processed tree if it is enabled, it's built on
+            demand. """
+        if not self.config.index:
+            return None
+        if self.states.index is None:
+            dbg("Building the index.")
+            self.states.index = _NodesIndex(self.states.root)
+        return self.states.index
+
+    def _build_key(self, name: str, definition: _KeyDefinition) -> _KeyIndex:
+        """ Defines the key ``name`` for the current call and builds it. """
+        states = self.states
+        states.key_definitions[name] = definition
+        states.keys.pop(name, None)
+        return self._get_key(name)
+
+    def _get_key(self, name: str) -> _KeyIndex:
+        """ Returns the key named ``name``, it's (re-)built on demand. """
+        states = self.states
+        key = states.keys.get(name)
+        if key is None:
+            definition = states.key_definitions.get(name)
+            if definition is None:
+                raise RuntimeError(
+                    f"There's no key named '{name}', it must be built with "
+                    "inxs.lib.build_key before it's used."
+                )
+            dbg(f"Building the key '{name}'.")
+            key = states.keys[name] = _KeyIndex(
+                self._select_nodes(definition.conditions), definition, self
+            )
+        return key
+
+    def _get_built_indexes(self) -> Union[_Index, _Indexes, None]:
+        """ Returns an object that updates the index and the keys that have been built
+            with a handler's changes, ``None`` if there are none. Keys whose
+            conditions aren't local, e.g. because they test a node's ancestors, are
+            discarded as changes of other nodes may affect them. """
+        states = self.states
+        for name, key in tuple(states.keys.items()):
+            if not key.definition.local:
+                dbg(f"Discarding the key '{name}'.")
+                del states.keys[name]
+        indexes: List[_Index] = list(states.keys.values())
+        if states.index is not None:
+            indexes.append(states.index)
+        if not indexes:
+            return None
+        elif len(indexes) == 1:
+            return indexes[0]
+        return _Indexes(indexes)
+
+    def _invalidate_caches(self, index: bool = True) -> None:
+        """ Discards evaluation results that depend on the tree's state. The index and
+            the keys are retained if ``index`` is ``False`` because they have been
+            maintained. """
+        states = self.states
+        states.xpath_results.clear()
+        if index:
+            states.index = None
+            if states.keys:
+                states.keys.clear()
 
     def _finalize_transformation(self) -> None:
         dbg("Finalizing processing.")
-        self.states = None
+        states = self._local.states.pop()
+        if states.profile is not None:
+            self.profile.merge(states.profile)
 
     @property
     def _available_symbols(self) -> Mapping:
@@ -764,13 +2808,11 @@ class Transformation:
               :term:`transformation root`.
             - ``transformation`` - The calling :class:`Transformation` instance.
         """
-        self.states.dynamic_symbols.update(
-            {
-                "node": self.states.current_node,
-                "previous_result": self.states.previous_result,
-            }
+        states = self.states
+        states.dynamic_symbols.update(
+            {"node": states.current_node, "previous_result": states.previous_result}
         )
-        return self.states.symbols_chain
+        return states.symbols_chain
 
     # aliases that are supposed to be broken when the transformation isn't processing
 
@@ -797,8 +2839,13 @@ __all__ = [
     "TRAVERSE_ROOT_ONLY",
     "TRAVERSE_TOP_TO_BOTTOM",
     "TRAVERSE_WIDTH_FIRST",
+    "ABORT_RULE",
+    "ABORT_TRANSFORMATION",
+    "SKIP_DESCENDANTS",
+    "SKIP_TO_NEXT_NODE",
     AbortRule.__name__,
     AbortTransformation.__name__,
+    SkipDescendants.__name__,
     SkipToNextNode.__name__,
     InxsException.__name__,
     "Any",
@@ -807,8 +2854,10 @@ __all__ = [
     "HasNamespace",
     "HasLocalname",
     "MatchesAttributes",
+    "MatchesCSSSelector",
     "MatchesXPath",
     "If",
+    Key.__name__,
     "Ref",
     Rule.__name__,
     Once.__name__,
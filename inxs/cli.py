@@ -6,10 +6,13 @@ import importlib
 import logging
 import sys
 from argparse import ArgumentParser, Namespace
+from glob import glob, has_magic
+from os import cpu_count
 from pathlib import Path
 from shutil import copy2 as copy_file
-from traceback import print_exc
-from typing import Sequence
+from traceback import format_exc, print_exc
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, Sequence, Tuple
 
 from delb import Document
 from lxml import etree
@@ -21,6 +24,22 @@ from inxs.lib import dbg, logger, nfo
 def parse_args(args: Sequence[str]) -> Namespace:
     parser = ArgumentParser()
 
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="The number of worker processes that process the inputs, 0 starts one "
+        "per CPU.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        default=None,
+        help="Write the results into this directory, inputs from directories and "
+        "glob patterns keep their relative paths.",
+    )
     parser.add_argument(
         "--inplace",
         "-i",
@@ -51,9 +70,20 @@ def parse_args(args: Sequence[str]) -> Namespace:
     )
     # TODO help texts
     parser.add_argument("transformation", metavar="TRANSFORMATION")
-    parser.add_argument("input", metavar="INPUT", type=Path)
+    parser.add_argument(
+        "inputs",
+        metavar="INPUT",
+        nargs="*",
+        help="Files, directories whose *.xml files are processed or glob patterns. "
+        "If none or '-' is given, paths are read from stdin, one per line.",
+    )
 
-    return parser.parse_args(args)
+    result = parser.parse_args(args)
+    if result.inplace and result.output_dir is not None:
+        parser.error("--inplace and --output-dir are mutually exclusive.")
+    if result.jobs < 0:
+        parser.error("--jobs must not be negative.")
+    return result
 
 
 def setup_logging(verbosity: int) -> None:
@@ -109,40 +139,165 @@ def get_transformation(location: str) -> Transformation:
     return transformation_objects[transformation_name]
 
 
-def parse_file(args: Namespace) -> Document:
-    dbg("Parsing file.")
-    parser = etree.XMLParser(recover=args.recover)
-    return Document(args.input, parser=parser)
+def _expand_input(input: str) -> Iterator[Tuple[Path, Path]]:
+    path = Path(input)
+    if path.is_dir():
+        for file in sorted(path.rglob("*.xml")):
+            yield file, file.relative_to(path)
+    elif not path.exists() and any(x in input for x in "*?["):
+        matches = sorted(glob(input, recursive=True))
+        if not matches:
+            raise FileNotFoundError(f"No file matches the pattern '{input}'.")
+        # the matches keep their paths relative to the pattern's fixed base directory
+        base = Path(
+            *next(
+                (path.parts[:i] for i, x in enumerate(path.parts) if has_magic(x)),
+                path.parts,
+            )
+        )
+        for match in matches:
+            yield Path(match), Path(match).relative_to(base)
+    else:
+        yield path, Path(path.name)
 
 
-def write_result(document: Document, args: Namespace) -> None:
-    if args.inplace:
-        dbg("Wrote result back to file.")
-        document.save(args.input, pretty=args.pretty)
-    else:
+def expand_inputs(inputs: Sequence[str]) -> Iterator[Tuple[Path, Path]]:
+    """ Yields the paths of the files to process and their paths relative to an
+        output directory. """
+    if not inputs:
+        inputs = ["-"]
+    for input in inputs:
+        if input == "-":
+            # the lines from stdin are taken as paths, a '-' among them isn't special
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield from _expand_input(line)
+        else:
+            yield from _expand_input(input)
+
+
+_worker = None
+""" The transformation, parser and arguments that a process uses to process files. """
+
+
+def init_worker(args: Namespace) -> None:
+    """ Loads the transformation and creates the parser that are used for all files
+        that the calling process transforms. """
+    global _worker
+    _worker = SimpleNamespace(
+        args=args,
+        parser=etree.XMLParser(recover=args.recover),
+        transformation=get_transformation(args.transformation),
+    )
+
+
+def parse_file(path: Path, parser: etree.XMLParser) -> Document:
+    dbg(f"Parsing file {path}.")
+    return Document(path, parser=parser)
+
+
+def write_result(document: Document, output: Optional[Path], args: Namespace) -> None:
+    if output is None:
         document.write(sys.stdout.buffer, pretty=args.pretty)
+    else:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        document.save(output, pretty=args.pretty)
+        dbg(f"Wrote result to {output}.")
+
+
+def process_file(path: Path, output: Optional[Path]) -> Optional[str]:
+    """ Transforms a file with the transformation that :func:`init_worker` loaded and
+        returns a formatted traceback if that fails. """
+    args = _worker.args
+    try:
+        document = parse_file(path, _worker.parser)
+        if args.inplace:
+            copy_file(path, path.with_suffix(".orig"))
+            dbg("Saved document backup with suffix '.orig'")
+        dbg("Applying transformation.")
+        document.root = _worker.transformation(document.root)
+        write_result(document, output, args)
+    except Exception:
+        return format_exc()
+    nfo(f"Processed {path}.")
+    return None
+
+
+def process_files(args: Namespace, files: List[Tuple[Path, Optional[Path]]]) -> int:
+    """ Processes the files and returns the number of failures. """
+    jobs = min(args.jobs or cpu_count() or 1, len(files))
+    if jobs <= 1:
+        init_worker(args)
+        results = (process_file(*x) for x in files)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        dbg(f"Starting {jobs} worker processes.")
+        executor = ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(args,))
+        results = executor.map(
+            process_file,
+            *zip(*files),
+            chunksize=max(1, min(32, len(files) // (jobs * 4))),
+        )
+
+    failures = 0
+    try:
+        for (path, _), error in zip(files, results):
+            if error is not None:
+                failures += 1
+                print(f"Failed to process {path}:\n{error}", file=sys.stderr)
+    finally:
+        if jobs > 1:
+            executor.shutdown()
+    return failures
 
 
 def main(args: Sequence[str] = None) -> None:
+    if args is None:
+        args = sys.argv[1:]
+    if args and args[0] == "serve":
+        from inxs.server import main as serve
+
+        serve(args[1:])
+        return
+
     nfo("Starting")
     try:
-        if args is None:
-            args = sys.argv[1:]
         args = parse_args(args)
         setup_logging(args.verbose)
         dbg(f"Invoked with args: {args}")
-        transformation = get_transformation(args.transformation)
-        document = parse_file(args)
-        if args.inplace:
-            copy_file(args.input, args.input.with_suffix(".orig"))
-            dbg("Saved document backup with suffix '.orig'")
-        dbg("Applying transformation.")
-        document.root = transformation(document.root)
-        write_result(document, args)
+
+        inputs = list(expand_inputs(args.inputs))
+        if not inputs:
+            raise RuntimeError("No input files were given.")
+        elif args.inplace:
+            files = [(path, path) for path, _ in inputs]
+        elif args.output_dir is not None:
+            files = [(path, args.output_dir / relative) for path, relative in inputs]
+            outputs = {}
+            for path, output in files:
+                if output in outputs:
+                    raise RuntimeError(
+                        f"The inputs {outputs[output]} and {path} would both be "
+                        f"written to {output}."
+                    )
+                outputs[output] = path
+        elif len(inputs) == 1:
+            files = [(inputs[0][0], None)]
+        else:
+            raise RuntimeError(
+                "Multiple inputs require either --inplace or --output-dir."
+            )
+
+        failures = process_files(args, files)
     except Exception:
         print_exc()
         raise SystemExit(2)
 
+    if failures:
+        raise SystemExit(2)
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,20 @@
+CANDIDATES_SELECTOR_ATTRIBUTE = "_inxs_candidates_selector_"
+COMBINATOR_ATTRIBUTE = "_inxs_combinator_"
+CONDITION_COST_ATTRIBUTE = "_inxs_condition_cost_"
+CONSTANT_CONDITION_ATTRIBUTE = "_inxs_constant_condition_"
+LOCAL_CONDITION_ATTRIBUTE = "_inxs_local_condition_"
+MAINTAINS_INDEX_ATTRIBUTE = "_inxs_maintains_index_"
+READ_ONLY_ATTRIBUTE = "_inxs_read_only_"
 REF_IDENTIFYING_ATTRIBUTE = "_this_is_a_Ref_resolver_"
 
+# the estimated relative costs of conditions' evaluations per node
+NAME_TEST_COST = 1
+ATTRIBUTES_TEST_COST = 2
+COMPILED_SELECTOR_COST = 4
+CHILDREN_TEST_COST = 4
+XPATH_EVALUATION_COST = 8
+TEXT_TEST_COST = 16
+
 TRAVERSE_DEPTH_FIRST = True << 0
 TRAVERSE_WIDTH_FIRST = False << 0
 TRAVERSE_LEFT_TO_RIGHT = True << 1
@@ -21,7 +21,7 @@ __all__ = []
 
 def _reduce_whitespace_handler(node: TagNode):
     for child in node.child_nodes(is_text_node, recurse=True):
-        child.content = utils.reduce_whitespaces(node.content, strip="")
+        child.content = utils.reduce_whitespaces(child.content, strip="")
 
 
 reduce_whitespaces = Transformation(Rule("/", _reduce_whitespace_handler))
@@ -24,7 +24,17 @@ from delb import (
     tag,
 )
 
-from inxs import dot_lookup, Ref, singleton_handler, Transformation
+from inxs import _KeyDefinition, dot_lookup, Ref, singleton_handler, Transformation
+from inxs.constants import (
+    ATTRIBUTES_TEST_COST,
+    CHILDREN_TEST_COST,
+    CONDITION_COST_ATTRIBUTE,
+    LOCAL_CONDITION_ATTRIBUTE,
+    MAINTAINS_INDEX_ATTRIBUTE,
+    NAME_TEST_COST,
+    READ_ONLY_ATTRIBUTE,
+    TEXT_TEST_COST,
+)
 from inxs.utils import is_Ref, resolve_Ref_values_in_mapping
 
 # helpers
@@ -42,6 +52,53 @@ def export(func):
     return func
 
 
+@export
+def get_index(transformation: Transformation):
+    """ Returns an object that updates the transformation's index and keys if any of
+        these has been built, ``None`` otherwise. A handler that is marked with
+        :func:`maintains_index` calls its ``discard`` method with a node before it
+        changes the node's name, namespace or attributes or removes it, and its
+        ``add`` method afterwards or with a node that it added to the tree. The
+        ``descendants`` argument of both methods defines whether the node's
+        descendants are included. """
+    if transformation is None:
+        return None
+    return transformation._get_built_indexes()
+
+
+@export
+def maintains_index(handler: Callable) -> Callable:
+    """ Marks a handler that updates the transformation's index and keys with the
+        object that :func:`get_index` returns when it changes the tree. After other
+        handlers that may change the tree, the index and keys are discarded and
+        built anew when they're used next, see :ref:`keys`. Can be used as
+        decorator. """
+    setattr(handler, MAINTAINS_INDEX_ATTRIBUTE, None)
+    return handler
+
+
+def _condition_cost(cost: int) -> Callable:
+    """ Marks a condition that has no side effects with its estimated cost. """
+
+    def decorator(condition: Callable) -> Callable:
+        setattr(condition, CONDITION_COST_ATTRIBUTE, cost)
+        return condition
+
+    return decorator
+
+
+def _local_condition(condition: Callable) -> Callable:
+    """ Marks a condition that only tests a node's name, namespace or attributes. """
+    setattr(condition, LOCAL_CONDITION_ATTRIBUTE, None)
+    return condition
+
+
+def _read_only(handler: Callable) -> Callable:
+    """ Marks a handler that doesn't modify the processed tree. """
+    setattr(handler, READ_ONLY_ATTRIBUTE, None)
+    return handler
+
+
 # the actual lib
 
 
@@ -117,6 +174,28 @@ def append(name, symbol=Ref("previous_result"), copy_node=False):
     return handler
 
 
+@export
+def build_key(name: str, match, use):
+    """ Builds an index of the nodes that match the conditions ``match`` by the
+        values that ``use`` returns for them, like ``xsl:key`` does. The conditions
+        are given like a :class:`inxs.Rule`'s. ``use`` is either the name of an
+        attribute or a callable that is called with a node and returns a value, a
+        sequence of values or ``None``. The indexed nodes are then referred to with
+        :class:`inxs.Key` s named ``name`` during the current call. The key is
+        updated by the handlers of this module that maintain the transformation's
+        index if its conditions only test the nodes' names, namespaces and
+        attributes, it's discarded by all others that may change the tree, see
+        :ref:`keys`.
+    """
+    definition = _KeyDefinition(match, use)
+
+    def handler(transformation):
+        transformation._build_key(name, definition)
+        return transformation.states.previous_result
+
+    return _read_only(handler)
+
+
 @export
 def cleanup_namespaces(root: TagNode, previous_result: Any) -> Any:
     """ Cleanup the namespaces of the tree. This should always be used at the
@@ -126,9 +205,17 @@ def cleanup_namespaces(root: TagNode, previous_result: Any) -> Any:
 
 
 @export
-def clear_attributes(node: TagNode, previous_result: Any) -> Any:
+@maintains_index
+def clear_attributes(
+    node: TagNode, previous_result: Any, transformation: Transformation = None
+) -> Any:
     """ Deletes all attributes of an node. """
+    index = get_index(transformation)
+    if index is not None:
+        index.discard(node, descendants=False)
     node.attributes.clear()
+    if index is not None:
+        index.add(node, descendants=False)
     return previous_result
 
 
@@ -150,7 +237,7 @@ def concatenate(*parts):
             result += _part
         return result
 
-    return handler
+    return _read_only(handler)
 
 
 @export
@@ -169,7 +256,7 @@ def debug_dump_document(name="tree"):
             nfo(str(node))
         return transformation.states.previous_result
 
-    return handler
+    return _read_only(handler)
 
 
 @export
@@ -181,7 +268,7 @@ def debug_message(msg):
         nfo(msg)
         return previous_result
 
-    return handler
+    return _read_only(handler)
 
 
 @export
@@ -195,7 +282,7 @@ def debug_symbols(*names):
             nfo(f"symbol {name}: {transformation._available_symbols[name]!r}")
         return transformation.states.previous_result
 
-    return handler
+    return _read_only(handler)
 
 
 @export
@@ -230,16 +317,18 @@ def get_attribute(name):
     def evaluator(node: TagNode):
         return node.attributes.get(name)
 
-    return evaluator
+    return _read_only(evaluator)
 
 
 @export
+@_read_only
 def get_localname(node):
     """ Gets the node's local tag name. """
     return node.local_name
 
 
 @export
+@_read_only
 def get_text(node: TagNode):
     """ Returns the content of the matched node's descendants of :class:`delb.TextNode`
         type.
@@ -256,16 +345,19 @@ def get_variable(name):
     def handler(context):
         return dot_lookup(context, name)
 
-    return handler
+    return _read_only(handler)
 
 
 @export
+@_local_condition
+@_condition_cost(ATTRIBUTES_TEST_COST)
 def has_attributes(node: TagNode, _):
     """ Returns ``True`` if the node has attributes. """
     return bool(node.attributes)
 
 
 @export
+@_condition_cost(NAME_TEST_COST)
 def has_children(node: TagNode, _):
     """ Returns ``True`` if the node has descendants. """
     return node.first_child is not None
@@ -278,6 +370,7 @@ def has_matching_text(pattern: str):
         matches the provided ``pattern``. """
     pattern = re.compile(pattern)
 
+    @_condition_cost(TEXT_TEST_COST)
     def evaluator(node: TagNode, _):
         return pattern.match(node.full_text)
 
@@ -285,6 +378,7 @@ def has_matching_text(pattern: str):
 
 
 @export
+@_condition_cost(CHILDREN_TEST_COST)
 def has_text(node: TagNode, _):
     """ Returns ``True`` if the node has any :class:`delb.TextNode`. """
     with altered_default_filters(is_text_node):
@@ -319,10 +413,11 @@ def join_to_string(separator: str = " ", symbol="previous_result"):
     def handler(transformation):
         return separator.join(transformation._available_symbols[symbol])
 
-    return handler
+    return _read_only(handler)
 
 
 @export
+@_read_only
 def lowercase(previous_result):
     """ Processes ``previous_result`` to be all lower case. """
     return previous_result.lower()
@@ -339,7 +434,7 @@ def make_node(**node_args):
         _node_args = resolve_Ref_values_in_mapping(node_args, transformation)
         return root.new_tag_node(**_node_args)
 
-    return handler
+    return _read_only(handler)
 
 
 @export
@@ -405,12 +500,12 @@ def put_variable(name, value=Ref("previous_result")):
 
     if is_Ref(value):
         if "." in name:
-            return ref_handler_dot_lookup
-        return ref_handler
+            return _read_only(ref_handler_dot_lookup)
+        return _read_only(ref_handler)
     elif "." in name:
-        return simple_handler_dot_lookup
+        return _read_only(simple_handler_dot_lookup)
     else:
-        return simple_handler
+        return _read_only(simple_handler)
 
 
 @export
@@ -418,27 +513,46 @@ def put_variable(name, value=Ref("previous_result")):
 def remove_attributes(*names):
     """ Removes all attributes with the keys provided as ``names`` from the node. """
 
-    def handler(node: TagNode, previous_result: Any) -> Any:
+    def handler(
+        node: TagNode, previous_result: Any, transformation: Transformation = None
+    ) -> Any:
+        index = get_index(transformation)
+        if index is not None:
+            index.discard(node, descendants=False)
         for name in names:
             node.attributes.pop(name, None)
+        if index is not None:
+            index.add(node, descendants=False)
         return previous_result
 
-    return handler
+    return maintains_index(handler)
 
 
 @export
-def remove_namespace(node: TagNode, previous_result):
+@maintains_index
+def remove_namespace(
+    node: TagNode, previous_result, transformation: Transformation = None
+):
     """ Removes the namespace from the node.
         When used, :func:`cleanup_namespaces` should be applied at the end of the
         transformation. """
+    index = get_index(transformation)
+    if index is not None:
+        index.discard(node, descendants=False)
     node.namespace = None
+    if index is not None:
+        index.add(node, descendants=False)
     return previous_result
 
 
 @export
-def remove_node(node: TagNode):
+@maintains_index
+def remove_node(node: TagNode, transformation: Transformation = None):
     """ A very simple handler that just removes a node and its descendants from a
         tree. """
+    index = get_index(transformation)
+    if index is not None:
+        index.discard(node)
     node.detach()
 
 
@@ -490,11 +604,16 @@ def remove_nodes(references, keep_children=False, preserve_text=False, clear_ref
 
 @singleton_handler
 def _rename_attributes(translation_map: Tuple[Tuple[str, str], ...]) -> Callable:
-    def handler(node: TagNode) -> None:
+    def handler(node: TagNode, transformation: Transformation = None) -> None:
+        index = get_index(transformation)
+        if index is not None:
+            index.discard(node, descendants=False)
         for _from, to in translation_map:
             node.attributes[to] = node.attributes.pop(_from)
+        if index is not None:
+            index.add(node, descendants=False)
 
-    return handler
+    return maintains_index(handler)
 
 
 @export
@@ -531,7 +650,7 @@ def resolve_xpath_to_node(*names):
                 raise RuntimeError(f"More than one node matched {expression}")
         return transformation.states.previous_result
 
-    return resolver
+    return _read_only(resolver)
 
 
 @export
@@ -539,20 +658,32 @@ def resolve_xpath_to_node(*names):
 def set_attribute(name, value=Ref("previous_result")):
     """ Sets an attribute ``name`` with ``value``. """
 
-    def simple_handler(node: TagNode, previous_result: Any) -> Any:
+    def simple_handler(
+        node: TagNode, previous_result: Any, transformation: Transformation = None
+    ) -> Any:
+        index = get_index(transformation)
+        if index is not None:
+            index.discard(node, descendants=False)
         node.attributes[name] = value
+        if index is not None:
+            index.add(node, descendants=False)
         return previous_result
 
     def resolving_handler(
         node: TagNode, previous_result: Any, transformation: Transformation
     ) -> Any:
+        index = get_index(transformation)
+        if index is not None:
+            index.discard(node, descendants=False)
         node.attributes[name] = value(transformation)
+        if index is not None:
+            index.add(node, descendants=False)
         return previous_result
 
     if isinstance(value, str):
-        return simple_handler
+        return maintains_index(simple_handler)
     elif is_Ref(value):
-        return resolving_handler
+        return maintains_index(resolving_handler)
 
 
 @export
@@ -560,11 +691,18 @@ def set_attribute(name, value=Ref("previous_result")):
 def set_localname(name):
     """ Sets the node's localname to ``name``. """
 
-    def handler(node: TagNode, previous_result: Any):
+    def handler(
+        node: TagNode, previous_result: Any, transformation: Transformation = None
+    ):
+        index = get_index(transformation)
+        if index is not None:
+            index.discard(node, descendants=False)
         node.local_name = name
+        if index is not None:
+            index.add(node, descendants=False)
         return previous_result
 
-    return handler
+    return maintains_index(handler)
 
 
 @export
@@ -603,7 +741,7 @@ def sort(name: str = "previous_result", key: Callable = lambda x: x):
     def handler(context):
         return sorted(getattr(context, name), key=key)
 
-    return handler
+    return _read_only(handler)
 
 
 @export
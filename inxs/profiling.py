@@ -0,0 +1,171 @@
+""" This module contains the statistics that a :class:`inxs.Transformation` collects
+    when its ``profile`` :term:`configuration` value is ``True``. """
+
+from threading import Lock
+from typing import Any as AnyType
+from typing import Dict, List, Sequence, Tuple
+
+
+__all__ = ["Profile", "ProfileEntry"]
+
+
+def _describe(obj: AnyType) -> str:
+    if obj is None:
+        return ""
+    name = getattr(obj, "name", None)
+    if isinstance(name, str):
+        return name
+    name = getattr(obj, "__qualname__", None)
+    if name is None:
+        name = getattr(type(obj), "__qualname__", repr(obj))
+    return name.replace(".<locals>", "")
+
+
+class ProfileEntry:
+    """ The statistics of one step, condition or handler. The attribute ``kind`` is
+        one of ``'step'``, ``'condition'`` or ``'handler'``.
+
+        - ``calls`` counts the applications of a step or the calls of a condition or
+          handler.
+        - ``matches`` counts the nodes that matched a rule's conditions respectively
+          a single condition.
+        - ``nodes`` counts the nodes that a rule tested.
+        - ``total_time`` is the wall time in seconds that was spent in total.
+    """
+
+    __slots__ = ("step", "kind", "name", "calls", "matches", "nodes", "total_time")
+
+    def __init__(self, step: str, kind: str, name: str):
+        self.step = step
+        self.kind = kind
+        self.name = name
+        self.calls = 0
+        self.matches = 0
+        self.nodes = 0
+        self.total_time = 0.0
+
+    def __repr__(self):
+        return (
+            f"<ProfileEntry {self.kind} {self.name!r} of {self.step!r}: "
+            f"calls={self.calls} matches={self.matches} nodes={self.nodes} "
+            f"total_time={self.total_time:.6f}>"
+        )
+
+    @property
+    def mean_time(self) -> float:
+        """ The mean wall time per call in seconds. """
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class Profile:
+    """ Collects :class:`ProfileEntry` objects for the steps of a transformation and
+        their conditions and handlers. The instance that is bound as a transformation's
+        ``profile`` attribute accumulates the statistics of all calls until it's
+        cleared. Printing it renders a table that is sorted by the total time.
+
+        :param steps: The transformation's steps, they are referred to by their
+                      position and name.
+    """
+
+    def __init__(self, steps: Sequence[AnyType] = ()):
+        self.entries: Dict[Tuple[int, str, int], ProfileEntry] = {}
+        self._lock = Lock()
+        self._steps_names = {
+            id(x): f"#{i} {_describe(x)}" for i, x in enumerate(steps, start=1)
+        }
+
+    def _describe_step(self, step: AnyType) -> str:
+        if isinstance(step, tuple):
+            return "fused " + ", ".join(self._describe_step(x) for x in step)
+        name = self._steps_names.get(id(step))
+        return _describe(step) if name is None else name
+
+    def __str__(self):
+        return self.format()
+
+    def _get_entry(self, step: AnyType, kind: str, obj: AnyType) -> ProfileEntry:
+        key = (id(step), kind, id(obj))
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = ProfileEntry(
+                self._describe_step(step), kind, _describe(obj)
+            )
+        return entry
+
+    def clear(self) -> None:
+        """ Discards all collected statistics. """
+        with self._lock:
+            self.entries.clear()
+
+    def format(self, limit: int = None) -> str:
+        """ Returns the statistics as table, sorted by the total time. At most
+            ``limit`` entries are included if it's provided. """
+        entries = self.sorted_entries()
+        if limit is not None:
+            entries = entries[:limit]
+
+        rows = [
+            ("step", "kind", "name", "calls", "matches", "nodes", "total ms", "mean µs")
+        ]
+        for entry in entries:
+            rows.append(
+                (
+                    entry.step,
+                    entry.kind,
+                    entry.name,
+                    str(entry.calls),
+                    str(entry.matches),
+                    str(entry.nodes),
+                    f"{entry.total_time * 1e3:.3f}",
+                    f"{entry.mean_time * 1e6:.3f}",
+                )
+            )
+
+        widths = [max(len(x[i]) for x in rows) for i in range(len(rows[0]))]
+        lines = []
+        for row in rows:
+            lines.append(
+                "  ".join(
+                    cell.ljust(width) if i < 3 else cell.rjust(width)
+                    for i, (cell, width) in enumerate(zip(row, widths))
+                ).rstrip()
+            )
+        return "\n".join(lines)
+
+    def merge(self, other: "Profile") -> None:
+        """ Adds the statistics of another profile to this one. """
+        with self._lock:
+            for key, other_entry in other.entries.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = self.entries[key] = ProfileEntry(
+                        other_entry.step, other_entry.kind, other_entry.name
+                    )
+                entry.calls += other_entry.calls
+                entry.matches += other_entry.matches
+                entry.nodes += other_entry.nodes
+                entry.total_time += other_entry.total_time
+
+    def record(
+        self,
+        step: AnyType,
+        kind: str,
+        obj: AnyType,
+        time: float,
+        calls: int = 1,
+        matches: int = 0,
+        nodes: int = 0,
+    ) -> None:
+        """ Adds a measurement for a step, in which case ``kind`` is ``'step'`` and
+            ``obj`` is ``None``, or for one of its conditions or handlers as ``obj``. """
+        entry = self._get_entry(step, kind, obj)
+        entry.calls += calls
+        entry.matches += matches
+        entry.nodes += nodes
+        entry.total_time += time
+
+    def sorted_entries(self, key: str = "total_time") -> List[ProfileEntry]:
+        """ Returns the entries sorted descending by the given attribute. """
+        with self._lock:
+            entries = list(self.entries.values())
+        return sorted(entries, key=lambda x: getattr(x, key), reverse=True)
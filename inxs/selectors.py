@@ -0,0 +1,656 @@
+""" This module compiles CSS selectors and simple XPath expressions into predicates
+    that test an element locally, by matching the selector from right to left
+    against the element, its ancestors and its siblings. That's how browser engines
+    do it and costs a number of tests that depends on the depth of the element,
+    whereas the evaluation of an XPath expression depends on the size of the whole
+    document.
+
+    The compiled selectors are used by :func:`inxs.MatchesCSSSelector` and
+    :func:`inxs.MatchesXPath`. """
+
+import re
+from itertools import chain
+from typing import Any as AnyType
+from typing import Callable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from cssselect.parser import (
+    Attrib,
+    Class,
+    CombinedSelector,
+    Element,
+    Function,
+    Hash,
+    Negation,
+    Pseudo,
+    parse,
+    parse_series,
+)
+from lxml import etree
+
+
+__all__ = ["compile_css_selector", "compile_xpath"]
+
+
+Predicate = Callable[[etree._Element], bool]
+Namespaces = Mapping[Optional[str], str]
+BoundSelector = Tuple[Predicate, str]
+""" A predicate and the tag argument for :meth:`lxml.etree._Element.iter` that
+    yields all elements that the predicate may match. """
+SelectorBinder = Callable[[etree._Element], Optional[BoundSelector]]
+""" Binds a compiled selector to the context element of the evaluation, that is
+    the :term:`transformation root`, and its namespace declarations. """
+_GroupBinder = Callable[[Namespaces, etree._Element], Tuple[Predicate, Optional[str]]]
+
+
+class _UnsupportedSelector(Exception):
+    pass
+
+
+class _UnknownPrefix(Exception):
+    pass
+
+
+WHITESPACE = re.compile(r"[ \t\r\n]")
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+
+
+# helpers
+
+
+def _is_element(obj: AnyType) -> bool:
+    return isinstance(obj.tag, str)
+
+
+def _ancestors(
+    element: etree._Element, stop: Optional[etree._Element] = None
+) -> Iterator[etree._Element]:
+    """ Yields the ancestors of ``element`` that are descendants of ``stop``. """
+    element = element.getparent()
+    while element is not None and element is not stop:
+        yield element
+        element = element.getparent()
+
+
+def _preceding_siblings(element: etree._Element) -> Iterator[etree._Element]:
+    element = element.getprevious()
+    while element is not None:
+        if _is_element(element):
+            yield element
+        element = element.getprevious()
+
+
+def _following_siblings(element: etree._Element) -> Iterator[etree._Element]:
+    element = element.getnext()
+    while element is not None:
+        if _is_element(element):
+            yield element
+        element = element.getnext()
+
+
+def _previous_sibling(element: etree._Element) -> Optional[etree._Element]:
+    return next(_preceding_siblings(element), None)
+
+
+def _position(siblings: Iterator[etree._Element], tag: Optional[str]) -> int:
+    if tag is None:
+        return sum(1 for _ in siblings) + 1
+    return sum(1 for x in siblings if x.tag == tag) + 1
+
+
+def _matches_series(position: int, a: int, b: int) -> bool:
+    """ Tests whether ``position`` is ``a * n + b`` for any ``n >= 0``. """
+    if a == 0:
+        return position == b
+    n, remainder = divmod(position - b, a)
+    return remainder == 0 and n >= 0
+
+
+# tests for simple selectors
+
+
+def _name_test(
+    prefix: Optional[str], local_name: Optional[str], namespaces: Namespaces
+) -> Optional[BoundSelector]:
+    """ Returns a test for an element's name, ``None`` as local name stands for any
+        name. ``None`` is returned if any element passes. """
+    if prefix is None:
+        # like delb's workaround for XPath, a missing prefix refers to the default
+        # namespace if there's one
+        namespace = namespaces.get(None)
+        if namespace is None:
+            if local_name is None:
+                return None
+            return (lambda x: x.tag == local_name), local_name
+    elif prefix in namespaces:
+        namespace = namespaces[prefix]
+    else:
+        raise _UnknownPrefix(prefix)
+
+    if local_name is None:
+        start = "{" + namespace + "}"
+        return (lambda x: x.tag.startswith(start)), start + "*"
+    tag = "{" + namespace + "}" + local_name
+    return (lambda x: x.tag == tag), tag
+
+
+def _attribute_test(name: str, operator: str, value: Optional[str]) -> Predicate:
+    if operator == "exists":
+        return lambda x: x.get(name) is not None
+    elif operator == "=":
+        return lambda x: x.get(name) == value
+    elif operator == "!=":
+        if value:
+            return lambda x: x.get(name) != value
+        return lambda x: x.get(name) not in (None, "")
+    elif operator == "~=":
+        if not value or WHITESPACE.search(value):
+            return lambda x: False
+        return lambda x: value in WHITESPACE.split(x.get(name) or "")
+    elif operator == "|=":
+        prefix = value + "-"
+        return lambda x: (x.get(name) or "").startswith(prefix) or x.get(name) == value
+    elif operator == "^=":
+        return lambda x: bool(value) and (x.get(name) or "").startswith(value)
+    elif operator == "$=":
+        return lambda x: bool(value) and (x.get(name) or "").endswith(value)
+    elif operator == "*=":
+        return lambda x: bool(value) and value in (x.get(name) or "")
+    raise _UnsupportedSelector(operator)
+
+
+def _is_empty(element: etree._Element) -> bool:
+    if element.text:
+        return False
+    return not any(_is_element(x) or x.tail for x in element)
+
+
+def _pseudo_class_test(name: str, of_type: bool) -> Predicate:
+    if name == "root":
+        return lambda x: x.getparent() is None
+    elif name == "empty":
+        return _is_empty
+
+    def tag(element: etree._Element) -> Optional[str]:
+        return element.tag if of_type else None
+
+    if name in ("first-child", "first-of-type"):
+        return lambda x: _position(_preceding_siblings(x), tag(x)) == 1
+    elif name in ("last-child", "last-of-type"):
+        return lambda x: _position(_following_siblings(x), tag(x)) == 1
+    elif name in ("only-child", "only-of-type"):
+        return lambda x: (
+            _position(_preceding_siblings(x), tag(x)) == 1
+            and _position(_following_siblings(x), tag(x)) == 1
+        )
+    raise _UnsupportedSelector(name)
+
+
+def _nth_test(name: str, arguments: List) -> Predicate:
+    a, b = parse_series(arguments)
+    of_type = name.endswith("-of-type")
+
+    if name.startswith("nth-last-"):
+        siblings = _following_siblings
+    elif name.startswith("nth-"):
+        siblings = _preceding_siblings
+    else:
+        raise _UnsupportedSelector(name)
+
+    def predicate(element: etree._Element) -> bool:
+        tag = element.tag if of_type else None
+        return _matches_series(_position(siblings(element), tag), a, b)
+
+    return predicate
+
+
+def _compile_conditions(
+    selector: AnyType, in_negation: bool = False
+) -> Tuple[Element, List[Predicate]]:
+    """ Returns the name test of a compound selector and its other tests. """
+    conditions: List[Predicate] = []
+    while not isinstance(selector, Element):
+        if isinstance(selector, Class):
+            conditions.append(_attribute_test("class", "~=", selector.class_name))
+        elif isinstance(selector, Hash):
+            conditions.append(_attribute_test("id", "=", selector.id))
+        elif isinstance(selector, Attrib):
+            if selector.namespace is not None:
+                raise _UnsupportedSelector(selector)
+            value = getattr(selector.value, "value", selector.value)
+            conditions.append(
+                _attribute_test(selector.attrib, selector.operator, value)
+            )
+        elif isinstance(selector, Pseudo):
+            name = selector.ident.lower()
+            conditions.append(_pseudo_class_test(name, name.endswith("-of-type")))
+        elif isinstance(selector, Function):
+            conditions.append(_nth_test(selector.name.lower(), selector.arguments))
+        elif isinstance(selector, Negation) and not in_negation:
+            element, negated = _compile_conditions(selector.subselector, True)
+            # cssselect ignores the name test of a negated simple selector except it
+            # tests for a name, that's not supported here
+            if element.namespace is not None or element.element is not None:
+                raise _UnsupportedSelector(selector)
+            conditions.append(lambda x, n=tuple(negated): not all(y(x) for y in n))
+        else:
+            raise _UnsupportedSelector(selector)
+        selector = selector.selector
+
+    conditions.reverse()
+    return selector, conditions
+
+
+def _all(tests: Sequence[Predicate]) -> Predicate:
+    if not tests:
+        return lambda x: True
+    elif len(tests) == 1:
+        return tests[0]
+    return lambda x: all(y(x) for y in tests)
+
+
+def _compile_tree(tree: AnyType) -> _GroupBinder:
+    if isinstance(tree, CombinedSelector):
+        bind_left = _compile_tree(tree.selector)
+        bind_right = _compile_tree(tree.subselector)
+        combinator = tree.combinator
+
+        def bind(
+            namespaces: Namespaces, context: etree._Element
+        ) -> Tuple[Predicate, Optional[str]]:
+            left, _ = bind_left(namespaces, context)
+            right, tag = bind_right(namespaces, context)
+
+            if combinator == " ":
+
+                def predicate(element: etree._Element) -> bool:
+                    return right(element) and any(
+                        left(x) for x in _ancestors(element, context)
+                    )
+
+            elif combinator == ">":
+
+                def predicate(element: etree._Element) -> bool:
+                    if not right(element):
+                        return False
+                    parent = element.getparent()
+                    return parent is not None and parent is not context and left(parent)
+
+            elif combinator == "+":
+
+                def predicate(element: etree._Element) -> bool:
+                    if not right(element):
+                        return False
+                    sibling = _previous_sibling(element)
+                    return sibling is not None and left(sibling)
+
+            else:
+
+                def predicate(element: etree._Element) -> bool:
+                    return right(element) and any(
+                        left(x) for x in _preceding_siblings(element)
+                    )
+
+            return predicate, tag
+
+        if combinator not in " >+~":
+            raise _UnsupportedSelector(combinator)
+        return bind
+
+    element, conditions = _compile_conditions(tree)
+
+    def bind(
+        namespaces: Namespaces, context: etree._Element
+    ) -> Tuple[Predicate, Optional[str]]:
+        name_test = _name_test(element.namespace, element.element, namespaces)
+        if name_test is None:
+            return _all(conditions), None
+        return _all((name_test[0], *conditions)), name_test[1]
+
+    return bind
+
+
+def _bind_groups(binders: Sequence[_GroupBinder]) -> SelectorBinder:
+    def bind(context: etree._Element) -> Optional[BoundSelector]:
+        namespaces = context.nsmap
+        try:
+            bound = [x(namespaces, context) for x in binders]
+        except _UnknownPrefix:
+            return None
+
+        if len(bound) == 1:
+            predicate, tag = bound[0]
+            return predicate, tag or "*"
+
+        predicates = tuple(x for x, _ in bound)
+        return (lambda x: any(y(x) for y in predicates)), "*"
+
+    return bind
+
+
+def compile_css_selector(selector: str) -> Optional[SelectorBinder]:
+    """ Compiles a CSS selector into a :obj:`SelectorBinder`. That returns ``None``
+        if the selector contains a namespace prefix that the context element doesn't
+        declare. ``None`` is returned instead of a binder if the selector contains
+        pseudo-classes, pseudo-elements or namespaced attributes that aren't
+        supported. The selector must be valid. Like its translation to an XPath
+        expression that starts with ``//`` is evaluated by delb, all compound
+        selectors only match descendants of the context element. """
+    groups = parse(selector)
+    if any(x.pseudo_element is not None for x in groups):
+        return None
+    try:
+        bind_groups = _bind_groups([_compile_tree(x.parsed_tree) for x in groups])
+    except _UnsupportedSelector:
+        return None
+
+    def bind(context: etree._Element) -> Optional[BoundSelector]:
+        bound = bind_groups(context)
+        if bound is None:
+            return None
+        predicate, tag = bound
+        return (lambda x: x is not context and predicate(x)), tag
+
+    return bind
+
+
+# xpath
+
+
+XPATH_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<literal>"[^"]*"|'[^']*')
+        |(?P<name>[A-Za-z_][\w.-]*(?::(?:[A-Za-z_][\w.-]*|\*))?)
+        |(?P<operator>//|::|!=|\.\.|[/.*@\[\]()|=])
+    )\s*""",
+    re.VERBOSE,
+)
+
+XPATH_AXES = (
+    "ancestor",
+    "ancestor-or-self",
+    "child",
+    "descendant",
+    "descendant-or-self",
+    "parent",
+    "self",
+)
+# the axes whose inverse can be followed cheaply from a matched element
+XPATH_INVERTIBLE_AXES = ("child", "descendant", "descendant-or-self", "self")
+
+NODE = object()
+""" Signifies the ``node()`` node test in a location step. """
+
+
+class _XPathStep:
+    __slots__ = ("axis", "prefix", "local_name", "attribute_tests")
+
+    def __init__(self, axis: str, name: AnyType):
+        self.axis = axis
+        if name is NODE or name == "*":
+            self.prefix, self.local_name = None, None if name == "*" else NODE
+        elif ":" in name:
+            self.prefix, self.local_name = name.split(":")
+            if self.local_name == "*":
+                self.local_name = None
+        else:
+            self.prefix, self.local_name = None, name
+        self.attribute_tests: List[Tuple[str, str, Optional[str]]] = []
+
+
+def _tokenize_xpath(expression: str) -> List[Tuple[str, str]]:
+    result, position = [], 0
+    while position < len(expression):
+        match = XPATH_TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise _UnsupportedSelector(expression[position:])
+        kind = match.lastgroup
+        result.append((kind, match.group(kind)))
+        position = match.end()
+    return result
+
+
+class _XPathParser:
+    """ Parses the supported subset of XPath: location paths with the axes in
+        :obj:`XPATH_AXES`, name tests and predicates that test the presence or the
+        value of attributes, joined with ``and``. """
+
+    def __init__(self, expression: str):
+        self.tokens = _tokenize_xpath(expression)
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def take(self, kind: str = None) -> str:
+        if self.position >= len(self.tokens):
+            raise _UnsupportedSelector("end of expression")
+        token_kind, token = self.tokens[self.position]
+        if kind is not None and token_kind != kind:
+            raise _UnsupportedSelector(token)
+        self.position += 1
+        return token
+
+    def expect(self, token: str) -> None:
+        if self.take() != token:
+            raise _UnsupportedSelector(token)
+
+    def parse(self) -> List[List[_XPathStep]]:
+        paths = [self.parse_path()]
+        while self.peek() == "|":
+            self.take()
+            paths.append(self.parse_path())
+        if self.peek() is not None:
+            raise _UnsupportedSelector(self.peek())
+        return paths
+
+    def parse_path(self) -> List[_XPathStep]:
+        # like delb does, a leading slash is treated as abbreviation for
+        # descendant-or-self::node()/ on the context node
+        descendant = False
+        if self.peek() in ("/", "//"):
+            self.take()
+            descendant = True
+
+        steps = []
+        while True:
+            step = self.parse_step()
+            if descendant:
+                # a // abbreviates /descendant-or-self::node()/
+                if step.axis == "child":
+                    step.axis = "descendant"
+                elif step.axis == "self":
+                    step.axis = "descendant-or-self"
+                elif step.axis not in ("descendant", "descendant-or-self"):
+                    raise _UnsupportedSelector(step.axis)
+            steps.append(step)
+
+            if self.peek() not in ("/", "//"):
+                break
+            descendant = self.take() == "//"
+
+        return steps
+
+    def parse_step(self) -> _XPathStep:
+        token = self.peek()
+        if token == ".":
+            self.take()
+            return _XPathStep("self", NODE)
+        elif token == "..":
+            self.take()
+            return _XPathStep("parent", NODE)
+
+        axis = "child"
+        if (
+            self.position + 1 < len(self.tokens)
+            and self.tokens[self.position + 1][1] == "::"
+        ):
+            axis = self.take("name")
+            self.take()
+            if axis not in XPATH_AXES:
+                raise _UnsupportedSelector(axis)
+
+        if self.peek() == "*":
+            step = _XPathStep(axis, self.take())
+        else:
+            name = self.take("name")
+            if self.peek() == "(":
+                self.take()
+                self.expect(")")
+                if name != "node":
+                    raise _UnsupportedSelector(name)
+                step = _XPathStep(axis, NODE)
+            else:
+                step = _XPathStep(axis, name)
+
+        while self.peek() == "[":
+            self.take()
+            step.attribute_tests.extend(self.parse_predicate())
+            self.expect("]")
+
+        return step
+
+    def parse_predicate(self) -> List[Tuple[str, str, Optional[str]]]:
+        result = [self.parse_attribute_test()]
+        while self.peek() == "and":
+            self.take()
+            result.append(self.parse_attribute_test())
+        return result
+
+    def parse_attribute_test(self) -> Tuple[str, str, Optional[str]]:
+        self.expect("@")
+        name = self.take("name")
+        if name.endswith(":*"):
+            raise _UnsupportedSelector(name)
+        if self.peek() in ("=", "!="):
+            operator = self.take()
+            return name, operator, self.take("literal")[1:-1]
+        return name, "exists", None
+
+
+def _attribute_name(name: str, namespaces: Namespaces) -> str:
+    if ":" not in name:
+        return name
+    prefix, local_name = name.split(":")
+    if prefix == "xml":
+        return "{" + XML_NAMESPACE + "}" + local_name
+    if prefix not in namespaces:
+        raise _UnknownPrefix(prefix)
+    return "{" + namespaces[prefix] + "}" + local_name
+
+
+def _xpath_attribute_test(name: str, operator: str, value: Optional[str]) -> Predicate:
+    if operator == "!=":
+        # other than with css, a missing attribute doesn't match
+        return lambda x: x.get(name) not in (None, value)
+    return _attribute_test(name, operator, value)
+
+
+def _forward_test(axis: str, context: etree._Element, element: etree._Element) -> bool:
+    """ Tests whether ``element`` is on the ``axis`` of the ``context`` element. """
+    if axis == "self":
+        return element is context
+    elif axis == "child":
+        return element.getparent() is context
+    elif axis == "descendant":
+        return any(x is context for x in _ancestors(element))
+    elif axis == "descendant-or-self":
+        return element is context or any(x is context for x in _ancestors(element))
+    elif axis == "parent":
+        return element is context.getparent()
+    elif axis == "ancestor":
+        return any(x is element for x in _ancestors(context))
+    elif axis == "ancestor-or-self":
+        return element is context or any(x is element for x in _ancestors(context))
+    raise _UnsupportedSelector(axis)
+
+
+def _inverse_axis(axis: str) -> Callable[[etree._Element], Iterator[etree._Element]]:
+    if axis == "self":
+        return lambda x: iter((x,))
+    elif axis == "child":
+        return lambda x: iter(() if x.getparent() is None else (x.getparent(),))
+    elif axis == "descendant":
+        return _ancestors
+    elif axis == "descendant-or-self":
+        return lambda x: chain((x,), _ancestors(x))
+    raise _UnsupportedSelector(axis)
+
+
+def _compile_path(steps: List[_XPathStep]) -> _GroupBinder:
+    # self::node() steps without predicates don't change the context
+    steps = [
+        x
+        for x in steps
+        if not (x.axis == "self" and x.local_name is NODE and not x.attribute_tests)
+    ] or steps
+    if steps[-1].local_name is NODE:
+        # delb doesn't allow that the last step selects other nodes than elements
+        raise _UnsupportedSelector("node()")
+    if any(x.axis not in XPATH_INVERTIBLE_AXES for x in steps[1:]):
+        raise _UnsupportedSelector(steps)
+    if steps[0].local_name is NODE and steps[0].axis.startswith(("ancestor", "parent")):
+        # these would also select the document node that isn't an element
+        raise _UnsupportedSelector(steps[0].axis)
+
+    def bind(
+        namespaces: Namespaces, context: etree._Element
+    ) -> Tuple[Predicate, Optional[str]]:
+        predicate: Optional[Predicate] = None
+        tag: Optional[str] = None
+
+        for step in steps:
+            tests = [
+                _xpath_attribute_test(
+                    _attribute_name(name, namespaces), operator, value
+                )
+                for name, operator, value in step.attribute_tests
+            ]
+            if step.local_name is NODE:
+                tag = None
+            else:
+                name_test = _name_test(step.prefix, step.local_name, namespaces)
+                if name_test is None:
+                    tag = None
+                else:
+                    tests.insert(0, name_test[0])
+                    tag = name_test[1]
+            test = _all(tests)
+
+            if predicate is None:
+                axis = step.axis
+
+                def predicate(x, test=test, axis=axis):
+                    return test(x) and _forward_test(axis, context, x)
+
+            else:
+                inverse_axis = _inverse_axis(step.axis)
+
+                def predicate(x, test=test, inverse_axis=inverse_axis, left=predicate):
+                    return test(x) and any(left(y) for y in inverse_axis(x))
+
+        return predicate, tag
+
+    return bind
+
+
+def compile_xpath(expression: str) -> Optional[SelectorBinder]:
+    """ Compiles an XPath expression into a :obj:`SelectorBinder` if it consists of
+        location paths whose first step uses any of the axes ``ancestor``,
+        ``ancestor-or-self``, ``child``, ``descendant``, ``descendant-or-self``,
+        ``parent`` or ``self`` and following steps use ``child``, ``descendant``,
+        ``descendant-or-self`` or ``self``. Steps can have name tests, their
+        abbreviations and predicates that test for the presence of attributes or
+        their values with ``=`` and ``!=``, also joined with ``and``. The ``node()``
+        test isn't supported on the ``ancestor``, ``ancestor-or-self`` and
+        ``parent`` axes. Like
+        :meth:`delb.TagNode.xpath` does, a leading slash is interpreted as
+        ``descendant-or-self::node()/`` on the context element. ``None`` is returned
+        for other expressions. """
+    try:
+        return _bind_groups(
+            [_compile_path(x) for x in _XPathParser(expression).parse()]
+        )
+    except _UnsupportedSelector:
+        return None
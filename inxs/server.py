@@ -0,0 +1,359 @@
+""" This module contains a server that keeps transformations loaded and applies them
+    to documents that are submitted over HTTP, either via a TCP port or a Unix domain
+    socket. It is started with ``inxs serve``, see ``inxs serve --help``. """
+
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from os import cpu_count
+from pathlib import Path
+from socketserver import BaseServer, ThreadingMixIn, UnixStreamServer
+from threading import BoundedSemaphore, local
+from traceback import print_exc
+from typing import Dict, Sequence, Tuple
+from urllib.parse import unquote, urlsplit
+
+from delb import Document
+from lxml import etree
+
+from inxs import Transformation
+from inxs.cli import get_transformation, setup_logging
+from inxs.lib import dbg, logger, nfo
+
+
+__all__ = ["main", "make_server"]
+
+
+_transformations: Dict[str, Transformation] = {}
+""" The transformations that a process serves, mapped to their names. """
+
+_local = local()
+""" Holds the parser of a worker thread. """
+
+
+def parse_args(args: Sequence[str]) -> Namespace:
+    parser = ArgumentParser(
+        prog="inxs serve",
+        description="Serves transformations over HTTP. Documents are submitted as "
+        "body of a POST request to the path /NAME, the response contains the result. "
+        "A GET request to / lists the names of the served transformations.",
+    )
+
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="The address to listen on, defaults to 127.0.0.1.",
+    )
+    parser.add_argument(
+        "--port", "-P", type=int, default=8000, help="The port to listen on."
+    )
+    parser.add_argument(
+        "--socket",
+        "-s",
+        type=Path,
+        default=None,
+        help="Listen on a Unix domain socket at this path instead of a TCP port.",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="The number of workers that apply transformations, defaults to the "
+        "number of CPUs.",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=("process", "thread"),
+        default="process",
+        help="Whether the workers are processes or threads.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="The number of documents that are accepted for processing at once, "
+        "further requests are rejected with status 503. Defaults to twice the "
+        "number of workers.",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=64 * 1024 ** 2,
+        help="The maximal size of a submitted document in bytes, larger ones are "
+        "rejected with status 413. Defaults to 64 MiB.",
+    )
+    parser.add_argument(
+        "--pretty",
+        "-p",
+        action="store_true",
+        default=False,
+        help='Prettifies the resulting documents with indentations to be "human '
+        'readable."',
+    )
+    parser.add_argument(
+        "--recover",
+        action="store_true",
+        default=False,
+        help="Let the parser try to process broken XML.",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="count",
+        default=0,
+        help="Increases the logging level; twice for debug.",
+    )
+    parser.add_argument(
+        "transformations",
+        metavar="[NAME=]TRANSFORMATION",
+        nargs="+",
+        help="A transformation as it is located by the transformation argument of "
+        "the inxs command. The name it's served as defaults to the transformation's "
+        "symbol if provided, otherwise to the module's file name without suffix.",
+    )
+
+    result = parser.parse_args(args)
+    if result.workers is not None and result.workers < 1:
+        parser.error("--workers must be positive.")
+    if result.queue_size is not None and result.queue_size < 1:
+        parser.error("--queue-size must be positive.")
+    if result.max_size < 1:
+        parser.error("--max-size must be positive.")
+    return result
+
+
+def parse_transformation_spec(spec: str) -> Tuple[str, str]:
+    """ Splits a ``[NAME=]TRANSFORMATION`` argument into a name and a location. """
+    if "=" in spec:
+        name, location = spec.split("=", 1)
+    else:
+        location = spec
+        module_path, _, symbol = spec.partition(":")
+        name = symbol or Path(module_path).stem
+    return name, location
+
+
+def load_transformations(specs: Sequence[str]) -> Dict[str, Transformation]:
+    result = {}
+    for spec in specs:
+        name, location = parse_transformation_spec(spec)
+        if name in result:
+            raise RuntimeError(
+                f"The name '{name}' is used for multiple transformations."
+            )
+        result[name] = get_transformation(location)
+        nfo(f"Loaded transformation '{name}' from {location}.")
+    return result
+
+
+def _init_worker(specs: Sequence[str], recover: bool) -> None:
+    # the transformations are inherited from the server process if the worker was
+    # forked or runs in a thread
+    if not _transformations:
+        _transformations.update(load_transformations(specs))
+    _local.parser = etree.XMLParser(recover=recover)
+
+
+def _transform(name: str, data: bytes, pretty: bool) -> Tuple[int, bytes]:
+    """ Returns the status code and body of a response to a submitted document. """
+    try:
+        tree = etree.fromstring(data, _local.parser).getroottree()
+    except etree.XMLSyntaxError as e:
+        return HTTPStatus.BAD_REQUEST, str(e).encode()
+
+    try:
+        document = Document(tree)
+        document.root = _transformations[name](document.root)
+        buffer = BytesIO()
+        document.write(buffer, pretty=pretty)
+    except Exception:
+        # the traceback may reveal the server's internals and is only logged
+        logger.exception(f"Failed to apply the transformation '{name}'.")
+        return (
+            HTTPStatus.INTERNAL_SERVER_ERROR,
+            f"The transformation '{name}' failed.".encode(),
+        )
+
+    return HTTPStatus.OK, buffer.getvalue()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "inxs"
+
+    def address_string(self) -> str:
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "local"
+
+    def log_message(self, format, *args) -> None:
+        dbg(f"{self.address_string()} - {format % args}")
+
+    def _respond(self, status: int, body: bytes, content_type: str, **headers) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond_with_text(self, status: int, text: str, **headers) -> None:
+        self._respond(status, text.encode(), "text/plain; charset=utf-8", **headers)
+
+    def _reject(self, status: int, text: str, **headers) -> None:
+        # the request's body isn't read, hence the connection can't be reused
+        self.close_connection = True
+        self._respond_with_text(status, text, Connection="close", **headers)
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path != "/":
+            self._respond_with_text(HTTPStatus.NOT_FOUND, "Not found.\n")
+            return
+        self._respond_with_text(
+            HTTPStatus.OK, "".join(f"{x}\n" for x in self.server.transformations)
+        )
+
+    def do_POST(self) -> None:
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self._reject(
+                HTTPStatus.LENGTH_REQUIRED, "The Content-Length header is missing.\n"
+            )
+            return
+        length = length.strip()
+        if not (length.isascii() and length.isdigit()):
+            self._reject(
+                HTTPStatus.BAD_REQUEST, "The Content-Length header is invalid.\n"
+            )
+            return
+        length = int(length)
+        if length > self.server.max_size:
+            self._reject(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Documents must not be larger than {self.server.max_size} bytes.\n",
+            )
+            return
+
+        name = unquote(urlsplit(self.path).path.strip("/"))
+        if name not in self.server.transformations:
+            self._reject(
+                HTTPStatus.NOT_FOUND, f"There's no transformation named '{name}'.\n"
+            )
+            return
+
+        # a slot is acquired before the body is read, so that rejected requests
+        # don't occupy any memory
+        if not self.server.slots.acquire(blocking=False):
+            self._reject(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                "The server is busy, try again later.\n",
+                Retry_After="1",
+            )
+            return
+        try:
+            data = self.rfile.read(length)
+            status, body = self.server.executor.submit(
+                _transform, name, data, self.server.pretty
+            ).result()
+        finally:
+            self.server.slots.release()
+
+        if status == HTTPStatus.OK:
+            self._respond(status, body, "application/xml")
+        else:
+            self._respond(status, body, "text/plain; charset=utf-8")
+
+
+class _TransformationServerMixin:
+    daemon_threads = True
+    executor: Executor
+    max_size: int
+    pretty: bool
+    slots: BoundedSemaphore
+    transformations: Dict[str, Transformation]
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown()
+
+
+class _HTTPServer(_TransformationServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class _UnixHTTPServer(_TransformationServerMixin, ThreadingMixIn, UnixStreamServer):
+    def server_close(self) -> None:
+        super().server_close()
+        Path(self.server_address).unlink()
+
+
+def make_server(args: Namespace) -> BaseServer:
+    """ Returns a server that is configured with the parsed command line arguments
+        and whose workers are started. It serves requests after its
+        ``serve_forever`` method was called and must be closed with its
+        ``server_close`` method. """
+    _transformations.clear()
+    _init_worker(args.transformations, args.recover)
+
+    workers = args.workers or cpu_count() or 1
+    if args.executor == "process":
+        executor = ProcessPoolExecutor(
+            workers,
+            initializer=_init_worker,
+            initargs=(args.transformations, args.recover),
+        )
+        # the worker processes are started before the server spawns any threads
+        executor.submit(int).result()
+    else:
+        executor = ThreadPoolExecutor(
+            workers,
+            initializer=_init_worker,
+            initargs=(args.transformations, args.recover),
+        )
+
+    try:
+        if args.socket is None:
+            server = _HTTPServer((args.host, args.port), _RequestHandler)
+        else:
+            if args.socket.is_socket():
+                args.socket.unlink()
+            server = _UnixHTTPServer(str(args.socket), _RequestHandler)
+    except Exception:
+        executor.shutdown()
+        raise
+
+    server.executor = executor
+    server.max_size = args.max_size
+    server.pretty = args.pretty
+    server.slots = BoundedSemaphore(args.queue_size or workers * 2)
+    server.transformations = dict(_transformations)
+    return server
+
+
+def main(args: Sequence[str] = None) -> None:
+    try:
+        if args is None:
+            args = sys.argv[1:]
+        args = parse_args(args)
+        setup_logging(args.verbose)
+        dbg(f"Invoked with args: {args}")
+        server = make_server(args)
+    except Exception:
+        print_exc()
+        raise SystemExit(2)
+
+    if args.socket is None:
+        nfo(f"Serving on http://{args.host}:{server.server_address[1]}/")
+    else:
+        nfo(f"Serving on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,315 @@
+""" This module contains a transformation that processes documents of arbitrary size
+    record by record. """
+
+from os import PathLike
+from types import SimpleNamespace
+from typing import Any as AnyType
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from lxml import etree
+
+from inxs import _element_wrapper, dbg, dot_lookup, Rule, StepType, Transformation
+
+
+__all__ = ["StreamingTransformation"]
+
+
+SourceType = Union[str, PathLike, BinaryIO]
+
+
+class _OpenElement:
+    """ Represents an element that isn't a record while its content is streamed. """
+
+    __slots__ = ("element", "context", "text_written")
+
+    def __init__(self, element: etree._Element, context: AnyType):
+        self.element = element
+        self.context = context
+        self.text_written = False
+
+
+def _write_element(
+    writer: AnyType, element: etree._Element, nsmap: Dict[Union[str, None], str]
+) -> None:
+    """ Writes an element and its descendants without the namespace declarations in
+        ``nsmap`` that are already in scope of the output. """
+    # lxml would repeat all namespace declarations that are in scope of the element
+    if not any(nsmap.get(k) == v for k, v in element.nsmap.items()):
+        writer.write(element, with_tail=False)
+        return
+
+    def open_element(element: etree._Element, nsmap: Dict[Union[str, None], str]):
+        context = writer.element(
+            element.tag,
+            attrib=dict(element.attrib),
+            nsmap={k: v for k, v in element.nsmap.items() if nsmap.get(k) != v},
+        )
+        context.__enter__()
+        if element.text:
+            writer.write(element.text)
+        return element, context, element.iterchildren()
+
+    stack = [open_element(element, nsmap)]
+    while stack:
+        element, context, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            context.__exit__(None, None, None)
+            stack.pop()
+            if stack and element.tail:
+                writer.write(element.tail)
+        elif isinstance(child.tag, str):
+            stack.append(open_element(child, element.nsmap))
+        else:
+            # comments and processing instructions
+            writer.write(child)
+
+
+class StreamingTransformation(Transformation):
+    """ A transformation that parses a document incrementally and applies its steps to
+        each record element as soon as the record has been parsed completely.
+        Processed records are written to an output and freed afterwards, hence the
+        processed documents' sizes aren't limited by the available memory.
+
+        Each record is the :term:`transformation root` for the steps that are applied
+        to it, the :term:`context` persists across all records of a document.
+        :class:`inxs.Rule` s are applied to the records that their ``record`` argument
+        or otherwise the ``record`` configuration value names, other steps are applied
+        to all records. Records that are contained in another record aren't
+        considered as such. The elements that aren't contained in a record are
+        copied to the output, comments and processing instructions among them are
+        dropped. Records that are removed by a handler aren't written, the text that
+        follows them is. A document's root element can also be a record.
+        The steps may replace the :term:`transformation root` that is written in
+        place of a record. After a step raised :class:`inxs.AbortTransformation`,
+        the remaining records are copied to the output unprocessed.
+
+        :param steps: See :class:`inxs.Transformation`.
+        :param config: See :class:`inxs.Transformation`, the ``copy`` value is
+                       ignored. Additionally:
+
+                       - ``record`` is the name of the elements that are processed as
+                         records by rules that don't declare one, either as local name
+                         or in Clark notation.
+                       - ``result_object`` defaults to ``None`` and can't be
+                         ``'root'``.
+    """
+
+    __slots__ = ("_records_names", "_records_steps")
+
+    config_defaults = {
+        **Transformation.config_defaults,
+        "record": None,
+        "result_object": None,
+    }
+
+    def __init__(self, *steps: StepType, **config: AnyType) -> None:
+        super().__init__(*steps, **config)
+        if self.config.result_object == "root":
+            raise ValueError("A streaming transformation can't return the root.")
+        self._records_names = {
+            x.record or self.config.record for x in self.steps if isinstance(x, Rule)
+        }
+        self._records_names.add(self.config.record)
+        self._records_names.discard(None)
+        self._records_steps: Dict[str, Union[Tuple[StepType, ...], None]] = {}
+
+    def _validate_steps(self):
+        super()._validate_steps()
+        assert self.config.record is not None or all(
+            x.record is not None for x in self.steps if isinstance(x, Rule)
+        ), "All rules must declare a record if the transformation doesn't."
+
+    def __call__(
+        self,
+        source: SourceType,
+        output: Union[str, PathLike, BinaryIO] = None,
+        **context: AnyType,
+    ) -> AnyType:
+        """ Processes the document that is read from ``source``, which is either a
+            path or a binary file-like object.
+
+            :param output: An optional path or binary file-like object that the
+                           processed document is written to.
+            :param context: Items that are added to the :term:`context`.
+            :returns: The ``result_object`` if one is configured.
+        """
+        if isinstance(source, PathLike):
+            source = str(source)
+        if isinstance(output, PathLike):
+            output = str(output)
+
+        context = self._resolve_context(context)
+        if output is None:
+            self._stream(source, None, context)
+        else:
+            with etree.xmlfile(output, encoding="utf-8") as writer:
+                writer.write_declaration()
+                self._stream(source, writer, context)
+
+        if self.config.result_object:
+            return dot_lookup(
+                SimpleNamespace(config=self.config, context=context),
+                self.config.result_object,
+            )
+        return None
+
+    def _get_record_steps(self, tag: str) -> Union[Tuple[StepType, ...], None]:
+        """ Returns the steps of the execution plan that apply to elements with the
+            given tag or ``None`` if these aren't records. """
+        try:
+            return self._records_steps[tag]
+        except KeyError:
+            pass
+
+        names = (tag, tag.rpartition("}")[2])
+        if not any(x in self._records_names for x in names):
+            result = None
+        else:
+            result = []
+            for step in self._execution_plan:
+                if isinstance(step, tuple):
+                    step = tuple(
+                        x for x in step if (x.record or self.config.record) in names
+                    )
+                    if step:
+                        result.append(step)
+                elif isinstance(step, Rule):
+                    if (step.record or self.config.record) in names:
+                        result.append(step)
+                else:
+                    result.append(step)
+            result = tuple(result)
+
+        self._records_steps[tag] = result
+        return result
+
+    def _process_record(
+        self,
+        element: etree._Element,
+        steps: Sequence[StepType],
+        context: SimpleNamespace,
+    ) -> Tuple[bool, Optional[etree._Element], Optional[etree._Element]]:
+        """ Returns whether the transformation wasn't aborted, the record's element
+            after the steps were applied, a handler may have replaced it as
+            :term:`transformation root`, and the element in the parsed tree at the
+            record's position. That is a placeholder that holds the text following the
+            record if a handler removed it. The latter two are ``None`` if the record
+            was removed, respectively if it's the document's root element. """
+        dbg("Processing a record <%s>.", element.tag)
+        # delb can only detach nodes from a tree without a document if their parent is
+        # the root, hence the record is processed as child of a stand-in for its parent
+        parent = element.getparent()
+        if parent is not None:
+            index, tail = parent.index(element), element.tail
+            container = etree.Element(
+                parent.tag, attrib=dict(parent.attrib), nsmap=parent.nsmap
+            )
+            container.append(element)
+
+        node = _element_wrapper(None)(element)
+        self._init_transformation(node, False, context)
+        try:
+            completed = self._apply_steps(steps)
+            record = self.states.root._etree_obj
+        finally:
+            self._finalize_transformation()
+
+        if parent is None:
+            return completed, record, None
+        if element.getparent() is container:
+            parent.insert(index, element)
+            return completed, record, element
+        # the text that follows the removed record is attached to a placeholder, the
+        # parser continues to add text to it as well
+        placeholder = etree.Comment()
+        placeholder.tail = tail
+        parent.insert(index, placeholder)
+        return completed, None, placeholder
+
+    def _stream(
+        self, source: SourceType, writer: AnyType, context: SimpleNamespace
+    ) -> None:
+        aborted = False
+        open_elements: List[_OpenElement] = []
+        # the record or closed element whose tail is only known with the next event and
+        # the processed record that is written in its place
+        pending, pending_record = None, None
+        # the number of open elements within the current record and its steps
+        depth, steps = 0, ()
+
+        def write_text(open_element: _OpenElement):
+            if not open_element.text_written:
+                if writer is not None and open_element.element.text:
+                    writer.write(open_element.element.text)
+                open_element.text_written = True
+
+        for event, element in etree.iterparse(source, events=("start", "end")):
+            if depth:
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth:
+                    continue
+                # a record is complete
+                record = element
+                anchor = None if element.getparent() is None else element
+                if not aborted:
+                    completed, record, anchor = self._process_record(
+                        element, steps, context
+                    )
+                    aborted = not completed
+                if anchor is not None:
+                    pending, pending_record = anchor, record
+                elif record is not None and not open_elements:
+                    # the document's root element is the record
+                    if writer is not None:
+                        _write_element(writer, record, {})
+                continue
+
+            if pending is not None:
+                if writer is not None:
+                    if pending_record is not None:
+                        _write_element(
+                            writer, pending_record, open_elements[-1].element.nsmap
+                        )
+                    if pending.tail:
+                        writer.write(pending.tail)
+                pending.getparent().remove(pending)
+                pending, pending_record = None, None
+
+            if event == "start":
+                if open_elements:
+                    write_text(open_elements[-1])
+
+                steps = self._get_record_steps(element.tag)
+                if steps is not None:
+                    depth = 1
+                    continue
+
+                if writer is None:
+                    open_element = _OpenElement(element, None)
+                else:
+                    parent = element.getparent()
+                    parent_nsmap = {} if parent is None else parent.nsmap
+                    element_context = writer.element(
+                        element.tag,
+                        attrib=dict(element.attrib),
+                        nsmap={
+                            k: v
+                            for k, v in element.nsmap.items()
+                            if parent_nsmap.get(k) != v
+                        },
+                    )
+                    element_context.__enter__()
+                    open_element = _OpenElement(element, element_context)
+                open_elements.append(open_element)
+
+            else:
+                open_element = open_elements.pop()
+                write_text(open_element)
+                if writer is not None:
+                    open_element.context.__exit__(None, None, None)
+                if open_elements:
+                    pending = element
@@ -4,8 +4,8 @@ from setuptools import setup
 from sys import version_info
 
 
-if version_info < (3, 6):
-    raise RuntimeError("Requires Python 3.6 or later.")
+if version_info < (3, 7):
+    raise RuntimeError("Requires Python 3.7 or later.")
 
 VERSION = '0.2b1'
 
@@ -27,7 +27,13 @@ setup(
     packages=['inxs'],
     package_dir={'inxs': 'inxs'},
     include_package_data=True,
-    install_requires=('delb', 'dependency_injection'),
+    python_requires='>=3.7',
+    install_requires=(
+        # the private interface to wrap lxml elements may change with any release
+        'delb>=0.1,<0.2',
+        'dependency_injection',
+        'importlib_metadata; python_version < "3.8"',
+    ),
     license="AGPLv3+",
     zip_safe=False,
     entry_points={'console_scripts': ['inxs = inxs.cli:main']},
@@ -40,7 +46,6 @@ setup(
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3 :: Only',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: Implementation :: CPython',
         'Topic :: Text Processing :: Markup :: XML'
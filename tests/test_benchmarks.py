@@ -0,0 +1,41 @@
+import json
+
+from delb import is_tag_node
+
+from benchmarks.__main__ import main
+from benchmarks.corpus import generate_mods, generate_tei
+
+
+def test_generators_are_deterministic():
+    document = generate_tei(500, seed=1)
+    assert str(document) == str(generate_tei(500, seed=1))
+    assert str(document) != str(generate_tei(500, seed=2))
+    # <text> and <body> are the ancestors of the generated elements
+    assert sum(1 for _ in document.root.child_nodes(is_tag_node, recurse=True)) == 502
+
+    document = generate_mods(5)
+    assert str(document) == str(generate_mods(5))
+    assert len(document.xpath("//mods:mods")) == 5
+
+
+def test_runner(capsys, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    arguments = ["--size", "100", "--records", "2", "--repeat", "1"]
+    arguments += ["--baseline", str(baseline)]
+
+    names = ["attributes", "mods_to_tei", "startup"]
+    assert main(arguments + ["--save-baseline"] + names) == 0
+    stored = json.loads(baseline.read_text())
+    assert set(stored["results"]) == set(names)
+    assert stored["results"]["attributes"]["nodes"] == 103
+    assert "attributes" in capsys.readouterr().out
+
+    stored["results"]["attributes"]["seconds"] /= 1000
+    baseline.write_text(json.dumps(stored))
+    assert main(arguments + ["attributes"]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+    stored["parameters"] = None
+    baseline.write_text(json.dumps(stored))
+    assert main(arguments + ["attributes"]) == 0
+    assert "different parameters" in capsys.readouterr().err
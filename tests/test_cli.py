@@ -1,5 +1,10 @@
+import io
+import subprocess
+import sys
 from pathlib import Path
 
+import pytest
+
 from inxs.cli import main as _main
 
 from tests import equal_documents
@@ -19,3 +24,94 @@ def main(*args):
 def test_mods_to_tei(datadir):
     main("--inplace", datadir / "mods_to_tei.py", datadir / "mods_to_tei.xml")
     assert equal_documents(datadir / "mods_to_tei.xml", datadir / "mods_to_tei_exp.xml")
+
+
+def test_batch_to_output_dir(datadir):
+    inputs = datadir / "inputs"
+    (inputs / "sub").mkdir(parents=True)
+    for path in (inputs / "a.xml", inputs / "sub" / "b.xml"):
+        path.write_bytes((datadir / "mods_to_tei.xml").read_bytes())
+    output_dir = datadir / "outputs"
+
+    main("--jobs", "2", "-o", output_dir, datadir / "mods_to_tei.py", inputs)
+
+    for path in (output_dir / "a.xml", output_dir / "sub" / "b.xml"):
+        assert equal_documents(path, datadir / "mods_to_tei_exp.xml")
+
+
+def test_batch_inputs_from_stdin(datadir, monkeypatch):
+    inputs = []
+    for name in ("a", "b", "c"):
+        path = datadir / f"{name}.xml"
+        path.write_bytes((datadir / "mods_to_tei.xml").read_bytes())
+        inputs.append(path)
+    monkeypatch.setattr("sys.stdin", io.StringIO("".join(f"{x}\n" for x in inputs)))
+
+    main("--inplace", datadir / "mods_to_tei.py", "-")
+
+    for path in inputs:
+        assert equal_documents(path, datadir / "mods_to_tei_exp.xml")
+        assert path.with_suffix(".orig").exists()
+
+
+def test_batch_inputs_from_empty_stdin(capsys, datadir, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n"))
+
+    with pytest.raises(SystemExit) as excinfo:
+        main(datadir / "mods_to_tei.py")
+
+    assert excinfo.value.code == 2
+    assert "No input files were given." in capsys.readouterr().err
+
+
+def test_batch_glob_and_failures(capsys, datadir):
+    (datadir / "broken.xml").write_text("<broken>")
+    output_dir = datadir / "outputs"
+
+    with pytest.raises(SystemExit) as excinfo:
+        main("-o", output_dir, datadir / "mods_to_tei.py", str(datadir / "*.xml"))
+
+    assert excinfo.value.code == 2
+    assert "Failed to process" in capsys.readouterr().err
+    assert not (output_dir / "broken.xml").exists()
+    assert equal_documents(
+        output_dir / "mods_to_tei.xml", datadir / "mods_to_tei_exp.xml"
+    )
+
+
+def test_batch_outputs_keep_relative_paths(capsys, datadir):
+    for name in ("a", "b"):
+        (datadir / name).mkdir()
+        (datadir / name / "x.xml").write_bytes(
+            (datadir / "mods_to_tei.xml").read_bytes()
+        )
+    output_dir = datadir / "outputs"
+
+    main("-o", output_dir, datadir / "mods_to_tei.py", str(datadir / "**" / "x.xml"))
+
+    for name in ("a", "b"):
+        assert equal_documents(
+            output_dir / name / "x.xml", datadir / "mods_to_tei_exp.xml"
+        )
+
+    with pytest.raises(SystemExit) as excinfo:
+        main(
+            "-o",
+            output_dir,
+            datadir / "mods_to_tei.py",
+            datadir / "a" / "x.xml",
+            datadir / "b" / "x.xml",
+        )
+
+    assert excinfo.value.code == 2
+    assert "would both be written to" in capsys.readouterr().err
+
+
+def test_startup_imports():
+    modules = subprocess.run(
+        (sys.executable, "-c", "import sys, inxs.cli; print(*sys.modules)"),
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout.split()
+    for module in (b"concurrent.futures.process", b"pkg_resources"):
+        assert module not in modules
@@ -1,11 +1,13 @@
 import operator
 import re
 
-from delb import Document, first, is_text_node, is_tag_node
+from delb import Document, TagNode, first, is_text_node, is_tag_node
+from lxml import etree
 from pytest import mark
 
 from inxs import (
     Any,
+    HasNamespace,
     If,
     lib,
     MatchesAttributes,
@@ -15,6 +17,9 @@ from inxs import (
     Rule,
     Transformation,
 )
+from inxs import _translate_css_selector as _translate
+from inxs.constants import CONDITION_COST_ATTRIBUTE
+from inxs.selectors import compile_xpath
 
 
 def test_Any():
@@ -78,6 +83,24 @@ def test_common_conditions():
     assert transformation(document) == ["foo", "peng"]
 
 
+@mark.parametrize("index", (False, True))
+@mark.parametrize("select_candidates", (False, True))
+def test_has_no_namespace(index, select_candidates):
+    document = Document('<root xmlns:x="http://x"><a/><x:b/><c/></root>')
+    transformation = Transformation(
+        Rule(
+            HasNamespace(None),
+            (lib.get_localname, lib.append("names")),
+            read_only=True,
+        ),
+        context={"names": []},
+        index=index,
+        result_object="context.names",
+        select_candidates=select_candidates,
+    )
+    assert transformation(document) == ["root", "a", "c"]
+
+
 @mark.parametrize(
     "selector,expected",
     (("table > head", "Table Header"), ("table + cb", "X"), ("table ~ row", "#")),
@@ -94,6 +117,173 @@ def test_css_selector(selector, expected):
     assert transformation(document) == expected
 
 
+CSS_TEST_DOCUMENT = (
+    '<root><div class="note x" id="a"><p n="1"/><p n="2" lang="en-GB"><b/></p>'
+    '<q/><p n="3"/></div><section><div><p n="4"/></div><p n="5" class="note"/>'
+    '<empty></empty><p n="6">text<!-- comment --></p></section></root>'
+)
+
+
+@mark.parametrize(
+    "selector",
+    (
+        "div.note > p",
+        "section p",
+        "div p + q",
+        "q ~ p",
+        "#a p:first-child",
+        "p:last-child",
+        "p:only-child",
+        "p:nth-child(2n+1)",
+        "p:nth-last-child(-n+2)",
+        "div > p:nth-of-type(2)",
+        "p:last-of-type",
+        "*:empty",
+        ":root > *",
+        '[lang|="en"]',
+        '[n^="1"], [n$="2"], [n*="3"]',
+        '[n!="4"]',
+        "p:not(.note):not([n])",
+        "section > :not(div)",
+    ),
+)
+@mark.parametrize("select_candidates", (False, True))
+def test_css_selector_matching(monkeypatch, selector, select_candidates):
+    tree = etree.fromstring(CSS_TEST_DOCUMENT)
+    # delb evaluates "//…" relative to the transformation root, only its descendants
+    # can match
+    expected = Document(CSS_TEST_DOCUMENT).root.xpath(_translate(selector))
+
+    def fail(*args):
+        raise AssertionError("The selector was evaluated as XPath expression.")
+
+    if selector != "section > :not(div)":
+        monkeypatch.setattr(TagNode, "xpath", fail)
+
+    transformation = Transformation(
+        Rule(selector, lambda node, result: result.append(node._etree_obj)),
+        context={"result": []},
+        copy=False,
+        result_object="context.result",
+        select_candidates=select_candidates,
+    )
+    result = transformation(Document(etree.ElementTree(tree)))
+    assert [x.get("n") or x.tag for x in result] == [
+        x.attributes.get("n") or x.local_name for x in expected
+    ]
+
+
+@mark.parametrize(
+    "selector,expected",
+    (
+        ("a c", []),
+        ("b c", ["1"]),
+        (":root c", []),
+        ("r > a > b > c", []),
+        ("b > c", ["1"]),
+        ("c", ["1"]),
+        ("b ~ c", []),
+    ),
+)
+@mark.parametrize("select_candidates", (False, True))
+def test_css_selector_in_subtree(selector, expected, select_candidates):
+    document = Document('<r><a><b><b><c n="1"/></b></b></a><b><c n="2"/></b></r>')
+    subtree = document.root[0][0]
+    transformation = Transformation(
+        Rule(selector, lambda node, result: result.append(node.attributes["n"])),
+        context={"result": []},
+        copy=False,
+        result_object="context.result",
+        select_candidates=select_candidates,
+    )
+    assert transformation(subtree) == expected
+    assert [x.attributes["n"] for x in subtree.xpath(_translate(selector))] == expected
+
+
+def test_css_selector_with_namespace_prefix():
+    document = Document(
+        '<root xmlns="x" xmlns:y="y"><a/><y:a/><y:b><a/></y:b><b><y:a/></b></root>'
+    )
+    transformation = Transformation(
+        Rule("y|b > a, b > y|*", lambda node, result: result.append(node.namespace)),
+        context={"result": []},
+        result_object="context.result",
+    )
+    assert transformation(document) == ["x", "y"]
+
+
+@mark.parametrize("select_candidates", (False, True))
+def test_css_selector_excludes_transformation_root(select_candidates):
+    document = Document('<root n="1"><a><root n="2"/></a></root>')
+    transformation = Transformation(
+        Rule("root[n]", lambda node, result: result.append(node.attributes["n"])),
+        context={"result": []},
+        result_object="context.result",
+        select_candidates=select_candidates,
+    )
+    assert transformation(document) == ["2"]
+
+
+XPATH_TEST_DOCUMENT = (
+    '<root xmlns="x" xmlns:y="y"><div type="a" xml:id="d1"><p n="1"/><y:p n="2"/>'
+    '<div><p n="3" y:n="3"/></div></div><section><p n="4"/><div type="b">'
+    '<p n="5"/><y:q n="6"/></div></section><p n="7"/></root>'
+)
+
+
+@mark.parametrize(
+    "expression,compiled",
+    (
+        ("./div", True),
+        ("./*/p", True),
+        (".//p", True),
+        ("//div/p", True),
+        ("/section//*", True),
+        ("/self::*[@type]", True),
+        ("//div//y:*", True),
+        ("./div[@type]//p | ./section//y:q", True),
+        ('.//div[@type="b"]/p', True),
+        (".//p[@n!='1' and @n!='4']", True),
+        ("descendant::p[@y:n]", True),
+        ("//*[@xml:id='d1']/y:p", True),
+        ("child::*/descendant-or-self::div", True),
+        (".//div/self::div[@type='a']", True),
+        ("descendant::div//.//p", True),
+        (".//p[1]", False),
+        (".//p[@n='1' or @n='4']", False),
+        (".//div[p]", False),
+        ("./div/../section", False),
+        ("parent::node()//*", False),
+        ("..//p", False),
+        ("ancestor::node()//div", False),
+        ("ancestor-or-self::node()/section", False),
+    ),
+)
+@mark.parametrize("select_candidates", (False, True))
+def test_xpath_matching(monkeypatch, expression, compiled, select_candidates):
+    assert (compile_xpath(expression) is not None) is compiled
+    expected = [
+        x.attributes.get("n") or x.local_name
+        for x in Document(XPATH_TEST_DOCUMENT).root.xpath(expression)
+    ]
+
+    def fail(*args):
+        raise AssertionError("The expression was evaluated.")
+
+    if compiled:
+        monkeypatch.setattr(TagNode, "xpath", fail)
+
+    transformation = Transformation(
+        Rule(MatchesXPath(expression), lambda node, result: result.append(node)),
+        context={"result": []},
+        copy=False,
+        result_object="context.result",
+        select_candidates=select_candidates,
+    )
+    result = transformation(Document(XPATH_TEST_DOCUMENT))
+    assert [x.attributes.get("n") or x.local_name for x in result] == expected
+
+
 def test_If():
     def return_zero():
         return 0
@@ -132,6 +322,160 @@ def test_OneOf():
     assert all(x.full_text == "" for x in result.child_nodes(is_tag_node))
 
 
+@mark.parametrize("profile", (False, True))
+def test_OneOf_stops_at_second_match(profile):
+    calls = []
+
+    def condition(node, _):
+        calls.append(node.local_name)
+        return True
+
+    transformation = Transformation(
+        Rule(
+            OneOf("a", {"x": "x"}, condition), (lib.get_localname, lib.append("result"))
+        ),
+        context={"result": []},
+        profile=profile,
+        result_object="context.result",
+    )
+    assert transformation(Document('<root><a x="x"/><b/></root>')) == ["root", "b"]
+    assert calls == ["root", "b"]
+
+
+COMBINED_CONDITIONS_DOCUMENT = (
+    '<root><a x="1"><b/><c x="2"/></a><b x="1"><a/></b><c><b x="2"/></c></root>'
+)
+
+
+def is_leaf(node, _):
+    return not node.child_nodes(is_tag_node)
+
+
+@mark.parametrize(
+    "conditions",
+    (
+        ("a", Any("a", "b")),
+        (Any("b", {"x": None}), Not("c", is_leaf)),
+        (OneOf("a", "b", {"x": "1"}, {"x": "1"}),),
+        (OneOf("*", "b", is_leaf),),
+        (OneOf(Any("a", "b"), Not(Any("b", "c"))),),
+        (Not(Not("a"), Any("c", If(1, operator.eq, 2))), "*"),
+        (Any(is_leaf, If(1, operator.eq, 1)), Not(OneOf("a", "a"))),
+        (".//b", Any(MatchesXPath("./*/*[1]"), {"x": "2"}), Not(is_leaf)),
+    ),
+)
+def test_combined_conditions(conditions):
+    # the conditions are evaluated one by one when profiled
+    results = [
+        Transformation(
+            Rule(conditions, (lib.get_localname, lib.append("result"))),
+            context={"result": []},
+            profile=profile,
+            result_object="context.result",
+            select_candidates=False,
+        )(Document(COMBINED_CONDITIONS_DOCUMENT))
+        for profile in (True, False)
+    ]
+    assert results[0] == results[1]
+
+
+def test_cheap_conditions_are_tested_first():
+    calls = []
+
+    def condition(node, _):
+        calls.append(node.local_name)
+        return True
+
+    transformation = Transformation(
+        Rule((condition, MatchesXPath("./*[1]"), "a"), lib.put_variable("x")),
+        Rule(("a", Any("a", condition)), lib.put_variable("y")),
+        Rule((If(1, operator.gt, 2), condition), lib.put_variable("z")),
+        result_object="context",
+        select_candidates=False,
+    )
+    result = transformation(Document(COMBINED_CONDITIONS_DOCUMENT))
+    assert result.x is None
+    assert result.y is None
+    assert not hasattr(result, "z")
+    assert calls == ["a"]
+
+
+def test_adaptive_conditions():
+    calls = []
+
+    def always(node, _):
+        calls.append("always")
+        return True
+
+    def rarely(node, _):
+        calls.append("rarely")
+        return node.attributes.get("n") == "0"
+
+    # mark them as side-effect free with a misleading cost
+    setattr(always, CONDITION_COST_ATTRIBUTE, 1)
+    setattr(rarely, CONDITION_COST_ATTRIBUTE, 2)
+
+    transformation = Transformation(
+        Rule((rarely, always), (lib.get_attribute("n"), lib.append("result"))),
+        adaptive_conditions=10,
+        context={"result": []},
+        result_object="context.result",
+    )
+    document = Document(
+        "<root>" + "".join(f'<x n="{i % 4}"/>' for i in range(19)) + "</root>"
+    )
+
+    assert transformation(document) == ["0"] * 5
+    assert calls[:4] == ["always", "rarely"] * 2
+    # the root and the first nine <x> were sampled, the other ten are tested in
+    # the learned order
+    assert calls[20:].count("rarely") == 10
+    assert calls[20:].count("always") == 2
+
+    calls.clear()
+    assert transformation(document) == ["0"] * 5
+    assert calls.count("always") == 5
+
+
+def test_conditions_evaluators_belong_to_their_rule():
+    transformation = Transformation()
+    rule = Rule("a", lib.put_variable("x"))
+    # simulates an evaluator of a collected rule whose identity is reused
+    transformation._conditions_evaluators[id(rule)] = lambda *args: False
+    evaluator = transformation._get_conditions_evaluator(rule)
+    assert evaluator(Document("<a/>").root, transformation)
+
+
+def test_adaptive_conditions_in_threads():
+    def always(node, _):
+        return True
+
+    def rarely(node, _):
+        return node.attributes.get("n") == "0"
+
+    setattr(always, CONDITION_COST_ATTRIBUTE, 1)
+    setattr(rarely, CONDITION_COST_ATTRIBUTE, 2)
+
+    transformation = Transformation(
+        Rule((rarely, always), (lib.get_attribute("n"), lib.append("result"))),
+        adaptive_conditions=50,
+        context={"result": []},
+        result_object="context.result",
+    )
+    (evaluator,) = transformation._conditions_evaluators.values()
+    document = (
+        "<root>" + "".join(f'<x n="{i % 4}"/>' for i in range(19)) + "</root>"
+    ).encode()
+
+    results = transformation.map((document,) * 32, workers=4, executor="thread")
+    assert list(results) == [["0"] * 5] * 32
+    assert evaluator.calls == 50
+    # the operands are ordered by their declared costs
+    always_failures, rarely_failures = (x[2] for x in evaluator.statistics)
+    assert 0 < rarely_failures <= 50
+    assert always_failures == 0
+
+
 @mark.parametrize("xpath", ("//a", MatchesXPath(lambda x: "//a")))
 def test_xpath(xpath):
     document = Document("<root><a/><b/></root>")
@@ -140,3 +484,28 @@ def test_xpath(xpath):
     assert not result._data_node._exists
     assert first(result.css_select("a")).full_text == "x"
     assert first(result.css_select("b")).full_text == ""
+
+
+@mark.parametrize("read_only,expected_evaluations", ((True, 1), (False, 2)))
+def test_xpath_results_are_cached(monkeypatch, read_only, expected_evaluations):
+    evaluations = []
+    xpath = TagNode.xpath
+
+    def counting_xpath(self, expression):
+        evaluations.append(expression)
+        return xpath(self, expression)
+
+    monkeypatch.setattr(TagNode, "xpath", counting_xpath)
+
+    document = Document("<root><a/><b><a/><c/></b><c/></root>")
+    transformation = Transformation(
+        Rule("./a[1]", (lib.get_localname, lib.append("result")), read_only=read_only),
+        Rule("./b/c[1]", (lib.get_localname, lib.append("result"))),
+        context={"result": []},
+        result_object="context.result",
+        select_candidates=False,
+    )
+
+    # the matched nodes are determined by identity, not equality
+    assert transformation(document) == ["a", "c"]
+    assert evaluations.count("./a[1]") == expected_evaluations
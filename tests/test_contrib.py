@@ -1,6 +1,6 @@
 from delb import Document, TextNode
 
-from inxs.contrib import remove_empty_nodes
+from inxs.contrib import reduce_whitespaces, remove_empty_nodes
 
 from tests import equal_subtree
 
@@ -46,3 +46,9 @@ def test_remove_empty_elements():
     assert not result.css_select("e")
 
     assert equal_subtree(result.root, expected.root)
+
+
+def test_reduce_whitespaces():
+    document = Document("<root>  a\t\n b <x>c  \n d</x>\n\n e</root>")
+    result = reduce_whitespaces(document)
+    assert str(result) == "<root> a b <x>c d</x> e</root>"
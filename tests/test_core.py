@@ -1,21 +1,38 @@
 import operator
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 
+import dependency_injection
 from delb import Document, TagNode
+from lxml import etree
 from pytest import mark, raises
 
 from inxs import (
+    TRAVERSE_BOTTOM_TO_TOP,
+    TRAVERSE_DEPTH_FIRST,
+    TRAVERSE_LEFT_TO_RIGHT,
+    TRAVERSE_RIGHT_TO_LEFT,
+    TRAVERSE_TOP_TO_BOTTOM,
+    TRAVERSE_WIDTH_FIRST,
     __version__,
+    ABORT_RULE,
+    ABORT_TRANSFORMATION,
+    SKIP_DESCENDANTS,
+    SKIP_TO_NEXT_NODE,
     AbortRule,
     AbortTransformation,
     If,
     Not,
+    Once,
     Ref,
     Rule,
+    SkipDescendants,
     SkipToNextNode,
     Transformation,
 )
+import inxs
 from inxs import lib
 
 
@@ -96,6 +113,208 @@ def test_SkipToNextElement():
     assert transformation(doc) == ["b", "d"]
 
 
+@mark.parametrize("fuse_rules", (False, True))
+def test_flow_control_signals(monkeypatch, fuse_rules):
+    def fail(self):
+        raise AssertionError("An exception was instantiated.")
+
+    monkeypatch.setattr(inxs.FlowControl, "__init__", fail)
+
+    def odd_numbers(node: TagNode):
+        if int(node.attributes.get("x", 0)) % 2 == 0:
+            return SKIP_TO_NEXT_NODE
+        return node.local_name
+
+    def until_c(node: TagNode):
+        if node.local_name == "c":
+            return ABORT_RULE
+
+    def abort_at_d(node: TagNode):
+        if node.local_name == "d":
+            return ABORT_TRANSFORMATION
+
+    transformation = Transformation(
+        Rule("*", (odd_numbers, lib.append("odd"))),
+        Rule("*", (until_c, lib.get_localname, lib.append("until_c"))),
+        Once("*", (lib.get_localname, lib.append("once"))),
+        Rule("*", (abort_at_d, lib.get_localname, lib.append("until_d"))),
+        lib.put_variable("completed", True),
+        context={"odd": [], "once": [], "until_c": [], "until_d": []},
+        fuse_rules=fuse_rules,
+        result_object="context",
+    )
+    doc = Document('<root><a x="1"/><b x="2"/><c x="3"/><d x="4"/><e/></root>')
+    result = transformation(doc)
+
+    assert result.odd == ["a", "c"]
+    assert result.until_c == ["root", "a", "b"]
+    assert result.once == ["root"]
+    assert result.until_d == ["root", "a", "b", "c"]
+    assert not hasattr(result, "completed")
+
+
+@mark.parametrize(
+    "step", (AbortRule, SkipToNextNode, lambda: ABORT_RULE, lambda: SKIP_DESCENDANTS)
+)
+def test_flow_control_signals_outside_of_rules(step):
+    transformation = Transformation(step)
+    with raises(RuntimeError):
+        transformation(Document("<root/>"))
+
+
+@mark.parametrize(
+    "traversal_order,expected",
+    (
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+            ["root", "a", "b", "c", "x"],
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+            ["root", "c", "x", "b", "a"],
+        ),
+        (
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+            ["root", "a", "b", "c", "x"],
+        ),
+    ),
+)
+@mark.parametrize("fuse_rules", (False, True))
+def test_skip_descendants(traversal_order, expected, fuse_rules):
+    def record(node: TagNode, visited: list):
+        visited.append(node.local_name)
+        if node.local_name == "a":
+            return SKIP_DESCENDANTS
+        elif node.local_name == "b":
+            raise SkipDescendants
+
+    transformation = Transformation(
+        Rule("*", record),
+        Rule("*", (lib.get_localname, lib.append("all"))),
+        context={"visited": [], "all": []},
+        fuse_rules=fuse_rules,
+        result_object="context",
+        traversal_order=traversal_order,
+    )
+    doc = Document("<root><a><x/><y><z/></y></a><b><x/></b><c><x/></c></root>")
+    result = transformation(doc)
+
+    assert result.visited == expected
+    assert len(result.all) == 9
+
+
+@mark.parametrize("select_candidates", (False, True))
+def test_skip_descendants_of_candidates(select_candidates):
+    def record(node: TagNode, numbers: list):
+        numbers.append(node.attributes["n"])
+        return SKIP_DESCENDANTS
+
+    transformation = Transformation(
+        Rule("b", record),
+        context={"numbers": []},
+        result_object="context.numbers",
+        select_candidates=select_candidates,
+    )
+    doc = Document('<root><b n="1"><b n="2"/></b><a><b n="3"><b n="4"/></b></a></root>')
+    assert transformation(doc) == ["1", "3"]
+
+
+def test_prune():
+    visited = []
+
+    def is_text(node, _):
+        visited.append(node.local_name)
+        return node.local_name == "text"
+
+    transformation = Transformation(
+        Rule("title", (lib.get_text, lib.append("titles")), prune=is_text),
+        context={"titles": []},
+        result_object="context.titles",
+    )
+    doc = Document(
+        "<TEI><teiHeader><title>Header</title></teiHeader>"
+        "<text><body><title>Body</title></body></text></TEI>"
+    )
+
+    assert transformation(doc) == ["Header"]
+    assert visited == ["TEI", "teiHeader", "title", "text"]
+
+
+@mark.parametrize("select_candidates", (False, True))
+def test_rule_scope(select_candidates):
+    visited = []
+
+    def visit(node, _):
+        visited.append(node.local_name)
+        return True
+
+    transformation = Transformation(
+        Rule(visit, lib.set_attribute("seen", ""), scope="//listBibl"),
+        Rule(
+            "bibl",
+            (lib.get_attribute("n"), lib.append("children")),
+            scope="listBibl",
+            max_depth=1,
+        ),
+        context={"children": []},
+        copy=False,
+        result_object="context",
+        select_candidates=select_candidates,
+    )
+    doc = Document(
+        '<TEI><text><bibl n="0"/></text><back><listBibl><bibl n="1"/>'
+        '<listBibl><bibl n="2"/></listBibl><bibl n="3"/></listBibl></back></TEI>'
+    )
+    result = transformation(doc)
+
+    assert result.children == ["1", "3"]
+    assert visited == ["listBibl", "bibl", "listBibl", "bibl", "bibl"]
+    assert len(doc.xpath("//*[@seen]")) == 5
+
+
+@mark.parametrize(
+    "traversal_order",
+    (
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+        TRAVERSE_WIDTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+    ),
+)
+def test_rule_max_depth(traversal_order):
+    transformation = Transformation(
+        Rule("*", (lib.get_localname, lib.append("names")), max_depth=1),
+        context={"names": []},
+        result_object="context.names",
+        traversal_order=traversal_order,
+    )
+    doc = Document("<root><a><x/></a><b><y><z/></y></b></root>")
+    assert sorted(transformation(doc)) == ["a", "b", "root"]
+
+
+def test_hot_paths_only_log_when_debugging(monkeypatch):
+    messages = []
+    monkeypatch.setattr(inxs, "dbg", lambda message, *args: messages.append(message))
+    transformation = Transformation(
+        Rule("*", (lib.get_localname, lib.append("names"))),
+        Rule(If(1, operator.lt, 2), lib.set_text("x")),
+        Rule(If(Ref("root"), operator.is_not, None), lib.f(str, Ref("config.name"))),
+        context={"names": []},
+        name="test",
+    )
+    document = Document("<root><a/><b/></root>")
+
+    monkeypatch.setattr(inxs.logger, "isEnabledFor", lambda level: False)
+    transformation(document)
+    assert not any(
+        x.startswith(("Evaluating", "Applying", "Resolving")) for x in messages
+    )
+
+    monkeypatch.setattr(inxs.logger, "isEnabledFor", lambda level: True)
+    transformation(document)
+    assert messages.count("Evaluating %s.") == 9
+    assert "Applying handlers." in messages
+
+
 def test_subtransformation():
     subtransformation = Transformation(Rule("*", lib.set_localname("pablo")))
     transformation = Transformation(
@@ -128,3 +347,470 @@ version_pattern = re.compile(r"\d+\.\d+(\.\d+)?((a|b|rc)\d+)?(\.post\d+)?(\.dev\
 @mark.parametrize("s", ("0.1", "0.1b2.dev3", "0.1b2", "1.0", "1.0.1", __version__))
 def test_version(s):
     assert version_pattern.match(s)
+
+
+def test_fused_rules():
+    def log(name):
+        def handler(node, log):
+            log.append((name, node.local_name))
+
+        return handler
+
+    def abort_after_b(node):
+        if node.local_name == "b":
+            raise AbortRule
+
+    steps = (
+        Rule("*", (log("x"), abort_after_b)),
+        Rule(Not("a"), log("y")),
+        Rule("/", log("root")),
+    )
+    document = Document("<root><a/><b/><c/></root>")
+
+    fused = Transformation(
+        *steps, fuse_rules=True, context={"log": []}, result_object="context.log"
+    )
+    assert fused(document) == [
+        ("x", "root"),
+        ("y", "root"),
+        ("x", "a"),
+        ("x", "b"),
+        ("y", "b"),
+        ("y", "c"),
+        ("root", "root"),
+    ]
+
+    unfused = Transformation(*steps, context={"log": []}, result_object="context.log")
+    assert sorted(unfused(document)) == sorted(fused(document))
+
+
+def test_handler_signatures_are_analysed_once(monkeypatch):
+    calls = []
+    get_signature = dependency_injection.get_signature
+
+    def counting_get_signature(function):
+        calls.append(function)
+        return get_signature(function)
+
+    monkeypatch.setattr(dependency_injection, "get_signature", counting_get_signature)
+
+    class Collector:
+        def __call__(self, node, collected, suffix="!"):
+            collected.append(node.local_name + suffix)
+
+    collector = Collector()
+    transformation = Transformation(
+        Rule("*", collector), context={"collected": []}, result_object="context"
+    )
+    assert len(calls) == 1
+
+    result = transformation(Document("<root><a/><b/></root>"))
+    assert result.collected == ["root!", "a!", "b!"]
+    assert len(calls) == 1
+
+
+def test_methods_are_called_without_resolving_all_symbols(monkeypatch):
+    def fail(self, transformation):
+        raise AssertionError("All symbols were resolved.")
+
+    monkeypatch.setattr(inxs._HandlerPlan, "_resolve_kwargs", fail)
+
+    class Collector:
+        def __call__(self, node, collected, suffix="!"):
+            collected.append(node.local_name + suffix)
+
+        def collect(self, node, collected):
+            collected.append(node.local_name)
+
+    collector = Collector()
+    transformation = Transformation(
+        Rule("*", (collector, collector.collect)),
+        context={"collected": []},
+        result_object="context.collected",
+    )
+    result = transformation(Document("<root><a/></root>"))
+    assert result == ["root!", "root", "a!", "a"]
+
+
+def test_scope_evaluators_belong_to_their_rule():
+    transformation = Transformation()
+    rule = Rule("*", lib.put_variable("x"), scope="a")
+    # simulates an evaluator of a collected rule whose identity is reused
+    transformation._scope_evaluators[id(rule)] = lambda *args: False
+    evaluator = transformation._get_scope_evaluator(rule)
+    assert evaluator(Document("<a/>").root, transformation)
+
+
+def test_handler_plans_belong_to_their_handler():
+    def handler(node):
+        pass
+
+    transformation = Transformation()
+    # simulates a plan of a collected handler whose identity is reused
+    transformation._handler_plans[id(handler)] = inxs._HandlerPlan(lambda: None)
+    assert transformation._get_handler_plan(handler).handler is handler
+
+
+@mark.parametrize(
+    "traversal_order",
+    (
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+    ),
+)
+@mark.parametrize("condition", ("note", "//note", "div > note"))
+def test_candidates_selection(condition, traversal_order):
+    document = Document(
+        "<root><note n='1'><div><note n='2'/></div></note><x/>"
+        "<div><note n='3'><note n='4'/></note><y/></div></root>"
+    )
+    tested_nodes = []
+
+    def test_node(node, _):
+        tested_nodes.append(node)
+        return True
+
+    def make_transformation(select_candidates):
+        return Transformation(
+            Rule((condition, test_node), (lib.get_attribute("n"), lib.append("ns"))),
+            context={"ns": []},
+            result_object="context.ns",
+            select_candidates=select_candidates,
+            traversal_order=traversal_order,
+        )
+
+    expected = make_transformation(False)(document)
+    tested_nodes.clear()
+
+    assert make_transformation(True)(document) == expected
+    assert len(tested_nodes) == len(expected)
+
+    # nodes outside the transformation root are not considered
+    subtree = document.root[2]
+    expected = make_transformation(False)(subtree, copy=False)
+    assert make_transformation(True)(subtree, copy=False) == expected
+
+
+@mark.parametrize("condition", ("p", "//p", {"x": None}))
+def test_candidates_are_not_selected_for_modifying_rules(condition):
+    def mark_and_change_next(node: TagNode):
+        node.attributes["seen"] = "1"
+        following = node.next_node()
+        if following is not None:
+            following.local_name = "p"
+            following.attributes["x"] = ""
+
+    transformation = Transformation(Rule(("p", condition), mark_and_change_next))
+    result = transformation(Document('<r><p x=""/><q/><q/></r>'))
+
+    assert [(x.local_name, x.attributes.get("seen")) for x in result.root] == [
+        ("p", "1"),
+        ("p", "1"),
+        ("p", "1"),
+    ]
+
+
+@mark.parametrize(
+    ("traversal_order", "expected"),
+    (
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+            "rabcdef",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+            "bcaefdr",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+            "rdfeacb",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_BOTTOM_TO_TOP,
+            "fedcbar",
+        ),
+        (
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+            "radbcef",
+        ),
+        (
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+            "bcefadr",
+        ),
+        (
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+            "rdafecb",
+        ),
+        (
+            TRAVERSE_WIDTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_BOTTOM_TO_TOP,
+            "fecbdar",
+        ),
+    ),
+)
+@mark.parametrize("select_candidates", (False, True))
+def test_traversal_orders(traversal_order, expected, select_candidates):
+    document = Document("<r><a><b/>x<c/></a><d>y<e/><f/></d></r>")
+    transformation = Transformation(
+        Rule("*", (lambda node: node.local_name, lib.append("names"))),
+        context={"names": []},
+        result_object="context.names",
+        select_candidates=select_candidates,
+        traversal_order=traversal_order,
+    )
+    assert "".join(transformation(document)) == expected
+
+
+@mark.parametrize(
+    "traversal_order",
+    (
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+        TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_BOTTOM_TO_TOP,
+        TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+        TRAVERSE_WIDTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+        TRAVERSE_WIDTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+        TRAVERSE_WIDTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_BOTTOM_TO_TOP,
+    ),
+)
+def test_traversal_tolerates_detaching(traversal_order):
+    document = Document("<r><a><b/><c/></a><d><e/></d><f/></r>")
+    transformation = Transformation(
+        Rule(Not("/"), lib.remove_node),
+        select_candidates=False,
+        traversal_order=traversal_order,
+    )
+    assert str(transformation(document)) == "<r/>"
+
+
+@mark.parametrize(
+    "traversal_order,expected",
+    (
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_TOP_TO_BOTTOM,
+            "racd",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_TOP_TO_BOTTOM,
+            "rdba",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP,
+            "acdr",
+        ),
+        (
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_RIGHT_TO_LEFT | TRAVERSE_BOTTOM_TO_TOP,
+            "dbar",
+        ),
+    ),
+)
+def test_traversal_tolerates_detaching_siblings(traversal_order, expected):
+    def visit(node: TagNode, names: list):
+        names.append(node.local_name)
+        # detaches the sibling that would be visited next
+        if node.local_name == "a":
+            node.next_node().detach()
+        elif node.local_name == "d":
+            node.previous_node().detach()
+
+    document = Document("<r><a/><b/><c/><d/></r>")
+    transformation = Transformation(
+        Rule("*", visit),
+        context={"names": []},
+        result_object="context.names",
+        select_candidates=False,
+        traversal_order=traversal_order,
+    )
+    assert "".join(transformation(document)) == expected
+
+
+def test_traversal_of_deep_trees():
+    root = element = etree.Element("x")
+    for _ in range(sys.getrecursionlimit() * 2):
+        element = etree.SubElement(element, "x")
+    document = Document(etree.ElementTree(root))
+
+    transformation = Transformation(
+        Rule("x", (lambda node: node, lib.append("nodes"))),
+        context={"nodes": []},
+        result_object="context.nodes",
+        select_candidates=False,
+        traversal_order=(
+            TRAVERSE_DEPTH_FIRST | TRAVERSE_LEFT_TO_RIGHT | TRAVERSE_BOTTOM_TO_TOP
+        ),
+    )
+    result = transformation(document.root, copy=False)
+
+    assert len(result) == sys.getrecursionlimit() * 2 + 1
+    assert result[0].first_child is None
+    assert result[-1] is document.root
+
+
+def test_concurrent_calls():
+    transformation = Transformation(
+        Rule("item", (lambda node: node.attributes["n"], lib.append("ns"))),
+        context={"ns": []},
+        result_object="context.ns",
+    )
+    documents = [
+        Document(f"<root><item n='{i}'/><item n='{i}{i}'/></root>") for i in range(32)
+    ]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(transformation, documents))
+
+    assert results == [[f"{i}", f"{i}{i}"] for i in range(32)]
+    assert transformation.states is None
+
+
+def test_reentrant_calls():
+    def recurse(node, transformation, context):
+        if context.depth < 2:
+            context.trace.append(
+                transformation(node, copy=False, depth=context.depth + 1)
+            )
+        context.trace.append(context.depth)
+
+    transformation = Transformation(
+        Rule("/", recurse), context={"depth": 0, "trace": []}, result_object="context"
+    )
+
+    result = transformation(Document("<root/>"))
+    assert result.depth == 0
+    assert result.trace[-1] == 0
+    assert result.trace[0].trace[-1] == 1
+    assert result.trace[0].trace[0].trace == [2]
+    assert transformation.states is None
+
+    def fail():
+        raise RuntimeError
+
+    transformation = Transformation(fail)
+    with raises(RuntimeError):
+        transformation(Document("<root/>"))
+    assert transformation.states is None
+
+
+@mark.parametrize("executor", ("process", "thread"))
+def test_map(executor, tmp_path):
+    inputs = []
+    for i in range(12):
+        xml = f"<root><item n='{i}'/></root>"
+        if i % 3 == 0:
+            inputs.append(Document(xml))
+        elif i % 3 == 1:
+            inputs.append(xml.encode())
+        else:
+            path = tmp_path / f"{i}.xml"
+            path.write_text(xml)
+            inputs.append(str(path))
+
+    transformation = Transformation(
+        Rule("item", lib.set_attribute("done", "yes")),
+        Rule("item", (lambda node: node.attributes["n"], lib.append("ns"))),
+        context={"ns": []},
+        result_object="context.ns",
+    )
+    results = list(transformation.map(inputs, workers=3, executor=executor))
+    assert results == [[str(i)] for i in range(12)]
+    assert str(inputs[0]) == "<root><item n='0'/></root>".replace("'", '"')
+
+    results = transformation.map(inputs, workers=3, executor=executor, ordered=False)
+    assert sorted(int(x[0]) for x in results) == list(range(12))
+
+    transformation.config.result_object = "root"
+    results = list(transformation.map(inputs[:3], workers=2, executor=executor))
+    assert all(isinstance(x, Document) for x in results)
+    assert str(results[1]) == '<root><item n="1" done="yes"/></root>'
+
+
+def test_map_requires_fork_for_processes(monkeypatch):
+    import multiprocessing
+
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    transformation = Transformation(Rule("item", lib.set_attribute("done", "yes")))
+    with raises(RuntimeError, match="fork"):
+        transformation.map([b"<root/>"], executor="process")
+
+
+def test_map_validates_arguments_eagerly():
+    transformation = Transformation(Rule("item", lib.set_attribute("done", "yes")))
+    with raises(ValueError):
+        transformation.map([b"<root/>"], executor="fiber")
+    with raises(ValueError):
+        transformation.map([b"<root/>"], workers=0)
+
+
+def test_read_only_transformations_dont_copy(monkeypatch):
+    clones = []
+    clone = Document.clone
+
+    def counting_clone(self):
+        clones.append(self)
+        return clone(self)
+
+    monkeypatch.setattr(Document, "clone", counting_clone)
+    document = Document("<root><a x='1'/><a x='2'/></root>")
+
+    extraction = Transformation(
+        Rule("a", lib.get_attribute("x")),
+        Rule("a", lib.put_variable("x", Ref("node"))),
+        lib.get_variable("x"),
+        result_object="context.x",
+    )
+    assert extraction.config.read_only
+    assert all(x.read_only for x in extraction.steps if isinstance(x, Rule))
+    assert extraction(document).attributes["x"] == "2"
+    assert not clones
+    assert extraction(document, copy=True).parent is not document.root
+    assert len(clones) == 1
+    clones.clear()
+
+    returns_root = Transformation(Rule("a", lib.get_attribute("x")))
+    assert returns_root.config.read_only
+    assert returns_root(document) is not document
+    assert len(clones) == 1
+
+    modification = Transformation(
+        Rule("a", lib.set_attribute("y", "z")), result_object="context"
+    )
+    assert not modification.config.read_only
+    modification(document)
+    assert len(clones) == 2
+    assert "y" not in document.root[0].attributes
+
+    declared = Transformation(
+        Rule("a", lambda node: None), read_only=True, result_object="context"
+    )
+    declared(document)
+    assert len(clones) == 2
+
+
+def test_index(monkeypatch):
+    builds = []
+    init_index = inxs._NodesIndex.__init__
+
+    def counting_init(self, root):
+        builds.append(root)
+        init_index(self, root)
+
+    monkeypatch.setattr(inxs._NodesIndex, "__init__", counting_init)
+
+    document = Document(
+        '<root xmlns:x="http://x.org/"><a n="1"/><x:a n="2"/><b n="3" t="y"/>'
+        '<c n="4"><a n="5" t="y"/></c></root>'
+    )
+    collect = (lib.get_attribute("n"), lib.append("ns"))
+    transformation = Transformation(
+        Rule("a", collect, read_only=True),
+        Rule("c", lib.remove_node),
+        Rule({"t": "y"}, lib.set_localname("a")),
+        Rule("http://x.org/", lib.set_attribute("t", "z")),
+        Rule("a", collect, read_only=True),
+        Rule({"t": None}, collect, read_only=True),
+        Rule({"t": "z", "n": "2"}, collect, read_only=True),
+        index=True,
+        context={"ns": []},
+        result_object="context.ns",
+    )
+    assert transformation(document) == ["1", "2", "5", "1", "2", "3", "2", "3", "2"]
+    assert len(builds) == 1
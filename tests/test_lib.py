@@ -4,7 +4,8 @@ from types import SimpleNamespace
 from delb import Document, new_tag_node, register_namespace
 from pytest import mark, raises
 
-from inxs import lib, Ref, Rule, Transformation
+import inxs
+from inxs import Key, lib, Ref, Rule, Transformation
 
 
 def test_add_html_classes():
@@ -38,6 +39,128 @@ def test_add_html_classes():
     )
 
 
+def test_build_key(monkeypatch):
+    builds = []
+    init = inxs._KeyIndex.__init__
+
+    def counting_init(self, *args):
+        builds.append(None)
+        init(self, *args)
+
+    monkeypatch.setattr(inxs._KeyIndex, "__init__", counting_init)
+
+    def change_id(node):
+        node.attributes["id"] = "p4"
+
+    def count_references(name):
+        return Rule(
+            "ref",
+            (lib.f(len, Key("persons", lib.get_attribute("to"))), lib.append(name)),
+            read_only=True,
+        )
+
+    transformation = Transformation(
+        lib.build_key("persons", "person", "id"),
+        count_references("before"),
+        Rule(Key("persons", "p2"), lib.set_attribute("id", "p3")),
+        count_references("maintained"),
+        Rule(Key("persons", "p1"), change_id),
+        count_references("rebuilt"),
+        context={"before": [], "maintained": [], "rebuilt": []},
+        result_object="context",
+    )
+    doc = Document(
+        '<root><person id="p1"/><person id="p2"/><ref to="p1"/><ref to="p2"/>'
+        '<ref to="p3"/><ref to="p4"/></root>'
+    )
+    result = transformation(doc)
+
+    assert result.before == [1, 1, 0, 0]
+    assert result.maintained == [1, 0, 1, 0]
+    assert result.rebuilt == [0, 0, 1, 1]
+    assert len(builds) == 2
+
+    with raises(RuntimeError):
+        Transformation(Rule(Key("persons", "p1"), lib.get_localname))(doc)
+
+
+def test_structural_keys_are_discarded(monkeypatch):
+    builds = []
+    init = inxs._KeyIndex.__init__
+
+    def counting_init(self, *args):
+        builds.append(None)
+        init(self, *args)
+
+    monkeypatch.setattr(inxs._KeyIndex, "__init__", counting_init)
+
+    def count(key, name):
+        return Rule(
+            "root",
+            (lib.f(len, Key(key, "i1")), lib.append(name)),
+            read_only=True,
+        )
+
+    transformation = Transformation(
+        lib.build_key("listed", "list > item", "id"),
+        lib.build_key("items", "item", "id"),
+        count("listed", "before"),
+        Rule("list", lib.set_localname("group")),
+        count("listed", "after"),
+        count("items", "after"),
+        context={"after": [], "before": []},
+        result_object="context",
+    )
+    result = transformation(Document('<root><list><item id="i1"/></list></root>'))
+
+    assert result.before == [1]
+    assert result.after == [0, 1]
+    assert len(builds) == 3
+
+
+def test_maintains_index(monkeypatch):
+    builds = []
+    init = inxs._KeyIndex.__init__
+
+    def counting_init(self, *args):
+        builds.append(None)
+        init(self, *args)
+
+    monkeypatch.setattr(inxs._KeyIndex, "__init__", counting_init)
+
+    def change_id(node):
+        node.attributes["id"] += "!"
+
+    @lib.maintains_index
+    def maintain_id(node, transformation):
+        index = lib.get_index(transformation)
+        index.discard(node, descendants=False)
+        node.attributes["id"] += "?"
+        index.add(node, descendants=False)
+
+    def count(value, name):
+        return Rule(
+            "root",
+            (lib.f(len, Key("persons", value)), lib.append(name)),
+            read_only=True,
+        )
+
+    transformation = Transformation(
+        lib.build_key("persons", "person", "id"),
+        Rule({"id": "p1"}, change_id),
+        count("p1!", "rebuilt"),
+        Rule({"id": "p2"}, maintain_id),
+        count("p2?", "maintained"),
+        context={"maintained": [], "rebuilt": []},
+        result_object="context",
+    )
+    result = transformation(Document('<root><person id="p1"/><person id="p2"/></root>'))
+
+    assert result.rebuilt == [1]
+    assert result.maintained == [1]
+    assert len(builds) == 2
+
+
 def test_clear_attributes():
     element = new_tag_node("root", attributes={"foo": "bar"})
     lib.clear_attributes(element, None)
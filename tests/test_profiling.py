@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from delb import Document
+
+from inxs import AbortRule, Rule, Transformation, lib
+
+
+def test_profile():
+    def fail_on_second(node, context):
+        context.count += 1
+        if context.count == 2:
+            raise AbortRule
+
+    transformation = Transformation(
+        Rule("a", lib.get_attribute("x"), name="xs"),
+        Rule(("b", lib.has_attributes), (lib.get_attribute("y"), lib.append("ys"))),
+        Rule(("b", lib.has_attributes), fail_on_second, name="aborting"),
+        lib.get_variable("ys"),
+        context={"count": 0, "ys": []},
+        profile=True,
+        result_object="context.ys",
+        select_candidates=False,
+    )
+    document = Document("<r><a x='1'/><b y='2'/><b/><b y='3'/></r>")
+
+    assert transformation(document) == ["2", "3"]
+    entries = {
+        (x.step, x.kind, x.name): x for x in transformation.profile.entries.values()
+    }
+
+    rule = entries[("#2 Rule", "step", "")]
+    assert (rule.calls, rule.matches, rule.nodes) == (1, 2, 5)
+    localname = entries[("#2 Rule", "condition", "HasLocalname.evaluator")]
+    assert (localname.calls, localname.matches) == (5, 3)
+    has_attributes = entries[("#2 Rule", "condition", "has_attributes")]
+    assert (has_attributes.calls, has_attributes.matches) == (3, 2)
+    append = entries[("#2 Rule", "handler", "append.handler")]
+    assert append.calls == 2
+    assert append.total_time > 0
+    assert append.mean_time == append.total_time / 2
+
+    aborting = entries[("#3 aborting", "step", "")]
+    assert (aborting.calls, aborting.matches, aborting.nodes) == (1, 2, 5)
+    assert entries[("#3 aborting", "handler", "test_profile.fail_on_second")].calls == 2
+    assert entries[("#4 get_variable.handler", "step", "")].calls == 1
+
+    table = str(transformation.profile).splitlines()
+    assert table[0].split() == [
+        "step",
+        "kind",
+        "name",
+        "calls",
+        "matches",
+        "nodes",
+        "total",
+        "ms",
+        "mean",
+        "µs",
+    ]
+    assert len(table) == len(entries) + 1
+    times = [x.total_time for x in transformation.profile.sorted_entries()]
+    assert times == sorted(times, reverse=True)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(transformation, [document] * 8, [False] * 8))
+    assert entries[("#2 Rule", "step", "")].calls == 1 + 8
+
+    transformation.profile.clear()
+    assert not transformation.profile.entries
+
+
+def test_profiling_is_disabled_by_default():
+    transformation = Transformation(Rule("a", lib.get_attribute("x")))
+    transformation(Document("<r><a/></r>"))
+    assert transformation.profile is None
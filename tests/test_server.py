@@ -0,0 +1,113 @@
+import socket
+from http.client import HTTPConnection
+from threading import Thread
+
+import pytest
+
+from inxs.server import make_server, parse_args
+
+
+TRANSFORMATION = """
+from inxs import lib, Rule, Transformation
+
+
+def fail():
+    raise RuntimeError("internals")
+
+
+main = Transformation(Rule("a", lib.set_localname("b")), Rule("c", fail))
+"""
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+    (tmp_path / "rename.py").write_text(TRANSFORMATION)
+
+    def start(*args):
+        server = make_server(parse_args(args + (str(tmp_path / "rename.py"),)))
+        Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def request(connection, method, path, body=None):
+    connection.request(method, path, body=body)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def test_http(caplog, serve):
+    server = serve("--port", "0", "--executor", "thread", "--queue-size", "1")
+    connection = HTTPConnection("127.0.0.1", server.server_address[1])
+
+    assert request(connection, "GET", "/") == (200, b"rename\n")
+
+    status, body = request(connection, "POST", "/rename", b"<root><a/></root>")
+    assert status == 200
+    assert body.endswith(b"<root><b/></root>")
+
+    assert request(connection, "POST", "/rename", b"<root>")[0] == 400
+    assert request(connection, "POST", "/rename", b"<root><c/></root>") == (
+        500,
+        b"The transformation 'rename' failed.",
+    )
+    assert "RuntimeError: internals" in caplog.text
+    assert request(connection, "POST", "/other", b"<root/>")[0] == 404
+
+    server.slots.acquire()
+    status, _ = request(connection, "POST", "/rename", b"<root/>")
+    server.slots.release()
+    assert status == 503
+
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    "length,status", ((None, 411), ("x", 400), ("-1", 400), ("11", 413))
+)
+def test_invalid_content_length(serve, length, status):
+    server = serve("--port", "0", "--executor", "thread", "--max-size", "10")
+    connection = HTTPConnection("127.0.0.1", server.server_address[1])
+
+    connection.putrequest("POST", "/rename")
+    if length is not None:
+        connection.putheader("Content-Length", length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == status
+    response.read()
+    assert response.will_close
+
+    # the connection is reopened
+    assert request(connection, "POST", "/rename", b"<root/>")[0] == 200
+    connection.close()
+
+
+def test_unix_socket(serve, tmp_path):
+    path = tmp_path / "inxs.sock"
+    serve("--socket", str(path), "--workers", "1")
+    connection = UnixHTTPConnection(str(path))
+
+    for _ in range(3):
+        status, body = request(connection, "POST", "/rename", b"<a><a/></a>")
+        assert status == 200
+        assert body.endswith(b"<b><b/></b>")
+
+    connection.close()
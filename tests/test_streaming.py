@@ -0,0 +1,129 @@
+from io import BytesIO
+
+from delb import Document, new_tag_node
+from pytest import raises
+
+from inxs import AbortTransformation, Rule, lib
+from inxs.streaming import StreamingTransformation
+
+from tests import equal_subtree
+
+
+SOURCE = b"""<?xml version="1.0"?>
+<dump xmlns="http://x" xmlns:y="http://y">
+  <meta y:a="1">head<b/>x</meta>
+  <item n="1"><title>A</title></item>
+  <item n="2"><title>B</title></item>
+  <group><item n="3"/>tail</group>
+  <header><item n="4"/></header>
+</dump>"""
+
+
+def test_records_are_processed_and_written():
+    transformation = StreamingTransformation(
+        Rule("title", (lambda node: node.full_text, lib.append("titles"))),
+        Rule("/", lib.set_attribute("seen", "yes")),
+        Rule("/", lib.set_localname("head"), record="header"),
+        record="item",
+        context={"titles": []},
+        result_object="context.titles",
+    )
+    output = BytesIO()
+
+    assert transformation(BytesIO(SOURCE), output) == ["A", "B"]
+    assert output.getvalue().count(b"xmlns=") == 1
+    assert output.getvalue().count(b"xmlns:y=") == 1
+
+    result = Document(output.getvalue())
+    expected = Document(
+        """<dump xmlns="http://x" xmlns:y="http://y">
+  <meta y:a="1">head<b/>x</meta>
+  <item n="1" seen="yes"><title>A</title></item>
+  <item n="2" seen="yes"><title>B</title></item>
+  <group><item n="3" seen="yes"/>tail</group>
+  <head><item n="4"/></head>
+</dump>"""
+    )
+    assert equal_subtree(result.root, expected.root)
+
+
+def test_processed_records_are_freed(tmp_path):
+    source = tmp_path / "source.xml"
+    source.write_bytes(
+        b"<dump>" + b"".join(b"<item><x/></item>" for _ in range(100)) + b"</dump>"
+    )
+
+    transformation = StreamingTransformation(
+        Rule("/", (lambda node: node.index, lib.append("indexes"))),
+        record="item",
+        context={"indexes": []},
+        result_object="context.indexes",
+    )
+    assert transformation(source) == [0] * 100
+
+
+def test_abort():
+    def abort_second(node, context):
+        context.count += 1
+        if context.count == 2:
+            raise AbortTransformation
+
+    transformation = StreamingTransformation(
+        Rule("/", (abort_second, lib.set_attribute("seen", "yes"))),
+        record="item",
+        context={"count": 0},
+    )
+    output = BytesIO()
+    transformation(BytesIO(SOURCE), output)
+
+    items = Document(output.getvalue()).xpath("//item")
+    assert [x.attributes.get("seen") for x in items] == ["yes", None, None, None]
+
+
+def test_removed_records():
+    transformation = StreamingTransformation(
+        Rule("/", lib.remove_node, record="deleted"), record="item"
+    )
+    output = BytesIO()
+    transformation(BytesIO(b"<d><item/><deleted/><item/></d>"), output)
+    assert str(Document(output.getvalue())) == "<d><item/><item/></d>"
+
+    output = BytesIO()
+    transformation(BytesIO(b"<d><l><item/><deleted/><item/></l></d>"), output)
+    assert str(Document(output.getvalue())) == "<d><l><item/><item/></l></d>"
+
+    output = BytesIO()
+    transformation(BytesIO(b"<d><item/><deleted/>t1<deleted>t</deleted>t2</d>"), output)
+    assert str(Document(output.getvalue())) == "<d><item/>t1t2</d>"
+
+
+def test_root_record():
+    def replace_root(transformation):
+        transformation.states.root = new_tag_node("new", {"n": "2"})
+
+    output = BytesIO()
+    StreamingTransformation(Rule("/", lib.set_attribute("seen", "yes")), record="item")(
+        BytesIO(b"<item><a/></item>"), output
+    )
+    assert str(Document(output.getvalue())) == '<item seen="yes"><a/></item>'
+
+    output = BytesIO()
+    StreamingTransformation(replace_root, record="item")(
+        BytesIO(b"<item><a/></item>"), output
+    )
+    assert str(Document(output.getvalue())) == '<new n="2"/>'
+
+    output = BytesIO()
+    StreamingTransformation(replace_root, record="item")(
+        BytesIO(b"<d><item><a/></item>tail<item/></d>"), output
+    )
+    assert (
+        str(Document(output.getvalue())) == '<d><new n="2"/>tail<new n="2"/></d>'
+    )
+
+
+def test_invalid_configurations():
+    with raises(AssertionError):
+        StreamingTransformation(Rule("/", lib.remove_node))
+    with raises(ValueError):
+        StreamingTransformation(record="item", result_object="root")